@@ -0,0 +1,17 @@
+-- Notify listeners whenever a system parameter changes, so that stations
+-- can keep their parameter cache coherent without restarting.
+
+CREATE OR REPLACE FUNCTION notify_parameter_data() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('parameter_data', OLD.field_name);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('parameter_data', NEW.field_name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_parameter_data_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON parameter_data
+    FOR EACH ROW EXECUTE PROCEDURE notify_parameter_data();
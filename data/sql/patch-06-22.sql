@@ -0,0 +1,7 @@
+-- Indexes used by SellableLookup to find a sellable by its barcode, code
+-- or batch number ignoring the case
+
+CREATE INDEX sellable_barcode_lower_idx ON sellable (lower(barcode));
+CREATE INDEX sellable_code_lower_idx ON sellable (lower(code));
+CREATE INDEX storable_batch_batch_number_lower_idx ON storable_batch
+    (lower(batch_number));
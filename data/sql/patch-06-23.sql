@@ -0,0 +1,37 @@
+-- Keep a normalized copy (see stoq_normalize_string) of the columns used
+-- by text searches, so they can be searched using a trigram index instead
+-- of calling stoq_normalize_string for each row of the table.
+
+ALTER TABLE sellable ADD COLUMN description_normalized text;
+ALTER TABLE person ADD COLUMN name_normalized text;
+
+CREATE OR REPLACE FUNCTION update_sellable_normalized() RETURNS trigger AS $$
+BEGIN
+    NEW.description_normalized := stoq_normalize_string(NEW.description);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_person_normalized() RETURNS trigger AS $$
+BEGIN
+    NEW.name_normalized := stoq_normalize_string(NEW.name);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+UPDATE sellable SET description_normalized = stoq_normalize_string(description);
+UPDATE person SET name_normalized = stoq_normalize_string(name);
+
+CREATE TRIGGER update_sellable_normalized_trigger
+    BEFORE INSERT OR UPDATE OF description ON sellable
+    FOR EACH ROW EXECUTE PROCEDURE update_sellable_normalized();
+CREATE TRIGGER update_person_normalized_trigger
+    BEFORE INSERT OR UPDATE OF name ON person
+    FOR EACH ROW EXECUTE PROCEDURE update_person_normalized();
+
+-- This was used by searches comparing stoq_normalize_string(description)
+DROP INDEX IF EXISTS sellable_description_normalized_idx;
+CREATE INDEX sellable_description_normalized_idx ON sellable
+    USING gin (description_normalized gin_trgm_ops);
+CREATE INDEX person_name_normalized_idx ON person
+    USING gin (name_normalized gin_trgm_ops);
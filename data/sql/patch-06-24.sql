@@ -0,0 +1,9 @@
+-- Indexes for the timestamp columns most searched by date. The searches
+-- compare them with ranges of timestamps (see between_dates), which can
+-- be done by scanning a range of those indexes
+
+CREATE INDEX sale_open_date_idx ON sale (open_date);
+CREATE INDEX sale_confirm_date_idx ON sale (confirm_date);
+CREATE INDEX payment_due_date_idx ON payment (due_date);
+CREATE INDEX payment_paid_date_idx ON payment (paid_date);
+CREATE INDEX account_transaction_date_idx ON account_transaction (date);
@@ -0,0 +1,146 @@
+-- Keep the credit balances of the clients up to date as their payments
+-- change, so checking them doesn't need to go through all of their
+-- payment history. See ClientCreditBalance
+
+CREATE TABLE client_credit_balance (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v1(),
+    te_id bigint UNIQUE REFERENCES transaction_entry(id) DEFAULT new_te(),
+    client_id uuid UNIQUE NOT NULL REFERENCES client(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    -- The balance of the paid 'credit' payments, see Client.credit_account_balance
+    credit_balance numeric(20, 2) NOT NULL DEFAULT 0,
+    -- The value of the pending and confirmed 'store_credit' payments,
+    -- see Client.remaining_store_credit
+    store_credit_debit numeric(20, 2) NOT NULL DEFAULT 0
+);
+CREATE RULE update_te AS ON UPDATE TO client_credit_balance DO ALSO SELECT update_te(old.te_id);
+
+-- Calculates the balances of a client from scratch
+CREATE OR REPLACE FUNCTION get_client_credit_totals(
+        client_id_ uuid,
+        OUT credit_balance numeric,
+        OUT store_credit_debit numeric) AS $$
+    SELECT
+        COALESCE(SUM(CASE WHEN payment_method.method_name = 'credit' AND
+                               payment.status = 'paid'
+                          THEN CASE WHEN payment.payment_type = 'out'
+                                    THEN payment.paid_value
+                                    ELSE -payment.paid_value END
+                          ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN payment_method.method_name = 'store_credit' AND
+                               payment.payment_type = 'in' AND
+                               payment.status IN ('pending', 'confirmed')
+                          THEN payment.value
+                          ELSE 0 END), 0)
+    FROM payment
+        JOIN payment_method ON payment_method.id = payment.method_id
+        JOIN payment_group ON payment_group.id = payment.group_id
+        JOIN client ON client.person_id = payment_group.payer_id
+    WHERE client.id = $1 AND
+          payment_method.method_name IN ('credit', 'store_credit');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION rebuild_client_credit_balance(client_id_ uuid)
+        RETURNS void AS $$
+BEGIN
+    UPDATE client_credit_balance SET
+            credit_balance = totals.credit_balance,
+            store_credit_debit = totals.store_credit_debit
+        FROM get_client_credit_totals(client_id_) AS totals
+        WHERE client_credit_balance.client_id = client_id_;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Adds (sign_ = 1) or removes (sign_ = -1) the value of a payment from
+-- the balance of the client paying it, if it affects the balance
+CREATE OR REPLACE FUNCTION apply_client_credit_payment(
+        group_id_ uuid, method_id_ uuid, payment_type_ payment_type,
+        status_ payment_status, value_ numeric, paid_value_ numeric,
+        sign_ integer) RETURNS void AS $$
+DECLARE
+    method_name_ text;
+    credit_ numeric := 0;
+    store_credit_ numeric := 0;
+BEGIN
+    IF group_id_ IS NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT method_name INTO method_name_ FROM payment_method
+        WHERE id = method_id_;
+    IF method_name_ = 'credit' AND status_ = 'paid' THEN
+        credit_ := COALESCE(paid_value_, 0);
+        IF payment_type_ = 'in' THEN
+            credit_ := -credit_;
+        END IF;
+    ELSIF (method_name_ = 'store_credit' AND payment_type_ = 'in' AND
+           status_ IN ('pending', 'confirmed')) THEN
+        store_credit_ := COALESCE(value_, 0);
+    ELSE
+        RETURN;
+    END IF;
+
+    UPDATE client_credit_balance SET
+            credit_balance = credit_balance + sign_ * credit_,
+            store_credit_debit = store_credit_debit + sign_ * store_credit_
+        FROM payment_group, client
+        WHERE payment_group.id = group_id_ AND
+              client.person_id = payment_group.payer_id AND
+              client_credit_balance.client_id = client.id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_client_credit_balance_payment() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        PERFORM apply_client_credit_payment(
+            OLD.group_id, OLD.method_id, OLD.payment_type, OLD.status,
+            OLD.value, OLD.paid_value, -1);
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        PERFORM apply_client_credit_payment(
+            NEW.group_id, NEW.method_id, NEW.payment_type, NEW.status,
+            NEW.value, NEW.paid_value, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_client_credit_balance_group() RETURNS trigger AS $$
+BEGIN
+    -- The payments of the group changed from one payer to another
+    PERFORM rebuild_client_credit_balance(client.id) FROM client
+        WHERE client.person_id IN (OLD.payer_id, NEW.payer_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_client_credit_balance_client() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO client_credit_balance (client_id) VALUES (NEW.id);
+    END IF;
+    -- The person might already have payments
+    PERFORM rebuild_client_credit_balance(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Used to find the payments of a client
+CREATE INDEX payment_group_payer_id_idx ON payment_group (payer_id);
+CREATE INDEX payment_group_id_idx ON payment (group_id);
+
+INSERT INTO client_credit_balance (client_id) SELECT id FROM client;
+SELECT rebuild_client_credit_balance(id) FROM client;
+
+CREATE TRIGGER update_client_credit_balance_payment_trigger
+    AFTER INSERT OR DELETE OR
+        UPDATE OF group_id, method_id, payment_type, status, value, paid_value
+    ON payment
+    FOR EACH ROW EXECUTE PROCEDURE update_client_credit_balance_payment();
+CREATE TRIGGER update_client_credit_balance_group_trigger
+    AFTER UPDATE OF payer_id ON payment_group
+    FOR EACH ROW EXECUTE PROCEDURE update_client_credit_balance_group();
+CREATE TRIGGER update_client_credit_balance_client_trigger
+    AFTER INSERT OR UPDATE OF person_id ON client
+    FOR EACH ROW EXECUTE PROCEDURE update_client_credit_balance_client();
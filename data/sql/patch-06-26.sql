@@ -0,0 +1,138 @@
+-- Keep running totals of the entries of each till, grouped the same way
+-- as the till summary, so the till balances don't need to go through all
+-- of the till entries. See TillTotal
+
+CREATE TABLE till_total (
+    id uuid PRIMARY KEY DEFAULT uuid_generate_v1(),
+    te_id bigint UNIQUE REFERENCES transaction_entry(id) DEFAULT new_te(),
+    till_id uuid NOT NULL REFERENCES till(id)
+        ON UPDATE CASCADE ON DELETE CASCADE,
+    -- NULL for the entries without a payment
+    method_id uuid REFERENCES payment_method(id) ON UPDATE CASCADE,
+    provider_id uuid REFERENCES credit_provider(id) ON UPDATE CASCADE,
+    card_type credit_card_type,
+    -- The sum of the positive entries
+    credits_total numeric(20, 2) NOT NULL DEFAULT 0,
+    -- The sum of the negative entries
+    debits_total numeric(20, 2) NOT NULL DEFAULT 0
+);
+CREATE RULE update_te AS ON UPDATE TO till_total DO ALSO SELECT update_te(old.te_id);
+
+CREATE INDEX till_total_till_id_idx ON till_total (till_id);
+CREATE INDEX till_entry_till_id_idx ON till_entry (till_id);
+CREATE INDEX till_entry_payment_id_idx ON till_entry (payment_id);
+
+-- Calculates the totals of a till from scratch
+CREATE OR REPLACE FUNCTION rebuild_till_total(till_id_ uuid)
+        RETURNS void AS $$
+BEGIN
+    DELETE FROM till_total WHERE till_id = till_id_;
+    INSERT INTO till_total (till_id, method_id, provider_id, card_type,
+                            credits_total, debits_total)
+        SELECT till_entry.till_id, payment.method_id,
+               credit_card_data.provider_id, credit_card_data.card_type,
+               SUM(GREATEST(till_entry.value, 0)),
+               SUM(LEAST(till_entry.value, 0))
+        FROM till_entry
+            LEFT JOIN payment ON payment.id = till_entry.payment_id
+            LEFT JOIN credit_card_data
+                ON credit_card_data.payment_id = payment.id
+        WHERE till_entry.till_id = till_id_
+        GROUP BY till_entry.till_id, payment.method_id,
+                 credit_card_data.provider_id, credit_card_data.card_type;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Adds (sign_ = 1) or removes (sign_ = -1) the value of an entry from
+-- the totals of its till
+CREATE OR REPLACE FUNCTION apply_till_entry(
+        till_id_ uuid, payment_id_ uuid, value_ numeric,
+        sign_ integer) RETURNS void AS $$
+DECLARE
+    method_id_ uuid;
+    provider_id_ uuid;
+    card_type_ credit_card_type;
+    credit_ numeric := sign_ * GREATEST(value_, 0);
+    debit_ numeric := sign_ * LEAST(value_, 0);
+BEGIN
+    IF payment_id_ IS NOT NULL THEN
+        SELECT payment.method_id, credit_card_data.provider_id,
+               credit_card_data.card_type
+            INTO method_id_, provider_id_, card_type_
+            FROM payment
+                LEFT JOIN credit_card_data
+                    ON credit_card_data.payment_id = payment.id
+            WHERE payment.id = payment_id_;
+    END IF;
+
+    UPDATE till_total SET
+            credits_total = credits_total + credit_,
+            debits_total = debits_total + debit_
+        WHERE till_id = till_id_ AND
+              method_id IS NOT DISTINCT FROM method_id_ AND
+              provider_id IS NOT DISTINCT FROM provider_id_ AND
+              card_type IS NOT DISTINCT FROM card_type_;
+    IF NOT FOUND THEN
+        INSERT INTO till_total (till_id, method_id, provider_id, card_type,
+                                credits_total, debits_total)
+            VALUES (till_id_, method_id_, provider_id_, card_type_,
+                    credit_, debit_);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_till_total_entry() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        PERFORM apply_till_entry(OLD.till_id, OLD.payment_id, OLD.value, -1);
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        PERFORM apply_till_entry(NEW.till_id, NEW.payment_id, NEW.value, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The method or the card data of a payment changed, which moves the value
+-- of its entries to another total. That is rare, so just rebuild the tills
+CREATE OR REPLACE FUNCTION rebuild_till_total_for_payment(payment_id_ uuid)
+        RETURNS void AS $$
+BEGIN
+    PERFORM rebuild_till_total(till_id) FROM (
+        SELECT DISTINCT till_id FROM till_entry
+            WHERE payment_id = payment_id_) AS tills;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_till_total_payment() RETURNS trigger AS $$
+BEGIN
+    PERFORM rebuild_till_total_for_payment(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_till_total_card_data() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP != 'INSERT' THEN
+        PERFORM rebuild_till_total_for_payment(OLD.payment_id);
+    END IF;
+    IF TG_OP != 'DELETE' THEN
+        PERFORM rebuild_till_total_for_payment(NEW.payment_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_till_total(id) FROM till;
+
+CREATE TRIGGER update_till_total_entry_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF till_id, payment_id, value
+    ON till_entry
+    FOR EACH ROW EXECUTE PROCEDURE update_till_total_entry();
+CREATE TRIGGER update_till_total_payment_trigger
+    AFTER UPDATE OF method_id ON payment
+    FOR EACH ROW EXECUTE PROCEDURE update_till_total_payment();
+CREATE TRIGGER update_till_total_card_data_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF payment_id, provider_id, card_type
+    ON credit_card_data
+    FOR EACH ROW EXECUTE PROCEDURE update_till_total_card_data();
@@ -0,0 +1,48 @@
+-- Sequences used to allocate codes, like sellable codes and batch numbers,
+-- without scanning the table for the current maximum value and without
+-- two stations getting the same value. See Domain.allocate_values
+
+-- Creates the sequence, starting after start_, if it doesn't exist yet
+CREATE OR REPLACE FUNCTION create_code_sequence(sequence_name_ text,
+                                                start_ bigint)
+        RETURNS void AS $$
+BEGIN
+    -- Avoid two stations creating the same sequence at the same time
+    PERFORM pg_advisory_xact_lock(hashtext(sequence_name_));
+    IF to_regclass(quote_ident(sequence_name_)) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format('CREATE SEQUENCE %I', sequence_name_);
+    PERFORM setval(quote_ident(sequence_name_),
+                  GREATEST(COALESCE(start_, 0), 0) + 1, false);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Returns count_ new values from the sequence or nothing if it doesn't
+-- exist, in which case it should be created with create_code_sequence
+CREATE OR REPLACE FUNCTION allocate_codes(sequence_name_ text, count_ integer)
+        RETURNS SETOF bigint AS $$
+BEGIN
+    IF to_regclass(quote_ident(sequence_name_)) IS NULL THEN
+        RETURN;
+    END IF;
+    RETURN QUERY SELECT nextval(quote_ident(sequence_name_))
+        FROM generate_series(1, count_);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Seed the sequences from the existing values
+SELECT create_code_sequence('code_sellable_code', (
+    SELECT MAX(code::numeric)::bigint FROM sellable
+        WHERE code ~ '^[0-9]{1,18}$'));
+SELECT create_code_sequence('code_storable_batch_batch_number', (
+    SELECT MAX(split_part(batch_number, '-', 1)::numeric)::bigint
+        FROM storable_batch
+        WHERE split_part(batch_number, '-', 1) ~ '^[0-9]{1,18}$'));
+-- On synchronized mode, each branch has its own batch numbers
+SELECT create_code_sequence('code_storable_batch_batch_number_' || acronym, (
+    SELECT MAX(split_part(batch_number, '-', 1)::numeric)::bigint
+        FROM storable_batch
+        WHERE split_part(batch_number, '-', 1) ~ '^[0-9]{1,18}$' AND
+              batch_number LIKE '%-' || acronym))
+    FROM branch WHERE acronym IS NOT NULL AND acronym != '';
@@ -0,0 +1,7 @@
+-- Only the pending incoming payments are checked when looking for the late
+-- payments of a client, see InPaymentView.get_late_payments_query. The payer
+-- is on payment_group, which is already indexed by payer_id, so index the
+-- payments by group and due date.
+
+CREATE INDEX payment_pending_in_due_date_idx ON payment (group_id, due_date)
+    WHERE status = 'pending' AND payment_type = 'in';
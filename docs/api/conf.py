@@ -358,6 +358,8 @@ rst_epilog = """
     :class:`till <stoqlib.domain.till.Till>`
 .. |tillentry| replace::
     :class:`till entry <stoqlib.domain.till.TillEntry>`
+.. |tillentries| replace::
+    :class:`till entries <stoqlib.domain.till.TillEntry>`
 .. |transactionentry| replace::
     :class:`transaction entry <stoqlib.domain.system.TransactionEntry>`
 .. |transporter| replace::
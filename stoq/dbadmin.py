@@ -36,7 +36,7 @@ class StoqCommandHandler:
     def _read_config(self, options, create=False, register_station=True,
                      check_schema=True, load_plugins=True):
         from stoqlib.lib.configparser import StoqConfig
-        from stoq.lib.startup import setup
+        from stoq.lib.startup import log_startup_profile, setup
         config = StoqConfig()
         if options.load_config and options.filename:
             config.load(options.filename)
@@ -51,6 +51,7 @@ class StoqCommandHandler:
         self._db_settings = config.get_settings()
         setup(config, options, register_station=register_station,
               check_schema=check_schema, load_plugins=load_plugins)
+        log_startup_profile(options)
         return config
 
     def add_options(self, parser, cmd):
@@ -425,6 +426,12 @@ class StoqCommandHandler:
             if running:
                 server.call('restart')
 
+        if retval:
+            # The update may have brought new IBPT tables, compile them
+            # now instead of when emitting the first coupon
+            from stoqlib.lib.ibpt import compile_taxes_index
+            compile_taxes_index()
+
         return 0 if retval else 1
 
     def cmd_dump(self, options, output):
@@ -496,6 +503,188 @@ class StoqCommandHandler:
         self._setup_logging()
         self._insert_egg(plugin_name, filename)
 
+    def cmd_compile_ibpt(self, options):
+        """Compile the IBPT tables used to calculate the coupon taxes"""
+        from stoqlib.lib.ibpt import compile_taxes_index
+        index = compile_taxes_index()
+        print("IBPT tables compiled into %s" % (index.filename, ))
+
+    def cmd_client_credit(self, options):
+        """Verify or rebuild the credit balances of the clients"""
+        self._read_config(options, register_station=False)
+        from stoqlib.database.runtime import new_store
+        from stoqlib.domain.person import ClientCreditBalance
+
+        with new_store() as store:
+            if options.rebuild:
+                ClientCreditBalance.rebuild(store)
+                print("Client credit balances rebuilt")
+                return 0
+
+            inconsistent = ClientCreditBalance.find_inconsistent(store)
+            for (client, credit, debit,
+                 expected_credit, expected_debit) in inconsistent:
+                print("%s: credit %s (expected %s), store credit %s "
+                      "(expected %s)" % (client.person.name,
+                                         credit, expected_credit,
+                                         debit, expected_debit))
+            if inconsistent:
+                print("%d inconsistent balances found, run with --rebuild "
+                      "to fix them" % (len(inconsistent), ))
+                return 1
+            print("Client credit balances are consistent")
+            return 0
+
+    def opt_client_credit(self, parser, group):
+        group.add_option('', '--rebuild',
+                         action="store_true",
+                         default=False,
+                         help="Recalculate all balances from the payments",
+                         dest="rebuild")
+
+    def cmd_regenerate_thumbnails(self, options):
+        """Regenerate the thumbnails of the images"""
+        self._read_config(options, register_station=False)
+        from stoqlib.database.runtime import new_store
+        from stoqlib.domain.image import Image
+
+        store = new_store()
+        done = 0
+        for done, total in Image.regenerate_thumbnails(
+                store, regenerate_all=options.all,
+                batch_size=options.batch_size):
+            # Commit each batch, so an interruption doesn't lose everything
+            store.commit(close=False)
+            sys.stdout.write("\rRegenerating thumbnails: %d/%d" % (
+                done, total))
+            sys.stdout.flush()
+        store.close()
+        if done:
+            print()
+        print("%d thumbnails regenerated" % (done, ))
+        return 0
+
+    def opt_regenerate_thumbnails(self, parser, group):
+        group.add_option('', '--all',
+                         action="store_true",
+                         default=False,
+                         help="Regenerate all thumbnails, not only the "
+                              "missing ones",
+                         dest="all")
+        group.add_option('', '--batch-size',
+                         action="store",
+                         type="int",
+                         default=100,
+                         help="How many images are processed at once",
+                         dest="batch_size")
+
+    def cmd_benchmark(self, options):
+        """Benchmark the core operations, optionally generating a dataset"""
+        self._read_config(options)
+        from stoqlib.benchmarks.datagen import DataGenerator
+        from stoqlib.benchmarks.runner import (BenchmarkRunner,
+                                               compare_results,
+                                               get_benchmarks,
+                                               get_default_station,
+                                               load_results, save_results)
+        from stoqlib.database.admin import USER_ADMIN_DEFAULT_NAME
+        from stoqlib.database.runtime import get_current_station, new_store
+        from stoqlib.domain.person import LoginUser
+
+        store = new_store()
+        user = store.find(LoginUser, username=USER_ADMIN_DEFAULT_NAME).one()
+        if options.generate:
+            generator = DataGenerator(user, branches=options.branches,
+                                      sellables=options.sellables,
+                                      sales=options.sales, seed=options.seed)
+            for done, total in generator.iter_generate():
+                sys.stdout.write("\rGenerating data: %d/%d" % (done, total))
+                sys.stdout.flush()
+            print()
+
+        station = get_default_station(store) or get_current_station(store)
+        benchmarks = get_benchmarks()
+        if options.only:
+            names = options.only.split(',')
+            benchmarks = [bench for bench in benchmarks if bench.name in names]
+        runner = BenchmarkRunner(user, station.branch, station,
+                                 repeat=options.repeat)
+        store.close()
+        results = runner.run(benchmarks)
+
+        for name, result in results['benchmarks'].items():
+            print("%-20s median %.3fs, min %.3fs" % (
+                name, result['median'], result['min']))
+        if options.output:
+            save_results(results, options.output)
+            print("Results saved to %s" % (options.output, ))
+
+        if options.compare:
+            regressions = compare_results(load_results(options.compare),
+                                          results, options.threshold)
+            for name, old_median, new_median in regressions:
+                print("%s regressed: %.3fs -> %.3fs" % (
+                    name, old_median, new_median))
+            if regressions:
+                return 1
+        return 0
+
+    def opt_benchmark(self, parser, group):
+        group.add_option('', '--generate',
+                         action="store_true",
+                         default=False,
+                         help="Generate a dataset before running",
+                         dest="generate")
+        group.add_option('', '--branches',
+                         action="store",
+                         type="int",
+                         default=2,
+                         help="Number of branches to generate",
+                         dest="branches")
+        group.add_option('', '--sellables',
+                         action="store",
+                         type="int",
+                         default=5000,
+                         help="Number of sellables to generate",
+                         dest="sellables")
+        group.add_option('', '--sales',
+                         action="store",
+                         type="int",
+                         default=10000,
+                         help="Number of sales to generate",
+                         dest="sales")
+        group.add_option('', '--seed',
+                         action="store",
+                         type="int",
+                         default=0,
+                         help="Seed used to generate the dataset",
+                         dest="seed")
+        group.add_option('', '--repeat',
+                         action="store",
+                         type="int",
+                         default=5,
+                         help="How many times each benchmark is run",
+                         dest="repeat")
+        group.add_option('', '--only',
+                         action="store",
+                         help="Comma separated names of the benchmarks to run",
+                         dest="only")
+        group.add_option('-o', '--output',
+                         action="store",
+                         help="File where the results are saved as JSON",
+                         dest="output")
+        group.add_option('', '--compare',
+                         action="store",
+                         help="Results of a previous run to compare with",
+                         dest="compare")
+        group.add_option('', '--threshold',
+                         action="store",
+                         type="float",
+                         default=0.2,
+                         help="How slower a benchmark must be to be "
+                              "considered a regression",
+                         dest="threshold")
+
     def cmd_generate_sintegra(self, options, filename, month):
         """Generate a sintegra file"""
         import datetime
@@ -529,6 +718,10 @@ class StoqCommandHandler:
         self._read_config(options, register_station=False)
         from stoqlib.importers import importer
         importer = importer.get_by_type(options.type)
+        if options.items_per_commit:
+            importer.set_items_per_commit(options.items_per_commit)
+        if options.checkpoint:
+            importer.set_checkpoint(options.checkpoint)
         importer.feed_file(options.import_filename)
         importer.process()
 
@@ -541,6 +734,15 @@ class StoqCommandHandler:
                          action="store",
                          help="Filename to import",
                          dest="import_filename")
+        group.add_option('', '--items-per-commit',
+                         action="store",
+                         type="int",
+                         help="Number of items imported between commits",
+                         dest="items_per_commit")
+        group.add_option('', '--checkpoint',
+                         action="store",
+                         help="File used to resume an interrupted import",
+                         dest="checkpoint")
 
     def cmd_console(self, options):
         """Drop to a Stoq python console"""
@@ -37,7 +37,7 @@ from kiwi.python import Settable
 from kiwi.ui.dialogs import selectfile
 from kiwi.ui.objectlist import ColoredColumn, Column
 from stoqlib.api import api
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import between_dates
 from stoqlib.database.queryexecuter import DateQueryState, DateIntervalQueryState
 from stoqlib.domain.account import Account, AccountTransaction, AccountTransactionView
 from stoqlib.domain.payment.method import PaymentMethod
@@ -145,10 +145,9 @@ class TransactionPage(object):
         date = self.date_filter.get_state()
         queries = []
         if isinstance(date, DateQueryState) and date.date is not None:
-            queries.append(Date(field) == date.date)
+            queries.append(between_dates(field, date.date, date.date))
         elif isinstance(date, DateIntervalQueryState):
-            queries.append(Date(field) >= date.start)
-            queries.append(Date(field) <= date.end)
+            queries.append(between_dates(field, date.start, date.end))
         return queries
 
     def _payment_query(self, store):
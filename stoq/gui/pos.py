@@ -34,7 +34,6 @@ from kiwi.datatypes import converter, ValidationError
 from kiwi.python import Settable
 from kiwi.ui.objectlist import Column
 from kiwi.ui.widgets.contextmenu import ContextMenu, ContextMenuItem
-from storm.expr import And, Lower
 
 from stoqdrivers.enum import UnitType
 from stoqlib.api import api
@@ -42,9 +41,9 @@ from stoqlib.gui.base.dialogs import (get_current_toplevel, add_current_toplevel
                                       _pop_current_toplevel)
 from stoqlib.domain.payment.group import PaymentGroup
 from stoqlib.domain.person import Transporter, Client
-from stoqlib.domain.product import StorableBatch
 from stoqlib.domain.sale import Delivery, Sale, SaleToken
 from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.sellablelookup import SellableLookup
 from stoqlib.exceptions import StoqlibError, TaxError
 from stoqlib.gui.events import (POSConfirmSaleEvent,
                                 CloseLoanWizardFinishEvent,
@@ -210,6 +209,7 @@ class PosApp(ShellApp):
         self._token = None
         self._till_open = False
         self._manager = None
+        self._sellable_lookup = SellableLookup(cache_size=1000)
 
         # The sellable and batch selected, in case the parameter
         # CONFIRM_QTY_ON_BARCODE_ACTIVATE is used.
@@ -627,36 +627,10 @@ class PosApp(ShellApp):
             text = barinfo.code
             weight = barinfo.weight
 
-        batch = None
-        query = Sellable.status == Sellable.STATUS_AVAILABLE
-
-        # FIXME: Put this logic for getting the sellable based on
-        # barcode/code/batch_number on domain. Note that something very
-        # simular is done on abstractwizard.py
-
-        sellable = self.store.find(
-            Sellable, And(query, Lower(Sellable.barcode) == text.lower())).one()
-
-        # If the barcode didnt match, maybe the user typed the product code
-        if not sellable:
-            sellable = self.store.find(
-                Sellable, And(query, Lower(Sellable.code) == text.lower())).one()
-
-        # If none of the above found, try to get the batch number
-        if not sellable:
-            query = Lower(StorableBatch.batch_number) == text.lower()
-            batch = self.store.find(StorableBatch, query).one()
-            if batch:
-                sellable = batch.storable.product.sellable
-                if not sellable.is_available:
-                    # If the sellable is not available, reset both
-                    sellable = None
-                    batch = None
-
-        # The user can't add the parent product of a grid directly to the sale.
+        # The lookup never returns the parent product of a grid, since it
+        # can't be added directly to the sale.
         # TODO: Display a dialog to let the user choose an specific grid product.
-        if sellable and sellable.product and sellable.product.is_grid:
-            sellable = None
+        sellable, batch = self._sellable_lookup.find(self.store, text)
 
         # If the barcode has the price information, we need to calculate the
         # corresponding weight.
@@ -33,7 +33,7 @@ from kiwi.ui.objectlist import Column
 from storm.expr import And
 
 from stoqlib.api import api
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import between_dates
 from stoqlib.domain.events import SaleAvoidCancelEvent, StockOperationTryFiscalCancelEvent
 from stoqlib.domain.invoice import InvoicePrinter
 from stoqlib.domain.sale import Sale, SaleView
@@ -66,6 +66,7 @@ from stoqlib.gui.widgets.lazyobjectlist import LazySummaryLabel
 from stoqlib.gui.wizards.loanwizard import NewLoanWizard, CloseLoanWizard
 from stoqlib.gui.wizards.salequotewizard import SaleQuoteWizard
 from stoqlib.gui.wizards.workorderquotewizard import WorkOrderQuoteWizard
+from stoqlib.lib.dateutils import localtoday
 from stoqlib.lib.formatters import format_quantity
 from stoqlib.lib.invoice import SaleInvoice, print_sale_invoice
 from stoqlib.lib.message import info, warning
@@ -86,15 +87,17 @@ class FilterItem(object):
 
 SALES_FILTERS = {
     'sold': Sale.status == Sale.STATUS_CONFIRMED,
-    'sold-today': And(Date(Sale.open_date) == date.today(),
+    'sold-today': And(between_dates(Sale.open_date, date.today(), date.today()),
                       Sale.status == Sale.STATUS_CONFIRMED),
-    'sold-7days': And(Date(Sale.open_date) <= date.today(),
-                      Date(Sale.open_date) >= date.today() - relativedelta(days=7),
+    'sold-7days': And(between_dates(Sale.open_date,
+                                    date.today() - relativedelta(days=7),
+                                    date.today()),
                       Sale.status == Sale.STATUS_CONFIRMED),
-    'sold-28days': And(Date(Sale.open_date) <= date.today(),
-                       Date(Sale.open_date) >= date.today() - relativedelta(days=28),
+    'sold-28days': And(between_dates(Sale.open_date,
+                                     date.today() - relativedelta(days=28),
+                                     date.today()),
                        Sale.status == Sale.STATUS_CONFIRMED),
-    'expired-quotes': And(Date(Sale.expire_date) < date.today(),
+    'expired-quotes': And(Sale.expire_date < localtoday(),
                           Sale.status == Sale.STATUS_QUOTE),
 }
 
@@ -466,9 +466,14 @@ class ShellBootstrap(object):
 
 
 def boot_shell(options, initial=True):
+    start = time.perf_counter()
     bootstrap = ShellBootstrap(options=options, initial=initial)
     bootstrap.bootstrap()
 
+    # The startup profile can only be imported after bootstrapping
+    from stoq.lib.startup import startup_timer
+    startup_timer.add(u'bootstrap', time.perf_counter() - start)
+
     # We can now import Shell which can import any dependencies it like,
     # as all should be configured properly at this point
     from stoq.gui.shell.shell import Shell
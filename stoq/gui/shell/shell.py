@@ -65,8 +65,10 @@ class ShellDatabaseConnection(object):
         self._ran_wizard = False
 
     def connect(self):
-        self._load_configuration()
-        self._maybe_run_first_time_wizard()
+        from stoq.lib.startup import startup_timer
+        with startup_timer.phase(u'configuration'):
+            self._load_configuration()
+            self._maybe_run_first_time_wizard()
         self._try_connect()
         self._post_connect()
 
@@ -152,16 +154,23 @@ class ShellDatabaseConnection(object):
                       'error=%s uri=%s' % (str(e), store_uri))
 
     def _post_connect(self):
-        self._check_schema_migration()
-        self._check_branch()
-        self._activate_plugins()
+        from stoq.lib.startup import startup_timer
+        with startup_timer.phase(u'schema'):
+            self._check_schema_migration()
+        with startup_timer.phase(u'station'):
+            self._check_branch()
+        with startup_timer.phase(u'plugins'):
+            self._activate_plugins()
 
     def _check_schema_migration(self):
         from stoqlib.lib.message import error
         from stoqlib.database.migration import needs_schema_update
         from stoqlib.exceptions import DatabaseInconsistency
-        if needs_schema_update():
-            self._run_update_wizard()
+        # needs_schema_update already checked the schema and the plugins,
+        # they only need to be checked again after updating them
+        if not needs_schema_update():
+            return
+        self._run_update_wizard()
 
         from stoqlib.database.migration import StoqlibSchemaMigration
         migration = StoqlibSchemaMigration()
@@ -525,16 +534,20 @@ class Shell(object):
     #
 
     def _on_app__activate(self, app):
+        from stoq.lib.startup import log_startup_profile, startup_timer
         appname = self._appname
         action_name = self._action_name
         self._dbconn.connect()
-        if not self._do_login():
-            raise SystemExit
+        with startup_timer.phase(u'login'):
+            if not self._do_login():
+                raise SystemExit
         if appname is None:
             appname = u'launcher'
-        shell_window = self.create_window()
-        app = shell_window.run_application(str(appname))
-        shell_window.show()
+        with startup_timer.phase(u'application'):
+            shell_window = self.create_window()
+            app = shell_window.run_application(str(appname))
+            shell_window.show()
+        log_startup_profile(self._options)
 
         if action_name is not None:
             action = getattr(app, action_name, None)
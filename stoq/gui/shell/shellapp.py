@@ -36,7 +36,6 @@ from stoqlib.gui.dialogs.spreadsheetexporterdialog import SpreadSheetExporter
 from stoqlib.gui.events import ApplicationSetupSearchEvent
 from stoqlib.gui.search.searchslave import SearchSlave
 from stoqlib.gui.utils.printing import print_report
-from stoqlib.gui.widgets.lazyobjectlist import LazyObjectModel
 from stoqlib.lib.decorators import cached_function
 from stoqlib.lib.translation import stoqlib_gettext as _
 
@@ -207,8 +206,9 @@ class ShellApp(GladeDelegate):
         if self.search_spec is None:  # pragma no cover
             raise NotImplementedError
 
-        # Print all the results
-        results = list(self.search.get_last_results())
+        # Print all the results. The report streams them from the result
+        # set, instead of having all of them in memory at the same time
+        results = self.search.get_last_results()
         self.print_report(self.report_table, self.results, results)
 
     def export_spreadsheet_activate(self):
@@ -216,12 +216,11 @@ class ShellApp(GladeDelegate):
         if self.search_spec is None:  # pragma no cover
             raise NotImplementedError
 
-        model = self.results.get_model()
-        if isinstance(model, LazyObjectModel):
-            model.load_items_from_results(0, model._count)
-
+        # Export the result set instead of the rows loaded on the lazy
+        # objectlist, so the exporter can stream them from the database
         sse = SpreadSheetExporter()
         sse.export(object_list=self.results,
+                   data=self.search.get_last_results(),
                    name=self.app_name,
                    filename_prefix=self.app_name)
 
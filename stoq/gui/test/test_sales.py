@@ -208,8 +208,9 @@ class TestSales(BaseGUITest):
     def test_export_spreadsheet(self, export):
         app = self.create_app(SalesApp, u'sales')
         self.activate(app.window.export)
-        export.assert_called_once_with(object_list=app.results, name='sales',
-                                       filename_prefix='sales')
+        export.assert_called_once_with(
+            object_list=app.results, data=app.search.get_last_results(),
+            name='sales', filename_prefix='sales')
 
     @mock.patch('stoqlib.gui.slaves.saleslave.api.new_store')
     @mock.patch('stoqlib.gui.slaves.saleslave.run_dialog')
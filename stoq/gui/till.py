@@ -36,7 +36,7 @@ from stoqlib.api import api
 from stoqlib.enums import SearchFilterPosition
 from stoqlib.exceptions import (StoqlibError, TillError, SellError,
                                 ModelDataError)
-from stoqlib.database.expr import Date
+from stoqlib.database.expr import between_dates
 from stoqlib.domain.sale import Sale, SaleView
 from stoqlib.domain.till import Till
 from stoqlib.domain.payment.payment import Payment
@@ -256,7 +256,8 @@ class TillApp(ShellApp):
         query = And(Sale.branch == self.current_branch,
                     Or(Sale.status == Sale.STATUS_QUOTE,
                        Sale.status == Sale.STATUS_ORDERED,
-                       Date(Sale.open_date) == date.today()))
+                       between_dates(Sale.open_date,
+                                     date.today(), date.today())))
 
         return store.find(self.search_spec, query)
 
@@ -367,7 +368,8 @@ class TillApp(ShellApp):
     def _get_total_paid_payment(self):
         """Returns the total of payments of the day"""
         payments = self.store.find(Payment,
-                                   Date(Payment.paid_date) == localtoday())
+                                   between_dates(Payment.paid_date,
+                                                 localtoday(), localtoday()))
         return payments.sum(Payment.paid_value) or 0
 
     def _get_till_balance(self):
@@ -53,6 +53,15 @@ def get_option_parser():
     group.add_option('', '--sql',
                      action="store_true",
                      dest="sqldebug")
+    group.add_option('', '--sql-profile',
+                     action="store",
+                     dest="sqlprofile",
+                     help='Profile the SQL statements, writing a report '
+                          'to this file on exit')
+    group.add_option('', '--profile-startup',
+                     action="store_true",
+                     dest="profile_startup",
+                     help='Log the time spent on each phase of the startup')
     group.add_option('', '--debug',
                      action="store_true",
                      dest="debug")
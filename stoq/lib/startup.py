@@ -32,19 +32,38 @@ import sys
 from kiwi.component import provide_utility
 from stoqlib.database.migration import StoqlibSchemaMigration
 from stoqlib.database.debug import enable as enable_debugging
-from stoqlib.database.runtime import (get_default_store,
+from stoqlib.database.debug import enable_profiler
+from stoqlib.database.runtime import (get_current_branch,
+                                      get_default_store,
                                       set_current_branch_station)
 from stoqlib.exceptions import DatabaseError
 from stoqlib.lib.configparser import register_config, StoqConfig
 from stoqlib.lib.interfaces import IApplicationDescriptions
 from stoqlib.lib.message import error
 from stoqlib.lib.osutils import read_registry_key
+from stoqlib.lib.timing import PhaseTimer
 from stoqlib.lib.translation import stoqlib_gettext as _
 
 from stoq.lib.options import get_option_parser
 
 log = logging.getLogger(__name__)
 
+#: The time spent on each phase of the startup, see :func:`log_startup_profile`
+startup_timer = PhaseTimer(u'startup')
+
+
+def log_startup_profile(options):
+    """Logs the time spent on each phase of the startup
+
+    This is only done when running with ``--profile-startup`` or with the
+    ``STOQ_PROFILE_STARTUP`` environment variable set.
+
+    :param options: the options given on the command line
+    """
+    if (getattr(options, 'profile_startup', False) or
+            os.environ.get('STOQ_PROFILE_STARTUP')):
+        startup_timer.log(log, logging.INFO)
+
 
 def setup_path():
     import platform
@@ -98,58 +117,77 @@ def setup(config=None, options=None, register_station=True, check_schema=True,
         from kiwi.log import set_log_level
         set_log_level('stoq*', 0)
 
-    setup_path()
-
-    if config is None:
-        config = StoqConfig()
-        if options.filename:
-            config.load(options.filename)
-        else:
-            config.load_default()
-    config.set_from_options(options)
+    with startup_timer.phase(u'configuration'):
+        setup_path()
 
-    register_config(config)
+        if config is None:
+            config = StoqConfig()
+            if options.filename:
+                config.load(options.filename)
+            else:
+                config.load_default()
+        config.set_from_options(options)
 
-    if options and options.sqldebug:
-        enable_debugging()
+        register_config(config)
 
-    from stoq.lib.applist import ApplicationDescriptions
-    provide_utility(IApplicationDescriptions, ApplicationDescriptions(),
-                    replace=True)
+        if options and options.sqldebug:
+            enable_debugging()
 
-    db_settings = config.get_settings()
-    try:
-        default_store = get_default_store()
-    except DatabaseError as e:
-        # Only raise an error if a database is actually required
-        if register_station or load_plugins or check_schema:
-            error(e.short, str(e.msg))
-        else:
-            default_store = None
+        sql_profile = (getattr(options, 'sqlprofile', None) or
+                       os.environ.get('STOQLIB_SQL_PROFILE'))
+        if sql_profile:
+            enable_profiler(sql_profile)
+
+        from stoq.lib.applist import ApplicationDescriptions
+        provide_utility(IApplicationDescriptions, ApplicationDescriptions(),
+                        replace=True)
+
+    with startup_timer.phase(u'database'):
+        db_settings = config.get_settings()
+        try:
+            default_store = get_default_store()
+        except DatabaseError as e:
+            # Only raise an error if a database is actually required
+            if register_station or load_plugins or check_schema:
+                error(e.short, str(e.msg))
+            else:
+                default_store = None
+
+        if register_station:
+            db_settings.check_version(default_store)
+
+    # Check the schema only once, before anything that depends on it
+    if check_schema:
+        with startup_timer.phase(u'schema'):
+            if not default_store.table_exists('system_table'):
+                error(
+                    _("Database schema error"),
+                    _("Table 'system_table' does not exist.\n"
+                      "Consult your database administrator to solve this "
+                      "problem."))
 
-    if register_station:
-        db_settings.check_version(default_store)
-        if check_schema:
             migration = StoqlibSchemaMigration()
             migration.check()
 
-        if options and options.sqldebug:
-            enable_debugging()
+    if register_station:
+        with startup_timer.phase(u'station'):
+            if options and options.sqldebug:
+                enable_debugging()
 
-        set_current_branch_station(default_store, station_name=None)
+            set_current_branch_station(default_store, station_name=None)
 
-    if load_plugins:
-        from stoqlib.lib.pluginmanager import get_plugin_manager
-        manager = get_plugin_manager()
-        manager.activate_installed_plugins()
+            # Keep the parameters cache in sync with the other stations
+            from stoqlib.lib.parameters import sysparam
+            sysparam.start_listening()
 
-    if check_schema:
-        if not default_store.table_exists('system_table'):
-            error(
-                _("Database schema error"),
-                _("Table 'system_table' does not exist.\n"
-                  "Consult your database administrator to solve this problem."))
+            # Compile the IBPT table used by the coupons beforehand
+            branch = get_current_branch(default_store)
+            if branch is not None:
+                from stoqlib.lib.ibpt import compile_branch_taxes_in_background
+                compile_branch_taxes_in_background(branch)
 
-        if check_schema:
-            migration = StoqlibSchemaMigration()
-            migration.check()
+    if load_plugins:
+        with startup_timer.phase(u'plugins'):
+            from stoqlib.lib.pluginmanager import get_plugin_manager
+            manager = get_plugin_manager()
+            manager.activate_installed_plugins()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+__tests__ = 'stoq/lib/startup.py'
+
+import unittest
+
+import mock
+
+from stoq.lib import startup
+
+
+class TestSetup(unittest.TestCase):
+    def setUp(self):
+        self.calls = mock.Mock()
+        self.store = self.calls.store
+        self.store.table_exists.return_value = True
+        self.migration = self.calls.migration
+        patchers = [
+            mock.patch('stoq.lib.startup.register_config'),
+            mock.patch('stoq.lib.startup.provide_utility'),
+            mock.patch('stoq.lib.startup.error', self.calls.error),
+            mock.patch('stoq.lib.startup.get_default_store',
+                       return_value=self.store),
+            mock.patch('stoq.lib.startup.StoqlibSchemaMigration',
+                       return_value=self.migration),
+            mock.patch('stoq.lib.startup.set_current_branch_station',
+                       self.calls.set_current_branch_station),
+            mock.patch('stoq.lib.startup.get_current_branch',
+                       return_value=None),
+            mock.patch('stoqlib.lib.parameters.sysparam.start_listening',
+                       self.calls.start_listening),
+            mock.patch('stoqlib.lib.pluginmanager.get_plugin_manager',
+                       return_value=self.calls.manager),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _setup(self, **kwargs):
+        options = mock.Mock(verbose=False, filename=None, sqldebug=False,
+                            sqlprofile=None)
+        startup.setup(config=self.calls.config, options=options, **kwargs)
+        return [name for name, args, kwargs in self.calls.mock_calls
+                if name in ['store.table_exists', 'migration.check',
+                            'set_current_branch_station',
+                            'start_listening',
+                            'manager.activate_installed_plugins',
+                            'error']]
+
+    def test_setup(self):
+        # The schema is checked only once, before anything depending on it
+        self.assertEqual(self._setup(), [
+            'store.table_exists',
+            'migration.check',
+            'set_current_branch_station',
+            'start_listening',
+            'manager.activate_installed_plugins'])
+
+    def test_setup_no_check_schema(self):
+        self.assertEqual(self._setup(check_schema=False), [
+            'set_current_branch_station',
+            'start_listening',
+            'manager.activate_installed_plugins'])
+
+    def test_setup_only_check_schema(self):
+        self.assertEqual(
+            self._setup(register_station=False, load_plugins=False),
+            ['store.table_exists', 'migration.check'])
+
+    def test_setup_no_system_table(self):
+        self.store.table_exists.return_value = False
+        self.assertEqual(
+            self._setup(register_station=False, load_plugins=False),
+            ['store.table_exists', 'error', 'migration.check'])
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Generation of synthetic datasets for the benchmarks"""
+
+import collections
+import datetime
+import logging
+import random
+from decimal import Decimal
+
+from stoqlib.database.runtime import new_store
+from stoqlib.domain.address import Address, CityLocation
+from stoqlib.domain.payment.group import PaymentGroup
+from stoqlib.domain.payment.method import PaymentMethod
+from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.person import (Branch, Client, Company, Employee,
+                                   EmployeeRole, Individual, LoginUser,
+                                   Person, SalesPerson, Supplier)
+from stoqlib.domain.product import (Product, ProductSupplierInfo,
+                                    StockMovement, Storable,
+                                    StockTransactionHistory)
+from stoqlib.domain.purchase import PurchaseOrder
+from stoqlib.domain.sale import Sale
+from stoqlib.domain.sellable import Sellable, SellableCategory
+from stoqlib.domain.station import BranchStation
+from stoqlib.domain.till import Till
+from stoqlib.lib.dateutils import localdatetime
+from stoqlib.lib.parameters import sysparam
+
+log = logging.getLogger(__name__)
+
+#: The maximum quantity of each item of the generated sales
+MAX_SALE_QUANTITY = 3
+
+#: The generated dates are spread over the days before this one, so they
+#: do not depend on when the dataset is generated
+EPOCH = localdatetime(2026, 1, 1)
+
+_KINDS = [u'Shirt', u'Pants', u'Shoes', u'Hat', u'Jacket', u'Socks',
+          u'Dress', u'Skirt', u'Belt', u'Scarf', u'Gloves', u'Bag']
+_BRANDS = [u'Acme', u'Globex', u'Initech', u'Umbrella', u'Hooli',
+           u'Vandelay', u'Soylent', u'Stark', u'Wayne', u'Tyrell']
+_VARIANTS = [u'Blue', u'Red', u'Black', u'White', u'Green', u'Small',
+             u'Medium', u'Large', u'Slim', u'Classic', u'Sport', u'Kids']
+_NAMES = [u'Maria', u'José', u'Ana', u'João', u'Antônio', u'Francisca',
+          u'Carlos', u'Paulo', u'Adriana', u'Lucas', u'Juliana', u'Pedro']
+_SURNAMES = [u'Silva', u'Santos', u'Oliveira', u'Souza', u'Lima',
+             u'Pereira', u'Ferreira', u'Costa', u'Rodrigues', u'Almeida']
+
+
+class DataGenerator(object):
+    """Generates a synthetic dataset to run the benchmarks on
+
+    The dataset has *branches* branches, each one with its own station and
+    an open |till|, *clients* clients, *sellables* products with stock on
+    all the branches, *purchases* confirmed purchase orders and *sales*
+    confirmed sales with their items and payments. The dates of the
+    purchases and sales are spread over the *days* days before
+    :data:`EPOCH`.
+
+    The same *seed* will always generate the same data, so the results
+    of the benchmarks can be compared. The codes of the sellables are
+    made of the seed and their index, so datasets generated with
+    different seeds can live in the same database.
+
+    :param user: the |loginuser| responsible for the generated objects
+    :param branches: the number of branches to create
+    :param sellables: the number of sellables to create
+    :param sales: the number of sales to create
+    :param clients: the number of clients to create. Defaults to
+      one for each 10 sales
+    :param purchases: the number of purchase orders to create. Defaults
+      to one for each 20 sales
+    :param items_per_sale: the number of items of each sale and purchase
+    :param days: the number of days the dates are spread over
+    :param items_per_commit: the number of objects created between commits
+    :param seed: the seed of the random number generator
+    """
+
+    def __init__(self, user, branches=1, sellables=1000, sales=1000,
+                 clients=None, purchases=None, items_per_sale=5, days=365,
+                 items_per_commit=500, seed=0):
+        self.user_id = user.id
+        self.branches = branches
+        self.sellables = sellables
+        self.sales = sales
+        self.clients = sales // 10 + 1 if clients is None else clients
+        self.purchases = sales // 20 + 1 if purchases is None else purchases
+        self.items_per_sale = min(items_per_sale, sellables)
+        self.days = days
+        self.items_per_commit = items_per_commit
+        self.seed = seed
+
+    #
+    #  Public API
+    #
+
+    def generate(self, store=None):
+        """Generates the dataset
+
+        See :meth:`.iter_generate`
+
+        :param store: a store or ``None`` to use a new one
+        """
+        for done, total in self.iter_generate(store):
+            pass
+
+    def iter_generate(self, store=None):
+        """Generates the dataset, reporting the progress
+
+        When *store* is not given, a new one is created and committed
+        every *items_per_commit* objects. Otherwise, nothing is committed
+        and the caller is responsible for that.
+
+        :param store: a store or ``None`` to use a new one
+        :returns: an iterator yielding a ``(done, total)`` tuple after
+          each object is created
+        """
+        self._random = random.Random(self.seed)
+        self._ids = collections.defaultdict(list)
+        self._movements = []
+
+        batched = store is None
+        if batched:
+            store = new_store()
+        self._create_common(store)
+
+        steps = [(self._create_branch, self.branches),
+                 (self._create_client, self.clients),
+                 (self._create_sellable, self.sellables),
+                 (self._create_purchase, self.purchases),
+                 (self._create_sale, self.sales)]
+        total = sum(count for func, count in steps)
+        done = 0
+        for func, count in steps:
+            for i in range(count):
+                func(store, i)
+                done += 1
+                if batched and done % self.items_per_commit == 0:
+                    self._flush(store)
+                    store.commit(close=True)
+                    store = new_store()
+                    log.info('Generated %d of %d objects' % (done, total))
+                yield done, total
+            # The objects of the next step depend on the ones created by
+            # this one, like the sales on the stock of the sellables
+            self._flush(store)
+
+        if batched:
+            store.commit(close=True)
+
+    #
+    #  Private
+    #
+
+    def _get_date(self):
+        seconds = self._random.randint(0, self.days * 24 * 60 * 60)
+        return EPOCH - datetime.timedelta(seconds=seconds)
+
+    def _get_price(self, low, high):
+        return Decimal(self._random.randint(low * 100, high * 100)) / 100
+
+    def _get_person_name(self):
+        return u'%s %s' % (self._random.choice(_NAMES),
+                           self._random.choice(_SURNAMES))
+
+    def _flush(self, store):
+        if self._movements:
+            user = store.get(LoginUser, self.user_id)
+            Storable.apply_stock_movements(store, self._movements, user)
+            self._movements = []
+        store.flush()
+
+    def _create_common(self, store):
+        role = store.find(EmployeeRole, name=u'Salesperson').one()
+        if role is None:
+            role = EmployeeRole(store=store, name=u'Salesperson')
+        person = Person(store=store, name=self._get_person_name())
+        Individual(store=store, person=person)
+        Employee(store=store, person=person, role=role)
+        self._salesperson_id = SalesPerson(store=store, person=person).id
+
+        person = Person(store=store, name=u'Benchmark supplier')
+        Company(store=store, person=person,
+                fancy_name=u'Benchmark supplier')
+        self._supplier_id = Supplier(store=store, person=person).id
+
+        base_category = SellableCategory(store=store,
+                                         description=u'Benchmark')
+        for kind in _KINDS:
+            category = SellableCategory(store=store, description=kind,
+                                        category=base_category)
+            self._ids['category'].append(category.id)
+
+    def _create_branch(self, store, index):
+        name = u'Benchmark branch %d' % (index + 1, )
+        person = Person(store=store, name=name)
+        Company(store=store, person=person, fancy_name=name)
+        Address(store=store, person=person, is_main_address=True,
+                city_location=CityLocation.get_default(store),
+                street=u'Benchmark street', streetnumber=index + 1,
+                district=u'Downtown')
+        branch = Branch(store=store, person=person)
+        user = store.get(LoginUser, self.user_id)
+        user.add_access_to(branch)
+
+        # Station names must be unique, even across different branches
+        station = BranchStation.create(store, branch,
+                                       u'benchmark-%s' % (branch.id, ))
+        till = Till(store=store, branch=branch, station=station)
+        till.open_till(user)
+        self._ids['branch'].append((branch.id, station.id, till.id))
+
+    def _create_client(self, store, index):
+        person = Person(store=store, name=self._get_person_name())
+        Individual(store=store, person=person)
+        self._ids['client'].append(Client(store=store, person=person).id)
+
+    def _create_sellable(self, store, index):
+        code = u'%03d%07d' % (self.seed % 1000, index + 1)
+        cost = self._get_price(1, 100)
+        markup = Decimal(self._random.randint(130, 200)) / 100
+        description = u'%s %s %s' % (self._random.choice(_KINDS),
+                                     self._random.choice(_BRANDS),
+                                     self._random.choice(_VARIANTS))
+        sellable = Sellable(
+            store=store, description=description, cost=cost,
+            price=(cost * markup).quantize(Decimal('0.01')),
+            category_id=self._random.choice(self._ids['category']))
+        sellable.code = code
+        sellable.barcode = u'%013d' % (2000000000000 + int(code), )
+        sellable.tax_constant_id = sysparam.get_object_id(
+            'DEFAULT_PRODUCT_TAX_CONSTANT')
+        product = Product(store=store, sellable=sellable)
+        ProductSupplierInfo(store=store, product=product, base_cost=cost,
+                            supplier_id=self._supplier_id,
+                            is_main_supplier=True)
+        storable = Storable(store=store, product=product)
+
+        # Enough stock to make sure the generated sales will never make
+        # it negative, no matter how many of them have this sellable
+        quantity = self.sales * MAX_SALE_QUANTITY + self._random.randint(
+            10, 100)
+        for branch_id, station_id, till_id in self._ids['branch']:
+            self._movements.append(StockMovement(
+                storable=storable, branch=store.get(Branch, branch_id),
+                quantity=quantity, type=StockTransactionHistory.TYPE_INITIAL,
+                object_id=None, unit_cost=cost))
+        self._ids['sellable'].append(sellable.id)
+
+    def _get_sellables(self, store):
+        sellable_ids = self._random.sample(self._ids['sellable'],
+                                           self.items_per_sale)
+        return [store.get(Sellable, sellable_id)
+                for sellable_id in sellable_ids]
+
+    def _create_purchase(self, store, index):
+        branch_id, station_id, till_id = self._random.choice(
+            self._ids['branch'])
+        branch = store.get(Branch, branch_id)
+        station = store.get(BranchStation, station_id)
+        user = store.get(LoginUser, self.user_id)
+        date = self._get_date()
+
+        order = PurchaseOrder(store=store, branch=branch, station=station,
+                              supplier_id=self._supplier_id,
+                              group=PaymentGroup(store=store),
+                              responsible=user, open_date=date)
+        order.status = PurchaseOrder.ORDER_PENDING
+        for sellable in self._get_sellables(store):
+            order.add_item(sellable, quantity=self._random.randint(10, 100))
+
+        method = PaymentMethod.get_by_name(store, u'bill')
+        method.create_payment(branch, station, Payment.TYPE_OUT, order.group,
+                              order.purchase_total,
+                              due_date=date + datetime.timedelta(days=30))
+        order.confirm(user, confirm_date=date)
+
+    def _create_sale(self, store, index):
+        branch_id, station_id, till_id = self._random.choice(
+            self._ids['branch'])
+        branch = store.get(Branch, branch_id)
+        station = store.get(BranchStation, station_id)
+        user = store.get(LoginUser, self.user_id)
+        date = self._get_date()
+
+        # Some of the sales are made to unidentified clients
+        client = None
+        if self._ids['client'] and self._random.random() < 0.7:
+            client = store.get(Client,
+                               self._random.choice(self._ids['client']))
+        group = PaymentGroup(store=store, payer=client and client.person)
+        sale = Sale(store=store, branch=branch, station=station,
+                    salesperson_id=self._salesperson_id, client=client,
+                    cfop_id=sysparam.get_object_id('DEFAULT_SALES_CFOP'),
+                    group=group, open_date=date)
+        for sellable in self._get_sellables(store):
+            sale.add_sellable(
+                sellable,
+                quantity=self._random.randint(1, MAX_SALE_QUANTITY))
+        sale.order(user)
+
+        method_name = self._random.choice([u'money', u'money', u'bill'])
+        method = PaymentMethod.get_by_name(store, method_name)
+        method.create_payment(branch, station, Payment.TYPE_IN, group,
+                              sale.get_total_sale_amount(), due_date=date)
+        sale.confirm(user, till=store.get(Till, till_id))
+        sale.confirm_date = date
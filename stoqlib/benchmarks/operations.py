@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""The benchmarked operations
+
+The operations are done on the branch and station of the
+:class:`stoqlib.benchmarks.runner.BenchmarkContext`, using the
+data that is already in the database, like the one created by
+:class:`stoqlib.benchmarks.datagen.DataGenerator`.
+"""
+
+from storm.expr import And, Desc, Eq, Join
+
+from stoqlib.benchmarks.runner import benchmark
+from stoqlib.database.queryexecuter import QueryExecuter
+from stoqlib.domain.inventory import Inventory
+from stoqlib.domain.payment.group import PaymentGroup
+from stoqlib.domain.payment.method import PaymentMethod
+from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.payment.views import InPaymentView, OutPaymentView
+from stoqlib.domain.person import ClientView, SalesPerson, Supplier
+from stoqlib.domain.product import ProductStockItem, Storable
+from stoqlib.domain.purchase import PurchaseOrder, PurchaseOrderView
+from stoqlib.domain.receiving import ReceivingInvoice, ReceivingOrder
+from stoqlib.domain.sale import Sale, SaleView
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.till import Till
+from stoqlib.domain.views import ProductFullStockView
+from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.translation import stoqlib_gettext
+
+_ = stoqlib_gettext
+
+#: The number of items of the sales and purchases created by the benchmarks
+ITEMS_COUNT = 10
+
+
+def _get_sellables(context, count=ITEMS_COUNT):
+    # Products with stock on the branch, which can be sold right away
+    tables = [Sellable,
+              Join(Storable, Storable.id == Sellable.id),
+              Join(ProductStockItem, ProductStockItem.storable_id == Storable.id)]
+    query = And(ProductStockItem.branch_id == context.branch.id,
+                ProductStockItem.quantity >= 1,
+                Eq(Storable.is_batch, False),
+                Sellable.status == Sellable.STATUS_AVAILABLE)
+    return list(context.store.using(*tables).find(Sellable, query).order_by(
+        Sellable.code)[:count])
+
+
+def _get_till(context):
+    till = Till.get_current(context.store, context.station)
+    if till is None:
+        till = Till(store=context.store, branch=context.branch,
+                    station=context.station)
+        till.open_till(context.user)
+    return till
+
+
+def _search(context, search_spec, order_by, resultset=None):
+    # Do the same queries a search in the applications would do
+    executer = QueryExecuter(context.store)
+    executer.set_search_spec(search_spec)
+    executer.set_order_by(order_by)
+    executer.set_limit(sysparam.get_int('MAX_SEARCH_RESULTS'))
+    with context.phase(u'results'):
+        results = executer.search(resultset=resultset)
+        list(results)
+    with context.phase(u'summary'):
+        executer.get_post_result(results)
+
+
+@benchmark(u'sale_confirm')
+def sale_confirm(context):
+    """Confirm a sale paid with money"""
+    store = context.store
+    till = _get_till(context)
+    group = PaymentGroup(store=store)
+    sale = Sale(store=store, branch=context.branch, station=context.station,
+                salesperson=store.find(SalesPerson).order_by(
+                    SalesPerson.id).first(),
+                cfop_id=sysparam.get_object_id('DEFAULT_SALES_CFOP'),
+                group=group)
+    for sellable in _get_sellables(context):
+        sale.add_sellable(sellable)
+    sale.order(context.user)
+    method = PaymentMethod.get_by_name(store, u'money')
+    method.create_payment(context.branch, context.station, Payment.TYPE_IN,
+                          group, sale.get_total_sale_amount())
+
+    with context.phase(u'confirm'):
+        sale.confirm(context.user, till=till)
+
+
+@benchmark(u'receiving_confirm')
+def receiving_confirm(context):
+    """Receive the products of a purchase order"""
+    store = context.store
+    supplier = store.find(Supplier).order_by(Supplier.id).first()
+    order = PurchaseOrder(store=store, branch=context.branch,
+                          station=context.station, supplier=supplier,
+                          group=PaymentGroup(store=store),
+                          responsible=context.user)
+    order.status = PurchaseOrder.ORDER_PENDING
+    for sellable in _get_sellables(context):
+        order.add_item(sellable, quantity=10)
+    order.confirm(context.user)
+
+    invoice = ReceivingInvoice(store=store, invoice_number=1,
+                               supplier=supplier, branch=context.branch,
+                               station=context.station,
+                               responsible=context.user)
+    receiving = ReceivingOrder(store=store, invoice_number=1,
+                               branch=context.branch,
+                               station=context.station,
+                               responsible=context.user,
+                               receiving_invoice=invoice)
+    receiving.add_purchase(order)
+    for item in order.get_items():
+        receiving.add_purchase_item(item)
+
+    with context.phase(u'confirm'):
+        receiving.confirm(context.user)
+
+
+@benchmark(u'inventory_open')
+def inventory_open(context):
+    """Open an inventory with all the products of the branch"""
+    with context.phase(u'open'):
+        Inventory.create_inventory(context.store, context.branch,
+                                   context.station, context.user)
+
+
+@benchmark(u'inventory_close')
+def inventory_close(context):
+    """Adjust all the items of an inventory and close it"""
+    inventory = Inventory.create_inventory(context.store, context.branch,
+                                           context.station, context.user)
+    inventory.invoice_number = 1
+    items = list(inventory.get_items())
+    for item in items:
+        item.counted_quantity = item.recorded_quantity + 1
+        item.actual_quantity = item.counted_quantity
+        item.reason = _(u'Automatic adjustment')
+
+    with context.phase(u'adjust'):
+        inventory.adjust_items(items, context.user, inventory.invoice_number)
+    with context.phase(u'close'):
+        inventory.close()
+
+
+@benchmark(u'product_stock_view')
+def product_stock_view(context):
+    """Fetch the stock of all the products of the branch"""
+    with context.phase(u'results'):
+        list(ProductFullStockView.find_by_branch(context.store,
+                                                 context.branch))
+
+
+@benchmark(u'till_close')
+def till_close(context):
+    """Close the till of the station"""
+    till = _get_till(context)
+    with context.phase(u'close'):
+        till.close_till(context.user)
+
+
+@benchmark(u'search_sales')
+def search_sales(context):
+    """Search the sales, like the sales application"""
+    _search(context, SaleView, Desc(SaleView.open_date))
+
+
+@benchmark(u'search_receivable')
+def search_receivable(context):
+    """Search the incoming payments, like the accounts receivable
+    application"""
+    _search(context, InPaymentView, InPaymentView.due_date)
+
+
+@benchmark(u'search_payable')
+def search_payable(context):
+    """Search the outgoing payments, like the accounts payable
+    application"""
+    _search(context, OutPaymentView, OutPaymentView.due_date)
+
+
+@benchmark(u'search_purchases')
+def search_purchases(context):
+    """Search the purchase orders, like the purchase application"""
+    _search(context, PurchaseOrderView, Desc(PurchaseOrderView.open_date))
+
+
+@benchmark(u'search_clients')
+def search_clients(context):
+    """Search the clients"""
+    _search(context, ClientView, ClientView.name)
+
+
+@benchmark(u'search_stock')
+def search_stock(context):
+    """Search the products of the branch, like the stock application"""
+    _search(context, ProductFullStockView, ProductFullStockView.description,
+            resultset=ProductFullStockView.find_by_branch(context.store,
+                                                          context.branch))
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Running the benchmarks and storing their results
+
+A benchmark is a function receiving a :class:`BenchmarkContext`. It
+prepares whatever it needs and wraps the operations being measured
+with :meth:`BenchmarkContext.phase`::
+
+    @benchmark(u'till_close')
+    def till_close(context):
+        till = Till.get_current(context.store, context.station)
+        with context.phase(u'close'):
+            till.close_till(context.user)
+
+Each run of a benchmark is rolled back after it finishes, so they can
+be executed many times on the same dataset.
+"""
+
+import collections
+import contextlib
+import datetime
+import importlib
+import json
+import logging
+import statistics
+
+from storm.expr import Count, Desc, Join, Select
+
+import stoq
+from stoqlib.database.runtime import new_store
+from stoqlib.database.settings import get_database_version
+from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.person import Branch, LoginUser
+from stoqlib.domain.sale import Sale
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.station import BranchStation
+from stoqlib.domain.till import Till, TillEntry
+from stoqlib.lib.timing import PhaseTimer
+
+log = logging.getLogger(__name__)
+
+_benchmarks = collections.OrderedDict()
+
+
+class Benchmark(object):
+    """A benchmarked operation
+
+    :param name: the name of the benchmark
+    :param func: the function running it, receiving a
+      :class:`BenchmarkContext`
+    :param description: a description of what is being measured
+    """
+
+    def __init__(self, name, func, description=None):
+        self.name = name
+        self.func = func
+        self.description = description or func.__doc__
+
+
+def benchmark(name):
+    """Registers the decorated function as a benchmark
+
+    :param name: the name of the benchmark
+    """
+    def decorator(func):
+        _benchmarks[name] = Benchmark(name, func)
+        return func
+    return decorator
+
+
+def get_benchmarks():
+    """Gets all the registered benchmarks
+
+    :returns: a list of :class:`Benchmark`
+    """
+    # The operations register themselves when imported
+    importlib.import_module('stoqlib.benchmarks.operations')
+    return list(_benchmarks.values())
+
+
+def get_default_station(store):
+    """Gets the station where the benchmarks are run by default
+
+    That is the station of the open |till| with the most entries, which
+    is where most of the sales of the dataset were made.
+
+    :param store: a store
+    :returns: a |branchstation| or ``None`` if there is no open till
+    """
+    till = store.using(
+        Till, Join(TillEntry, TillEntry.till_id == Till.id)).find(
+            Till, Till.status == Till.STATUS_OPEN).group_by(Till).order_by(
+                Desc(Count(TillEntry.id))).first()
+    return till and till.station
+
+
+class BenchmarkContext(object):
+    """The context where a benchmark runs
+
+    :param store: the store to use
+    :param user: the |loginuser| doing the operations
+    :param branch: the |branch| where the operations are done
+    :param station: a |branchstation| of *branch*
+    """
+
+    def __init__(self, store, user, branch, station):
+        self.store = store
+        self.user = user
+        self.branch = branch
+        self.station = station
+        #: the :class:`stoqlib.lib.timing.PhaseTimer` where the time
+        #: of the operations is accumulated
+        self.timer = PhaseTimer(u'')
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measures the time spent on the wrapped block
+
+        The store is flushed before leaving the block, so the time spent
+        writing the changes to the database is measured too.
+
+        :param name: the name of the phase
+        """
+        self.store.flush()
+        with self.timer.phase(name):
+            yield
+            self.store.flush()
+
+
+class BenchmarkRunner(object):
+    """Runs benchmarks and collects their results
+
+    :param user: the |loginuser| doing the operations
+    :param branch: the |branch| where the operations are done
+    :param station: a |branchstation| of *branch*
+    :param repeat: how many times each benchmark is executed
+    """
+
+    def __init__(self, user, branch, station, repeat=5):
+        self.user_id = user.id
+        self.branch_id = branch.id
+        self.station_id = station.id
+        self.repeat = repeat
+
+    #
+    #  Public API
+    #
+
+    def run(self, benchmarks=None, store=None):
+        """Runs the benchmarks
+
+        Nothing done by the benchmarks is kept: each run happens inside
+        a savepoint which is rolled back after it finishes.
+
+        :param benchmarks: a sequence of :class:`Benchmark` or ``None``
+          to run all of the registered ones
+        :param store: a store or ``None`` to use a new one
+        :returns: a dict with the results, in the format saved by
+          :func:`save_results`
+        """
+        if benchmarks is None:
+            benchmarks = get_benchmarks()
+
+        own_store = store is None
+        if own_store:
+            store = new_store()
+        try:
+            results = collections.OrderedDict()
+            results['version'] = stoq.version
+            results['date'] = datetime.datetime.now().isoformat()
+            results['database'] = self._get_database_info(store)
+            results['repeat'] = self.repeat
+            results['benchmarks'] = collections.OrderedDict()
+            for bench in benchmarks:
+                log.info('Running benchmark %s' % (bench.name, ))
+                results['benchmarks'][bench.name] = self._run_benchmark(
+                    store, bench)
+        finally:
+            if own_store:
+                store.rollback(close=True)
+        return results
+
+    #
+    #  Private
+    #
+
+    def _get_database_info(self, store):
+        counts = collections.OrderedDict()
+        for table in [Branch, Sellable, Sale, Payment]:
+            counts[table.__storm_table__] = store.execute(
+                Select(Count(), tables=[table])).get_one()[0]
+        return collections.OrderedDict([
+            ('server_version', '.'.join(
+                str(i) for i in get_database_version(store))),
+            ('rows', counts)])
+
+    def _run_benchmark(self, store, bench):
+        totals = []
+        phases = collections.OrderedDict()
+        for i in range(self.repeat):
+            context = BenchmarkContext(
+                store, store.get(LoginUser, self.user_id),
+                store.get(Branch, self.branch_id),
+                store.get(BranchStation, self.station_id))
+            store.savepoint(u'benchmark')
+            try:
+                bench.func(context)
+            finally:
+                store.rollback_to_savepoint(u'benchmark')
+            totals.append(context.timer.total)
+            for name, elapsed in context.timer.phases.items():
+                phases.setdefault(name, []).append(elapsed)
+
+        return collections.OrderedDict([
+            ('description', bench.description),
+            ('runs', totals),
+            ('min', min(totals)),
+            ('median', statistics.median(totals)),
+            ('phases', collections.OrderedDict(
+                (name, statistics.median(values))
+                for name, values in phases.items())),
+        ])
+
+
+def save_results(results, filename):
+    """Saves the results of a benchmark run as JSON
+
+    :param results: the results returned by :meth:`BenchmarkRunner.run`
+    :param filename: the name of the file
+    """
+    with open(filename, 'w') as fp:
+        json.dump(results, fp, indent=2)
+
+
+def load_results(filename):
+    """Loads the results saved by :func:`save_results`
+
+    :param filename: the name of the file
+    :returns: a dict with the results
+    """
+    with open(filename) as fp:
+        return json.load(fp, object_pairs_hook=collections.OrderedDict)
+
+
+def compare_results(old, new, threshold=0.2):
+    """Compares the results of two benchmark runs
+
+    The median times are compared, since they are less affected by
+    the runs disturbed by other processes than the mean.
+
+    :param old: the results used as a reference
+    :param new: the results being checked
+    :param threshold: how slower, relative to *old*, a benchmark
+      must be to be considered a regression
+    :returns: a list of ``(name, old_median, new_median)`` tuples with
+      the benchmarks which got slower than *threshold*
+    """
+    regressions = []
+    for name, result in new['benchmarks'].items():
+        old_result = old['benchmarks'].get(name)
+        if old_result is None:
+            continue
+        if result['median'] > old_result['median'] * (1 + threshold):
+            regressions.append((name, old_result['median'],
+                                result['median']))
+    return regressions
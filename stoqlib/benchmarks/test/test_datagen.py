@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+from storm.expr import And, In, Like
+
+from stoqlib.benchmarks.datagen import EPOCH, DataGenerator
+from stoqlib.domain.person import Branch, Person
+from stoqlib.domain.product import ProductStockItem
+from stoqlib.domain.purchase import PurchaseOrder
+from stoqlib.domain.sale import Sale
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.domain.till import Till
+
+__tests__ = 'stoqlib/benchmarks/datagen.py'
+
+
+class TestDataGenerator(DomainTest):
+
+    def test_generate(self):
+        generator = DataGenerator(self.current_user, branches=2,
+                                  sellables=5, sales=4, clients=2,
+                                  purchases=1, items_per_sale=2, seed=7)
+        progress = list(generator.iter_generate(self.store))
+        self.assertEqual(progress[0], (1, 14))
+        self.assertEqual(progress[-1], (14, 14))
+
+        branches = list(self.store.find(
+            Branch, And(Branch.person_id == Person.id,
+                        Like(Person.name, u'Benchmark branch %'))))
+        self.assertEqual(len(branches), 2)
+        branch_ids = [branch.id for branch in branches]
+        for branch in branches:
+            till = self.store.find(Till, branch=branch).one()
+            self.assertEqual(till.status, Till.STATUS_OPEN)
+
+        sales = self.store.find(Sale, In(Sale.branch_id, branch_ids))
+        self.assertEqual(sales.count(), 4)
+        for sale in sales:
+            self.assertEqual(sale.status, Sale.STATUS_CONFIRMED)
+            self.assertLessEqual(sale.open_date, EPOCH)
+            self.assertEqual(sale.get_items().count(), 2)
+            self.assertEqual(sale.payments.count(), 1)
+
+        purchases = self.store.find(PurchaseOrder,
+                                    In(PurchaseOrder.branch_id, branch_ids))
+        self.assertEqual(purchases.count(), 1)
+        self.assertEqual(purchases.one().status,
+                         PurchaseOrder.ORDER_CONFIRMED)
+
+        # All the sellables have stock on all the branches
+        stock_items = self.store.find(
+            ProductStockItem, In(ProductStockItem.branch_id, branch_ids))
+        self.assertEqual(stock_items.count(), 10)
+        for stock_item in stock_items:
+            self.assertGreater(stock_item.quantity, 0)
+
+        # The codes depend only on the seed and the order of creation
+        codes = set(self.store.find(Sellable.code,
+                                    Like(Sellable.code, u'007%')))
+        self.assertEqual(codes, set([u'0070000001', u'0070000002',
+                                     u'0070000003', u'0070000004',
+                                     u'0070000005']))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+import os
+import tempfile
+
+from stoqlib.benchmarks.runner import (Benchmark, BenchmarkRunner,
+                                       compare_results, get_benchmarks,
+                                       load_results, save_results)
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.test.domaintest import DomainTest
+
+__tests__ = 'stoqlib/benchmarks/runner.py'
+
+
+class TestBenchmarkRunner(DomainTest):
+
+    def _get_runner(self, repeat=1):
+        return BenchmarkRunner(self.current_user, self.current_branch,
+                               self.current_station, repeat=repeat)
+
+    def test_run(self):
+        sellables = []
+
+        def create_sellable(context):
+            """Create a sellable"""
+            with context.phase(u'create'):
+                sellables.append(Sellable(store=context.store,
+                                          description=u'Benchmark'))
+            with context.phase(u'update'):
+                sellables[-1].description = u'Updated'
+
+        results = self._get_runner(repeat=3).run(
+            [Benchmark(u'create_sellable', create_sellable)],
+            store=self.store)
+        self.assertEqual(results['repeat'], 3)
+        self.assertIn('sellable', results['database']['rows'])
+
+        result = results['benchmarks']['create_sellable']
+        self.assertEqual(result['description'], u'Create a sellable')
+        self.assertEqual(len(result['runs']), 3)
+        self.assertEqual(result['min'], min(result['runs']))
+        self.assertEqual(list(result['phases']), [u'create', u'update'])
+
+        # Each run is rolled back after it finishes
+        self.assertEqual(len(sellables), 3)
+        self.assertTrue(self.store.find(
+            Sellable, description=u'Updated').is_empty())
+
+    def test_run_operations(self):
+        benchmarks = get_benchmarks()
+        self.assertEqual(
+            [bench.name for bench in benchmarks][:6],
+            [u'sale_confirm', u'receiving_confirm', u'inventory_open',
+             u'inventory_close', u'product_stock_view', u'till_close'])
+
+        results = self._get_runner().run(benchmarks, store=self.store)
+        self.assertEqual(list(results['benchmarks']),
+                         [bench.name for bench in benchmarks])
+
+    def test_save_results(self):
+        results = self._get_runner().run(
+            [Benchmark(u'nothing', lambda context: None, u'Nothing')],
+            store=self.store)
+        fd, filename = tempfile.mkstemp(prefix='stoqlib-test-benchmark-',
+                                        suffix='.json')
+        os.close(fd)
+        try:
+            save_results(results, filename)
+            self.assertEqual(load_results(filename), results)
+        finally:
+            os.unlink(filename)
+
+    def test_compare_results(self):
+        old = {'benchmarks': {'a': {'median': 1.0},
+                              'b': {'median': 1.0},
+                              'c': {'median': 1.0}}}
+        new = {'benchmarks': {'a': {'median': 1.1},
+                              'b': {'median': 1.5},
+                              'd': {'median': 9.0}}}
+        self.assertEqual(compare_results(old, new), [('b', 1.0, 1.5)])
+        self.assertEqual(compare_results(old, new, threshold=0.05),
+                         [('a', 1.0, 1.1), ('b', 1.0, 1.5)])
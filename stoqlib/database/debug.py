@@ -21,15 +21,24 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import atexit
+import collections
 import datetime
+import html
+import json
+import math
 import os
+import re
 import sys
 import platform
 import struct
+import threading
+import time
 
 import psycopg2
 
-from storm.tracer import BaseStatementTracer, install_tracer
+import storm
+from storm.tracer import BaseStatementTracer, get_tracers, install_tracer
 
 try:
     from sqlparse import engine, filters, sql
@@ -256,5 +265,342 @@ class StoqlibDebugTracer(BaseStatementTracer):
         self.header(pid, color, 'CLOSE')
 
 
+# Frames from storm and from the modules in this package are skipped when
+# looking for the code which issued a statement, since it is always the
+# ORM itself
+_STORM_DIR = os.path.dirname(storm.__file__) + os.sep
+_DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(os.path.dirname(_DATABASE_DIR))
+
+_FINGERPRINT_RES = [
+    # Strings and numbers
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    # Parameters
+    (re.compile(r'%s'), '?'),
+    # Lists of values, like the ones used by IN, which have a variable
+    # number of parameters
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?, ...'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def get_statement_fingerprint(statement):
+    """Gets the fingerprint of a statement
+
+    The fingerprint is the statement without its parameters and literal
+    values, so all the statements doing the same thing have the same one::
+
+        >>> get_statement_fingerprint(
+        ...     "SELECT * FROM sale WHERE id IN (%s, %s) AND status = 'ok'")
+        'SELECT * FROM sale WHERE id IN (?, ...) AND status = ?'
+
+    :param statement: a SQL statement
+    :returns: the fingerprint
+    """
+    for regex, replacement in _FINGERPRINT_RES:
+        statement = regex.sub(replacement, statement)
+    return statement.strip()
+
+
+def _get_call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (not filename.startswith(_STORM_DIR) and
+                os.path.dirname(filename) != _DATABASE_DIR):
+            if filename.startswith(_ROOT_DIR):
+                filename = os.path.relpath(filename, _ROOT_DIR)
+            return '%s:%d %s' % (filename, frame.f_lineno,
+                                 frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class StatementProfile(object):
+    """The statistics of the statements with the same fingerprint"""
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        #: the duration of each execution, in seconds
+        self.times = []
+        #: a counter of the code which issued the statement
+        self.call_sites = collections.Counter()
+        #: how many transactions issued the statement more times than the
+        #: threshold of the tracer, probably from inside a loop
+        self.repeated_transactions = 0
+        #: the maximum number of times it was issued in a single transaction
+        self.max_per_transaction = 0
+
+    @property
+    def total_time(self):
+        return sum(self.times)
+
+    @property
+    def avg_time(self):
+        return self.total_time / len(self.times) if self.times else 0
+
+    @property
+    def p95_time(self):
+        if not self.times:
+            return 0
+        times = sorted(self.times)
+        return times[int(math.ceil(len(times) * 0.95)) - 1]
+
+    def as_dict(self, max_call_sites=5):
+        return collections.OrderedDict([
+            ('fingerprint', self.fingerprint),
+            ('count', self.count),
+            ('errors', self.errors),
+            ('rows', self.rows),
+            ('total_time', self.total_time),
+            ('avg_time', self.avg_time),
+            ('p95_time', self.p95_time),
+            ('repeated_transactions', self.repeated_transactions),
+            ('max_per_transaction', self.max_per_transaction),
+            ('call_sites', self.call_sites.most_common(max_call_sites)),
+        ])
+
+
+class StoqlibProfilerTracer(object):
+    """A tracer which collects statistics of the executed statements
+
+    Unlike :class:`StoqlibDebugTracer`, nothing is printed while the
+    statements are executed. They are grouped by their fingerprint
+    (see :func:`get_statement_fingerprint`) and the number of executions,
+    their durations, the rows they returned and the code which issued
+    them are accumulated, so a report can be generated at the end.
+
+    The same statement being issued many times in the same transaction
+    usually means it is being done inside a loop (the N+1 problem),
+    when a single statement for all the objects would be much faster.
+    Those are listed separately by the report.
+
+    :param repeat_threshold: how many times the same statement must be
+      issued in a transaction to be reported as repeated
+    """
+
+    def __init__(self, repeat_threshold=10):
+        self.repeat_threshold = repeat_threshold
+        # Statements may be executed by other threads, like the ones
+        # used by the async queries
+        self._lock = threading.Lock()
+        self.reset()
+
+    #
+    #  Storm tracer API
+    #
+
+    def connection_raw_execute(self, connection, raw_cursor, statement,
+                               params):
+        self._pending[id(raw_cursor)] = (time.perf_counter(),
+                                         _get_call_site())
+
+    def connection_raw_execute_success(self, connection, raw_cursor,
+                                       statement, params):
+        self._add_execution(connection, raw_cursor, statement)
+
+    def connection_raw_execute_error(self, connection, raw_cursor,
+                                     statement, params, error):
+        self._add_execution(connection, raw_cursor, statement, error=True)
+
+    def connection_commit(self, connection, xid=None):
+        self._end_transaction(connection)
+
+    def connection_rollback(self, connection, xid=None):
+        self._end_transaction(connection)
+
+    #
+    #  Public API
+    #
+
+    def reset(self):
+        """Discards everything collected so far"""
+        with self._lock:
+            self._started = time.time()
+            self._pending = {}
+            self._profiles = {}
+            # connection id -> Counter of fingerprints
+            self._transactions = {}
+
+    def get_profiles(self):
+        """Gets the statistics of the executed statements
+
+        The statements which are still being executed in a transaction
+        are accounted as if it had finished.
+
+        :returns: a list of :class:`StatementProfile`, the ones which
+          took most time first
+        """
+        with self._lock:
+            profiles = {}
+            for fingerprint, profile in self._profiles.items():
+                copy = StatementProfile(fingerprint)
+                copy.__dict__.update(profile.__dict__)
+                copy.times = profile.times[:]
+                copy.call_sites = profile.call_sites.copy()
+                profiles[fingerprint] = copy
+            for counter in self._transactions.values():
+                self._add_transaction(profiles, counter)
+        return sorted(profiles.values(), key=lambda p: p.total_time,
+                      reverse=True)
+
+    def get_report(self):
+        """Gets a report of the executed statements
+
+        :returns: a dict with a summary, the ``statements`` and the
+          ``repeated`` ones (see :meth:`.get_profiles`)
+        """
+        profiles = self.get_profiles()
+        return collections.OrderedDict([
+            ('started', datetime.datetime.fromtimestamp(
+                self._started).isoformat()),
+            ('duration', time.time() - self._started),
+            ('count', sum(p.count for p in profiles)),
+            ('total_time', sum(p.total_time for p in profiles)),
+            ('repeat_threshold', self.repeat_threshold),
+            ('statements', [p.as_dict() for p in profiles]),
+            ('repeated', [p.as_dict() for p in sorted(
+                profiles, key=lambda p: p.max_per_transaction, reverse=True)
+                if p.repeated_transactions]),
+        ])
+
+    def dump(self, filename):
+        """Writes the report to a file
+
+        :param filename: the name of the file. The report will be written
+          as HTML if it ends with ``.html``, or as JSON otherwise
+        """
+        report = self.get_report()
+        with open(filename, 'w') as fp:
+            if filename.endswith('.html'):
+                fp.write(_format_html_report(report))
+            else:
+                json.dump(report, fp, indent=2)
+
+    #
+    #  Private
+    #
+
+    def _add_execution(self, connection, raw_cursor, statement, error=False):
+        end = time.perf_counter()
+        start, call_site = self._pending.pop(id(raw_cursor), (end, None))
+        fingerprint = get_statement_fingerprint(statement)
+        with self._lock:
+            profile = self._profiles.get(fingerprint)
+            if profile is None:
+                profile = self._profiles[fingerprint] = StatementProfile(
+                    fingerprint)
+            profile.count += 1
+            profile.times.append(end - start)
+            if error:
+                profile.errors += 1
+            elif raw_cursor.rowcount > 0:
+                profile.rows += raw_cursor.rowcount
+            if call_site is not None:
+                profile.call_sites[call_site] += 1
+
+            counter = self._transactions.setdefault(
+                id(connection), collections.Counter())
+            counter[fingerprint] += 1
+
+    def _add_transaction(self, profiles, counter):
+        for fingerprint, count in counter.items():
+            profile = profiles[fingerprint]
+            profile.max_per_transaction = max(profile.max_per_transaction,
+                                              count)
+            if count >= self.repeat_threshold:
+                profile.repeated_transactions += 1
+
+    def _end_transaction(self, connection):
+        with self._lock:
+            counter = self._transactions.pop(id(connection), None)
+            if counter:
+                self._add_transaction(self._profiles, counter)
+
+
+_HTML_REPORT = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SQL profile</title>
+<style>
+body { font-family: sans-serif; font-size: 12px; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 4px; vertical-align: top; }
+td.number { text-align: right; }
+pre { margin: 0; white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<h1>SQL profile</h1>
+<p>%(summary)s</p>
+<h2>Statements issued %(repeat_threshold)d or more times in a transaction</h2>
+%(repeated)s
+<h2>Statements</h2>
+%(statements)s
+</body>
+</html>
+"""
+
+
+def _format_html_table(profiles):
+    columns = ['count', 'errors', 'rows', 'total_time', 'avg_time',
+               'p95_time', 'repeated_transactions', 'max_per_transaction']
+    lines = ['<table>', '<tr><th>statement</th>%s<th>call sites</th></tr>' % (
+        ''.join('<th>%s</th>' % (c.replace('_', ' '), ) for c in columns))]
+    for profile in profiles:
+        cells = []
+        for column in columns:
+            value = profile[column]
+            if isinstance(value, float):
+                value = '%.6f' % (value, )
+            cells.append('<td class="number">%s</td>' % (value, ))
+        call_sites = '<br>'.join('%s (%d)' % (html.escape(site), count)
+                                 for site, count in profile['call_sites'])
+        lines.append('<tr><td><pre>%s</pre></td>%s<td>%s</td></tr>' % (
+            html.escape(profile['fingerprint']), ''.join(cells), call_sites))
+    lines.append('</table>')
+    return '\n'.join(lines)
+
+
+def _format_html_report(report):
+    summary = '%d statements in %.3f seconds, during %.3f seconds ' \
+              'starting at %s' % (report['count'], report['total_time'],
+                                  report['duration'], report['started'])
+    return _HTML_REPORT % dict(
+        summary=html.escape(summary),
+        repeat_threshold=report['repeat_threshold'],
+        repeated=_format_html_table(report['repeated']),
+        statements=_format_html_table(report['statements']))
+
+
 def enable():
     install_tracer(StoqlibDebugTracer())
+
+
+def enable_profiler(filename=None, repeat_threshold=10):
+    """Enables the profiling of the executed statements
+
+    This can be done for the whole application by setting the
+    ``STOQLIB_SQL_PROFILE`` environment variable or by using the
+    ``--sql-profile`` option, both with the name of the file where the
+    report will be written.
+
+    :param filename: if not ``None``, the report will be written to this
+      file when the process exits. See :meth:`StoqlibProfilerTracer.dump`
+    :param repeat_threshold: see :class:`StoqlibProfilerTracer`
+    :returns: the :class:`StoqlibProfilerTracer`
+    """
+    for tracer in get_tracers():
+        if isinstance(tracer, StoqlibProfilerTracer):
+            return tracer
+
+    tracer = StoqlibProfilerTracer(repeat_threshold=repeat_threshold)
+    install_tracer(tracer)
+    if filename is not None:
+        atexit.register(tracer.dump, filename)
+    return tracer
@@ -28,9 +28,20 @@ This contains a list of expressions that are unsupported by Storm.
 Most of them are specific to PostgreSQL
 """
 
-from storm.expr import (Expr, NamedFunc, PrefixExpr, SuffixExpr, SQL, ComparableExpr,
+import datetime
+
+from storm.expr import (And, Expr, NamedFunc, PrefixExpr, SuffixExpr, SQL, ComparableExpr,
                         compile as expr_compile, FromExpr, Undef, EXPR, is_safe_token,
-                        BinaryOper, SetExpr)
+                        BinaryOper, SetExpr, Column)
+from storm.info import get_cls_info
+
+#: The columns that have a copy normalized by :class:`StoqNormalizeString`
+#: kept up to date by the database, mapping (table, column) to the
+#: normalized column name. See patch-06-23.sql
+NORMALIZED_COLUMNS = {
+    ('person', 'name'): 'name_normalized',
+    ('sellable', 'description'): 'description_normalized',
+}
 
 
 class Age(NamedFunc):
@@ -92,6 +103,42 @@ class Date(NamedFunc):
     name = "DATE"
 
 
+def _get_local_midnight(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            # Timestamps are stored in the local time, without a timezone
+            value = value.astimezone().replace(tzinfo=None)
+        value = value.date()
+    return datetime.datetime.combine(value, datetime.time.min)
+
+
+def between_dates(column, start=None, end=None):
+    """Matches the timestamps in a column that are inside some days
+
+    This has the same result as comparing ``Date(column)`` with the dates,
+    but is expressed as a half-open range of timestamps
+    (``column >= start AND column < end + 1 day``), which can use an
+    index on the column instead of calling DATE() for each row.
+
+    :param column: a timestamp column
+    :param start: the first day of the range, a date or datetime,
+      or ``None`` if the range has no start
+    :param end: the last day of the range (inclusive), a date or datetime,
+      or ``None`` if the range has no end
+    :returns: a storm expression
+    """
+    queries = []
+    if start is not None:
+        queries.append(column >= _get_local_midnight(start))
+    if end is not None:
+        end = _get_local_midnight(end)
+        if end.date() < datetime.date.max:
+            queries.append(column < end + datetime.timedelta(days=1))
+    if not queries:
+        return None
+    return And(*queries)
+
+
 class DateTrunc(NamedFunc):
     """Truncates a part of a datetime"""
     # http://www.postgresql.org/docs/9.1/static/functions-datetime.html
@@ -216,15 +263,37 @@ class StoqNormalizeString(NamedFunc):
     it's similar to NLKD normailzation in unicode, but it is run
     inside the database.
 
-    Note, this is very slow and should be avoided.
-    In the future this will be replaced by fulltext search which
-    does normalization in a cheaper way.
+    Note, this is slow when called for each row of a table.
+    Some columns have a normalized copy which can be indexed,
+    see :func:`get_normalized_column`.
     """
     # See functions.sql
     __slots__ = ()
     name = "stoq_normalize_string"
 
 
+def get_normalized_column(column):
+    """Get the normalized copy of a column, if there's one
+
+    The normalized column contains the same as ``StoqNormalizeString(column)``
+    but, since it is stored, it can be searched using an index.
+
+    :param column: a storm column
+    :returns: the normalized column, on the same table (or alias) as
+      *column*, or ``None`` if *column* doesn't have a normalized copy
+    """
+    if not isinstance(column, Column) or column.table is Undef:
+        return None
+    if not isinstance(column.table, type):
+        return None
+    # ClassAlias keeps the aliased class in its class info
+    cls_info = get_cls_info(get_cls_info(column.table).cls)
+    name = NORMALIZED_COLUMNS.get((cls_info.table.name, column.name))
+    if name is None:
+        return None
+    return Column(name, column.table)
+
+
 class Case(ComparableExpr):
     """Works like a Python's if-then-else clause.
 
@@ -28,6 +28,7 @@
 import fnmatch
 import logging
 import functools
+import json
 import os
 import re
 import shutil
@@ -46,6 +47,7 @@ from stoqlib.exceptions import (DatabaseInconsistency, StoqlibError,
 from stoqlib.lib.crashreport import collect_traceback
 from stoqlib.lib.defaults import stoqlib_gettext
 from stoqlib.lib.message import error, info
+from stoqlib.lib.osutils import get_application_dir
 from stoqlib.lib.parameters import sysparam
 from stoqlib.lib.pluginmanager import get_plugin_manager
 
@@ -54,6 +56,19 @@ log = logging.getLogger(__name__)
 # Used by the wizard
 create_log = logging.getLogger('stoqlib.database.create')
 
+# The latest patch version of each patch directory, cached on this file
+# of the application dir, see SchemaMigration.get_latest_available_version
+_PATCH_VERSIONS_FILENAME = 'patch-versions.json'
+# And on this process, mapping (resource domain, resource) -> version
+_latest_versions = {}
+
+
+def _get_patch_version(filename):
+    # "patch-00-20.sql" -> (00, 20): (generation, level)
+    base = os.path.basename(filename).split('.')[0]
+    base_parts = base.split('-', 2)
+    return int(base_parts[1]), int(base_parts[2])
+
 
 @functools.total_ordering
 class Patch(object):
@@ -70,14 +85,7 @@ class Patch(object):
         :param migration
         """
         self.filename = filename
-
-        # Base is the part of the filename minus the extension
-        base = os.path.basename(filename).split('.')[0]
-
-        # "patch-00-20" -> (00, 20): (generation, level)
-        base_parts = base.split('-', 2)
-        self.generation = int(base_parts[1])
-        self.level = int(base_parts[2])
+        self.generation, self.level = _get_patch_version(filename)
         self._migration = migration
 
     __hash__ = object.__hash__
@@ -185,8 +193,7 @@ class SchemaMigration(object):
                 return True
         return False
 
-    def _get_patches(self):
-        patches = []
+    def _get_patch_names(self):
         for filename in environ.get_resource_names(self.patch_resource_domain,
                                                    self.patch_resource):
             for pattern in self.patch_patterns:
@@ -195,12 +202,61 @@ class SchemaMigration(object):
                 if not self._patchname_is_valid(filename):
                     print("Invalid patch name: %s" % filename)
                     continue
-                filename = environ.get_resource_filename(
-                    self.patch_resource_domain, self.patch_resource, filename)
-                patches.append(Patch(filename, self))
+                yield filename
+
+    def _get_patches(self):
+        patches = []
+        for filename in self._get_patch_names():
+            filename = environ.get_resource_filename(
+                self.patch_resource_domain, self.patch_resource, filename)
+            patches.append(Patch(filename, self))
 
         return sorted(patches)
 
+    def _get_patches_dir(self):
+        try:
+            path = environ.get_resource_filename(self.patch_resource_domain,
+                                                 self.patch_resource)
+        except Exception:
+            return None
+        return path if os.path.isdir(path) else None
+
+    def _read_latest_version(self):
+        # The patches directory is modified when a patch is added to or
+        # removed from it, so its mtime tells if the cached version is still
+        # valid. Nothing else depends on this cache, so just ignore it if
+        # it can't be used
+        path = self._get_patches_dir()
+        if path is None:
+            return max(_get_patch_version(filename)
+                       for filename in self._get_patch_names())
+
+        mtime = os.stat(path).st_mtime
+        cache_filename = os.path.join(get_application_dir(),
+                                      _PATCH_VERSIONS_FILENAME)
+        try:
+            with open(cache_filename) as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            cache = {}
+        if not isinstance(cache, dict):
+            cache = {}
+
+        entry = cache.get(path)
+        if (isinstance(entry, dict) and entry.get('mtime') == mtime and
+                entry.get('version')):
+            return tuple(entry['version'])
+
+        version = max(_get_patch_version(filename)
+                      for filename in self._get_patch_names())
+        cache[path] = {'mtime': mtime, 'version': version}
+        try:
+            with open(cache_filename, 'w') as f:
+                json.dump(cache, f)
+        except (IOError, OSError) as e:
+            log.info('Could not cache the patch versions: %s' % (e, ))
+        return version
+
     def _update_schema(self):
         """Check the current version of database and update the schema if
         it's needed
@@ -252,14 +308,27 @@ class SchemaMigration(object):
                 "update the schema  to the latest available version."))
         return False
 
+    def get_latest_available_version(self):
+        """Get the version of the latest patch available
+
+        Listing the patches is slow, so the version is cached for this
+        process and on the application dir, until a patch is added to or
+        removed from the patches directory.
+
+        :returns: a tuple with the patch generation and level
+        """
+        key = (self.patch_resource_domain, self.patch_resource)
+        version = _latest_versions.get(key)
+        if version is None:
+            version = _latest_versions[key] = self._read_latest_version()
+        return version
+
     def check_uptodate(self):
         """
         Verify if the schema is up to date.
         :returns: True or False.
         """
-        # Fetch the latest, eg the last in the list
-        patches = self._get_patches()
-        latest_available = patches[-1].get_version()
+        latest_available = self.get_latest_available_version()
 
         current_version = self.get_current_version()
         if current_version == latest_available:
@@ -30,10 +30,13 @@ import json
 from kiwi.currency import currency
 
 from storm.properties import Bool, DateTime, Decimal, Int, List, RawStr, Time, Unicode
+from storm.expr import Column, ComparableExpr, Select, Update
+from storm.expr import compile as expr_compile
+from storm.info import get_obj_info
 from storm.properties import SimpleProperty
-from storm.store import AutoReload
+from storm.store import AutoReload, PENDING_ADD
 from storm.variables import (DateVariable, DateTimeVariable,
-                             DecimalVariable, IntVariable,
+                             DecimalVariable, IntVariable, RawStrVariable,
                              Variable, EncodedValueVariable)
 
 from stoqlib.lib.defaults import QUANTITY_PRECISION
@@ -264,6 +267,138 @@ class ListCol(List):
     pass
 
 
+# The values set on the deferred columns that were not written yet and
+# the ones fetched from the database, kept on the obj_info of the objects
+_DEFERRED_CHANGES = 'deferred-changes'
+_DEFERRED_VALUES = 'deferred-values'
+
+
+def _flush_deferred_changes(obj_info):
+    changes = obj_info.pop(_DEFERRED_CHANGES, None)
+    store = obj_info.get('store')
+    if not changes or store is None:
+        return False
+
+    cls = obj_info.cls_info.cls
+    obj_id = obj_info.get_obj().id
+    # We are in the middle of a flush, don't let execute start another one
+    store.block_implicit_flushes()
+    try:
+        store.execute(Update(
+            dict((Column(name, cls), value) for name, value in changes.items()),
+            cls.id == obj_id, cls), noresult=True)
+    finally:
+        store.unblock_implicit_flushes()
+
+    obj_info.setdefault(_DEFERRED_VALUES, {}).update(changes)
+    # Unhook ourselves, we will be hooked again on the next change
+    return False
+
+
+def get_deferred_changes(obj_info):
+    """Gets the values set on the deferred columns of an object
+
+    :param obj_info: the obj_info of the object
+    :returns: a dict mapping the column names to the values which
+      were not written to the database yet
+    """
+    return obj_info.get(_DEFERRED_CHANGES, {})
+
+
+def clear_deferred_changes(obj_info):
+    """Discards the values set on the deferred columns of an object
+
+    This should be called when the changes on the object are rolled back.
+
+    :param obj_info: the obj_info of the object
+    """
+    obj_info.pop(_DEFERRED_CHANGES, None)
+
+
+def clear_deferred_values(obj_info):
+    """Discards the values fetched for the deferred columns of an object
+
+    They will be fetched again on their next access. This should be called
+    when the object is reloaded, since the values may have been changed
+    by another store.
+
+    :param obj_info: the obj_info of the object
+    """
+    obj_info.pop(_DEFERRED_VALUES, None)
+
+
+class DeferredBLOBCol(ComparableExpr):
+    """A BLOB column which is only fetched when accessed
+
+    Storm loads all the columns of an object when it is fetched, which
+    means that a big binary column, like the one holding an image,
+    would be transferred every time the object is loaded even if it
+    is never used. This column is not known by storm: its value is
+    queried on its first access and kept together with the object until
+    it is reloaded, and the value set on it is written right after the
+    object is flushed.
+
+    It can still be used on queries, where it is compiled as the
+    column itself.
+    """
+
+    # Used by storm when comparing this with python values
+    variable_factory = RawStrVariable
+
+    def __init__(self, default=None):
+        self.default = default
+        self.cls = None
+        self.name = None
+
+    def __set_name__(self, cls, name):
+        self.cls = cls
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        # Note that this can't be a Column, or storm would load it
+        # together with the other columns of the class
+        if obj is None:
+            return self
+
+        obj_info = get_obj_info(obj)
+        changes = get_deferred_changes(obj_info)
+        if self.name in changes:
+            return changes[self.name]
+
+        store = obj_info.get('store')
+        # The object was not inserted yet, so there's nothing to fetch
+        if store is None or obj_info.get('pending') is PENDING_ADD:
+            return self.default
+
+        values = obj_info.setdefault(_DEFERRED_VALUES, {})
+        if self.name not in values:
+            cls = type(obj)
+            value = store.execute(Select(Column(self.name, cls),
+                                         cls.id == obj.id)).get_one()[0]
+            values[self.name] = RawStrVariable(value=value,
+                                               from_db=True).get()
+        return values[self.name]
+
+    def __set__(self, obj, value):
+        # Let the variable validate the value
+        value = RawStrVariable(value=value).get()
+        obj_info = get_obj_info(obj)
+        changes = obj_info.get(_DEFERRED_CHANGES)
+        if changes is None:
+            changes = obj_info[_DEFERRED_CHANGES] = {}
+            obj_info.event.hook('flushed', _flush_deferred_changes)
+        changes[self.name] = value
+
+        store = obj_info.get('store')
+        if store is not None:
+            store._set_dirty(obj_info)
+
+
+@expr_compile.when(DeferredBLOBCol)
+def compile_deferred_blob(compile, expr, state):
+    return compile(Column(expr.name, expr.cls), state)
+
+
 # Columns, we're keeping the Col suffix to avoid clashes between
 # decimal.Decimal and storm.properties.Decimal
 BLOBCol = RawStr
@@ -24,8 +24,11 @@
 Kiwi integration for Stoq/Storm
 """
 
+import itertools
+import logging
 import re
 import threading
+import time
 import queue
 
 from gi.repository import GLib, GObject
@@ -33,16 +36,20 @@ from kiwi.python import Settable
 from kiwi.utils import gsignal
 from storm import Undef
 from storm.database import Connection, convert_param_marks
-from storm.expr import compile, And, Or, Like, Not, Alias, State, Lower
+from storm.expr import (compile, And, Or, Like, Not, Alias, State, Lower,
+                        Count, Select, SQL, Sum)
 from storm.tracer import trace
 import psycopg2
 import psycopg2.extensions
 
-from stoqlib.database.expr import Date, StoqNormalizeString
+from stoqlib.database.expr import (Field, StoqNormalizeString,
+                                   between_dates, get_normalized_column)
 from stoqlib.database.interfaces import ISearchFilter
 from stoqlib.database.settings import db_settings
 from stoqlib.database.viewable import Viewable
 
+log = logging.getLogger(__name__)
+
 
 class QueryState(object):
     def __init__(self, search_filter):
@@ -199,28 +206,46 @@ class AsyncQueryOperation(GObject.GObject):
     (STATUS_WAITING,
      STATUS_EXECUTING,
      STATUS_FINISHED,
-     STATUS_CANCELLED) = range(4)
+     STATUS_CANCELLED,
+     STATUS_ERROR) = range(5)
+
+    #: operations the user is waiting for, like searches
+    PRIORITY_INTERACTIVE = 0
+    #: operations that can wait, like reports
+    PRIORITY_BACKGROUND = 10
 
     gsignal('finish')
+    gsignal('error', object)
 
-    def __init__(self, store, resultset, expr):
+    def __init__(self, store, resultset, expr, priority=PRIORITY_INTERACTIVE):
         """
         :param store: database store
         :param resultset: resultset that will be used to construct
            the result from.
         :param expr: query expression to execute
+        :param priority: operations with a lower priority value are
+          executed first, see ``PRIORITY_INTERACTIVE`` and
+          ``PRIORITY_BACKGROUND``
         """
         GObject.GObject.__init__(self)
 
         self.status = self.STATUS_WAITING
         self.resultset = resultset
         self.expr = expr
+        self.priority = priority
+        self.scheduled_at = None
+        self.started_at = None
+        self.finished_at = None
+        #: the exception raised when executing the query, if it failed
+        self.error = None
 
         self._conn = store._connection
         self._async_cursor = None
         self._async_conn = None
         self._statement = None
         self._parameters = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
 
     #
     #  Public API
@@ -229,40 +254,47 @@ class AsyncQueryOperation(GObject.GObject):
     def execute(self, async_conn):
         """Executes a query within an asyncronous psycopg2 connection
         """
-        if self.status == self.STATUS_CANCELLED:
-            return
-
-        self.status = self.STATUS_EXECUTING
+        try:
+            self._execute(async_conn)
+        finally:
+            self._done.set()
 
-        # Async variant of Connection.execute() in storm/database.py
-        state = State()
-        statement = compile(self.expr, state)
-        stmt = convert_param_marks(statement, "?", "%s")
-        self._async_cursor = async_conn.cursor()
-        self._async_conn = async_conn
+    def fail(self, error):
+        """Marks the operation as failed
 
-        # This is postgres specific, see storm/databases/postgres.py
-        self._statement = stmt
-        self._parameters = tuple(Connection.to_database(state.parameters))
+        The *error* signal is emitted instead of *finish*, unless the
+        operation was cancelled.
 
-        trace("connection_raw_execute", self._conn,
-              self._async_cursor, self._statement, self._parameters)
-        self._async_cursor.execute(self._statement,
-                                   self._parameters)
-
-        # This can happen if another thread cancelled this while the cursor was
-        # executing. In that case, it is not interested in the retval anymore
-        if self.status == self.STATUS_CANCELLED:
-            return
-
-        self.status = self.STATUS_FINISHED
-        GLib.idle_add(self._on_finish)
+        :param error: the exception that made the operation fail
+        """
+        with self._lock:
+            if self.status == self.STATUS_CANCELLED:
+                return
+            self.status = self.STATUS_ERROR
+            self.error = error
+        self._done.set()
+        GLib.idle_add(self._on_error)
+
+    def wait(self, timeout=None):
+        """Blocks until the operation is not executing anymore
+
+        This is an alternative to the *finish* signal for when the result
+        is needed right away, but there is something else to do while the
+        query is running.
+
+        :param timeout: the maximum number of seconds to wait or
+          ``None`` to wait as long as it takes
+        :returns: ``True`` if the operation finished and its result
+          can be retrieved with :meth:`.get_result`
+        """
+        self._done.wait(timeout)
+        return self.status == self.STATUS_FINISHED
 
     def get_result(self):
         """Get operation result.
 
         Note that this can only be called when the *finish* signal
-        has been emitted.
+        has been emitted or after :meth:`.wait` returned ``True``.
 
         :returns: a :class:`AsyncResultSet` containing the result
         """
@@ -276,49 +308,210 @@ class AsyncQueryOperation(GObject.GObject):
         return AsyncResultSet(self.resultset, result)
 
     def cancel(self):
-        """Cancel the operation scheduling"""
-        self.status = self.STATUS_CANCELLED
+        """Cancel the operation
+
+        If the query is already being executed, it will be cancelled
+        on the server, freeing its connection to the next operation.
+        """
+        with self._lock:
+            status = self.status
+            self.status = self.STATUS_CANCELLED
+            if status == self.STATUS_EXECUTING:
+                # Sends a cancel request to the backend, just like
+                # pg_cancel_backend() would do
+                self._async_conn.cancel()
 
     #
     #  Private
     #
 
+    def _execute(self, async_conn):
+        # Async variant of Connection.execute() in storm/database.py
+        state = State()
+        statement = compile(self.expr, state)
+        stmt = convert_param_marks(statement, "?", "%s")
+
+        with self._lock:
+            if self.status == self.STATUS_CANCELLED:
+                return
+            self.status = self.STATUS_EXECUTING
+            self._async_cursor = async_conn.cursor()
+            self._async_conn = async_conn
+
+        # This is postgres specific, see storm/databases/postgres.py
+        self._statement = stmt
+        self._parameters = tuple(Connection.to_database(state.parameters))
+
+        trace("connection_raw_execute", self._conn,
+              self._async_cursor, self._statement, self._parameters)
+        try:
+            self._async_cursor.execute(self._statement,
+                                       self._parameters)
+        except psycopg2.extensions.QueryCanceledError:
+            # Cancelled by another thread, see cancel()
+            if self.status == self.STATUS_CANCELLED:
+                return
+            raise
+
+        # This can happen if another thread cancelled this while the cursor was
+        # executing. In that case, it is not interested in the retval anymore
+        with self._lock:
+            if self.status == self.STATUS_CANCELLED:
+                return
+            self.status = self.STATUS_FINISHED
+        GLib.idle_add(self._on_finish)
+
     def _on_finish(self):
         if self.status == self.STATUS_CANCELLED:
             return
         self.emit('finish')
 
+    def _on_error(self):
+        if self.status == self.STATUS_CANCELLED:
+            return
+        self.emit('error', self.error)
+
 
 GObject.type_register(AsyncQueryOperation)
 
 
-class _OperationExecuter(threading.Thread):
+class AsyncSummaryOperation(AsyncQueryOperation):
+    """An :class:`AsyncQueryOperation` for a summary query
 
-    _SINGLETON = None
+    The result of this operation is a :class:`kiwi.python.Settable` with
+    an attribute for each one of the aggregated values, instead of a
+    result set.
+    """
+
+    def __init__(self, store, resultset, expr, descs,
+                 priority=AsyncQueryOperation.PRIORITY_BACKGROUND):
+        """
+        :param descs: the names of the columns of the summary query
+        """
+        super(AsyncSummaryOperation, self).__init__(store, resultset, expr,
+                                                    priority=priority)
+        self.descs = descs
+
+    def get_result(self):
+        """Get the summary of the result set
+
+        :returns: a :class:`kiwi.python.Settable` with the summary
+        """
+        result = super(AsyncSummaryOperation, self).get_result()
+        values = result._result.get_one()
+        assert len(self.descs) == len(values), (self.descs, values)
+        return Settable(**dict(zip(self.descs, values)))
 
-    def __init__(self):
-        super(_OperationExecuter, self).__init__()
 
-        self._conn = psycopg2.connect(db_settings.get_store_dsn())
-        self._queue = queue.Queue()
+class _OperationExecuter(object):
+    """Executes :class:`AsyncQueryOperation` on a pool of connections
+
+    Each one of the *pool_size* threads has its own connection, created
+    when it executes its first operation, so a slow query does not
+    block the ones scheduled after it. The operations are executed in
+    the order of their priority and then in the order they were scheduled.
+    """
+
+    _SINGLETON = None
+
+    #: the maximum number of queries executing at the same time
+    pool_size = 3
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size or self.pool_size
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._busy = 0
+        self._n_executed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._threads = []
+        for i in range(self.pool_size):
+            thread = threading.Thread(target=self._run,
+                                      name='async-query-%d' % (i, ))
+            thread.daemon = True
+            self._threads.append(thread)
 
     @classmethod
     def get_instance(cls):
         if cls._SINGLETON is None:
             cls._SINGLETON = cls()
-            cls._SINGLETON.daemon = True
             cls._SINGLETON.start()
         return cls._SINGLETON
 
-    def run(self):
-        while True:
-            operation = self._queue.get()
-            operation.execute(self._conn)
-            self._queue.task_done()
+    def start(self):
+        for thread in self._threads:
+            thread.start()
 
     def schedule(self, operation):
         assert isinstance(operation, AsyncQueryOperation)
-        self._queue.put(operation)
+        operation.scheduled_at = time.monotonic()
+        # The counter keeps the scheduling order among operations with the
+        # same priority and avoids comparing the operations themselves
+        self._queue.put((operation.priority, next(self._counter), operation))
+
+    def get_stats(self):
+        """Get some metrics about the executed operations
+
+        :returns: a dict with the number of operations waiting in the queue
+          (``queue_depth``), the number of ones being executed (``busy``),
+          the number of ``executed`` ones and the ``avg_wait`` and
+          ``max_wait`` times, in seconds, they spent in the queue
+        """
+        with self._stats_lock:
+            return dict(
+                queue_depth=self._queue.qsize(),
+                busy=self._busy,
+                executed=self._n_executed,
+                avg_wait=self._total_wait / (self._n_executed or 1),
+                max_wait=self._max_wait)
+
+    #
+    #  Private
+    #
+
+    def _run(self):
+        conn = None
+        while True:
+            priority, n, operation = self._queue.get()
+            operation.started_at = time.monotonic()
+            wait = operation.started_at - operation.scheduled_at
+            with self._stats_lock:
+                self._busy += 1
+                self._n_executed += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+
+            try:
+                if conn is None:
+                    conn = psycopg2.connect(db_settings.get_store_dsn())
+                    # The queries here are only reading data, there is no
+                    # reason to keep a transaction opened between them
+                    conn.autocommit = True
+                operation.execute(conn)
+            except Exception as e:
+                # Don't let a failed query kill the thread, or every
+                # async operation scheduled after it would wait forever
+                log.exception("Async query failed")
+                operation.fail(e)
+                # The connection may be broken, the next operation
+                # executed by this thread will open a new one
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+                    conn = None
+            finally:
+                operation.finished_at = time.monotonic()
+                with self._stats_lock:
+                    self._busy -= 1
+                log.debug("Async query waited %.3fs and took %.3fs "
+                          "(stats: %r)",
+                          wait, operation.finished_at - operation.started_at,
+                          self.get_stats())
+                self._queue.task_done()
 
 
 class QueryExecuter(object):
@@ -340,6 +533,7 @@ class QueryExecuter(object):
         self._filter_query_callbacks = {}
         self._query = self._default_query
         self.post_result = None
+        self._summary_columns = {}
         self._operation_executer = _OperationExecuter.get_instance()
 
     # Public API
@@ -371,14 +565,16 @@ class QueryExecuter(object):
         else:
             return resultset
 
-    def search_async(self, states=None, resultset=None, limit=None):
+    def search_async(self, states=None, resultset=None, limit=None,
+                     priority=AsyncQueryOperation.PRIORITY_INTERACTIVE):
         """
         Execute a search asynchronously.
         This uses a separate psycopg2 connection which is lazily
         created just before executing the first async query.
         This method returns an operation for which a signal **finish** is
-        emitted when the query has finished executing. In that callback,
-        :meth:`.AsyncQueryOperation.finish` should be called, eg:
+        emitted when the query has finished executing, or **error** if it
+        failed. In that callback, :meth:`.AsyncQueryOperation.finish`
+        should be called, eg:
 
         >>> from stoqlib.api import api
         >>> from stoqlib.domain.person import Person
@@ -402,6 +598,8 @@ class QueryExecuter(object):
 
         :param states:
         :param resultset: a resultset or ``None``
+        :param priority: the priority of the operation, see
+          :class:`AsyncQueryOperation`
         :returns: a query operation
         """
         if resultset is None:
@@ -412,7 +610,28 @@ class QueryExecuter(object):
             resultset.config(limit=limit)
         operation = AsyncQueryOperation(self.store,
                                         resultset,
-                                        resultset._get_select())
+                                        resultset._get_select(),
+                                        priority=priority)
+        self._operation_executer.schedule(operation)
+        return operation
+
+    def search_summary_async(self, resultset):
+        """Calculates the summary of a resultset asynchronously
+
+        The summary is calculated by the same connection used by
+        :meth:`.search_async`, so the rows of the resultset can be fetched
+        by the store at the same time the summary is being calculated,
+        without any of them being loaded. Note that, since it is another
+        connection, it will not see anything not commited by the store yet.
+        It is scheduled with a background priority, so it won't delay the
+        queries the user is waiting for, like the ones for completion.
+
+        :param resultset: the resultset to summarize, usually the one
+          returned by :meth:`.search`
+        :returns: a :class:`AsyncSummaryOperation`
+        """
+        descs, query = self.get_summary_query(resultset)
+        operation = AsyncSummaryOperation(self.store, resultset, query, descs)
         self._operation_executer.schedule(operation)
         return operation
 
@@ -495,12 +714,62 @@ class QueryExecuter(object):
 
         self._query = callback
 
-    def get_post_result(self, result):
-        descs, query = self.search_spec.post_search_callback(result)
+    def set_summary_column(self, name, column, aggregate=Sum):
+        """Declares a column to be aggregated in the summary of the results
+
+        This is only used when the search_spec does not define a
+        ``post_search_callback`` of its own.
+
+        :param name: the name of the attribute the aggregated value will
+          have in the summary, like ``'sum'``
+        :param column: a storm column or expression
+        :param aggregate: the aggregate function to use, like
+          ``Sum`` or ``Avg``
+        """
+        self._summary_columns[name] = (column, aggregate)
+
+    def get_summary_query(self, result):
+        """Gets the query used to calculate the summary of the results
+
+        If the search_spec defines a ``post_search_callback`` it will be
+        used to build the query. Otherwise the summary will contain the
+        ``count`` of the results and the columns declared by
+        :meth:`.set_summary_column`.
+
+        :param result: the result set to summarize
+        :returns: a tuple with the names of the summary columns and the
+          query to execute
+        """
+        if hasattr(self.search_spec, 'post_search_callback'):
+            descs, query = self.search_spec.post_search_callback(result)
+        else:
+            descs = ['count']
+            aggregates = []
+            columns = []
+            for i, (name, (column, aggregate)) in enumerate(
+                    self._summary_columns.items()):
+                if isinstance(column, Alias):
+                    column = column.expr
+                descs.append(name)
+                aggregates.append(aggregate(Field('_summary', '_c%d' % i)))
+                columns.append(Alias(column, '_c%d' % i))
+            # Aggregate the results themselves in a subquery, since they
+            # could be grouped, like the ones from most of the viewables
+            expr = result.get_select_expr(Alias(SQL('1'), '_one'),
+                                           *columns)
+            expr.order_by = Undef
+            expr.limit = Undef
+            expr.offset = Undef
+            query = Select(columns=[Count(1)] + aggregates,
+                           tables=[Alias(expr, '_summary')])
         # This should not be present in the query, since post_search_callback
         # should only use aggregate functions.
         query.order_by = Undef
         query.group_by = Undef
+        return descs, query
+
+    def get_post_result(self, result):
+        descs, query = self.get_summary_query(result)
         store = self.store
         values = store.execute(query).get_one()
         assert len(descs) == len(values), (descs, values)
@@ -638,8 +907,14 @@ class QueryExecuter(object):
         if not state.text.strip():
             return
 
+        # Prefer the normalized copy of the column, which can use an index,
+        # to normalizing the column for each row of the table
+        normalized_field = get_normalized_column(table_field)
+        if normalized_field is None:
+            normalized_field = StoqNormalizeString(table_field)
+
         def _like(value):
-            return Like(StoqNormalizeString(table_field),
+            return Like(normalized_field,
                         StoqNormalizeString(u'%%%s%%' % value.lower()),
                         case_sensitive=False)
 
@@ -660,16 +935,11 @@ class QueryExecuter(object):
 
     def _parse_date_state(self, state, table_field):
         if state.date:
-            return Date(table_field) == Date(state.date)
+            return between_dates(table_field, state.date, state.date)
 
     def _parse_date_interval_state(self, state, table_field):
-        queries = []
-        if state.start:
-            queries.append(Date(table_field) >= Date(state.start))
-        if state.end:
-            queries.append(Date(table_field) <= Date(state.end))
-        if queries:
-            return And(*queries)
+        return between_dates(table_field, state.start or None,
+                             state.end or None)
 
     def _parse_bool_state(self, state, table_field):
         return table_field == state.value
@@ -24,15 +24,19 @@
 """ Runtime routines for applications"""
 
 from collections import namedtuple
+import contextlib
 import logging
 import sys
+import threading
+import uuid
 import warnings
 import weakref
 import os
 
 from kiwi.component import get_utility, provide_utility
 from storm import Undef
-from storm.expr import SQL, Avg
+from storm.database import convert_param_marks
+from storm.expr import SQL, Avg, State
 from storm.info import get_obj_info
 from storm.store import Store, ResultSet, PENDING_REMOVE, PENDING_ADD
 from storm.tracer import trace
@@ -43,7 +47,8 @@ from stoqlib.database.interfaces import (
     ICurrentBranchStation, ICurrentUser)
 from stoqlib.database.expr import is_sql_identifier
 from stoqlib.database.orm import ORMObject
-from stoqlib.database.properties import Identifier
+from stoqlib.database.properties import (clear_deferred_changes,
+                                         clear_deferred_values)
 from stoqlib.database.settings import db_settings
 from stoqlib.database.viewable import Viewable
 from stoqlib.exceptions import DatabaseError, LoginError
@@ -59,10 +64,17 @@ log = logging.getLogger(__name__)
 #: the default store, considered read-only in Stoq
 _default_store = None
 
+#: the default number of rows fetched at a time when streaming results
+STREAM_FETCH_SIZE = 1000
+
 #: list of global stores used by the application,
-#: should not be used by anything except autoreload_object()
+#: should not be used by anything except autoreload_object() and
+#: StoqlibStore.commit()
 _stores = weakref.WeakSet()
 
+#: the number of times a store was committed, see get_commit_count()
+_commit_count = 0
+
 
 def autoreload_object(obj, obj_store=False):
     """Autoreload object in any other existing store.
@@ -117,19 +129,7 @@ class StoqlibResultSet(ResultSet):
         """Converts the result of this result set into an instance of the
         configured viewable.
         """
-        instance = self._viewable()
-        # This will be removed later
-        instance._store = self._store
-        identifiers = []
-        for attr, value in zip(self._viewable.cls_attributes, values):
-            if isinstance(value, Identifier):
-                identifiers.append(value)
-            setattr(instance, attr, value)
-        branch = getattr(instance, 'branch', None)
-        if branch:
-            for i in identifiers:
-                i.prefix = branch.acronym or ''
-        return instance
+        return self._viewable._load_row(self._store, values)
 
     def _load_objects(self, result, values):
         # Overwrite the default _load_objects so we can convert the results to
@@ -176,7 +176,39 @@ class StoqlibResultSet(ResultSet):
         else:
             return objects[0]
 
-    def fast_iter(self):
+    def _execute_streaming(self, fetch_size):
+        # Named cursors are kept on the server side, so instead of receiving
+        # the whole result at once we will only receive fetch_size rows at a
+        # time, as the result is iterated. They only exist inside a
+        # transaction, which is always the case for our stores.
+        connection = self._store._connection
+        state = State()
+        statement = convert_param_marks(
+            connection.compile(self._get_select(), state),
+            '?', connection.param_mark)
+        params = tuple(connection.to_database(state.parameters))
+
+        connection._ensure_connected()
+        raw_cursor = connection._raw_connection.cursor(
+            'stoq_stream_%s' % (uuid.uuid4().hex, ))
+        raw_cursor.arraysize = fetch_size
+        trace('connection_raw_execute', connection, raw_cursor,
+              statement, params)
+        raw_cursor.execute(statement, params)
+        trace('connection_raw_execute_success', connection, raw_cursor,
+              statement, params)
+        return connection.result_factory(connection, raw_cursor)
+
+    def fast_iter(self, fetch_size=None):
+        """Iterates over the results bypassing storm object creation
+
+        Each result will be a namedtuple for each table (or a viewable
+        when querying one) instead of the real object.
+
+        :param fetch_size: if not ``None``, the results will be streamed
+          from the database using a server side cursor, fetching this
+          number of rows at a time. See :meth:`.stream`
+        """
         # First build all named tuples
         named_tuples = []
         for is_expr, info in self._find_spec._cls_spec_info:
@@ -186,13 +218,39 @@ class StoqlibResultSet(ResultSet):
                 named_tuples.append(namedtuple(info.cls.__name__,
                                                [i.name for i in info.columns]))
 
+        if fetch_size is None:
+            result = self._store._connection.execute(self._get_select())
+        else:
+            result = self._execute_streaming(fetch_size)
+
         is_viewable = hasattr(self, '_viewable')
         # Then interate over the results bypassing storm object creation
-        for values in self._store._connection.execute(self._get_select()):
-            value = self._load_fast_object(named_tuples, values)
-            if is_viewable:
-                value = self._load_viewable(value)
-            yield value
+        try:
+            for values in result:
+                value = self._load_fast_object(named_tuples, values)
+                if is_viewable:
+                    value = self._load_viewable(value)
+                yield value
+        finally:
+            result.close()
+
+    def stream(self, fetch_size=STREAM_FETCH_SIZE):
+        """Iterates over the results using a server side cursor
+
+        Unlike iterating the result set directly, which transfers the whole
+        result to the client when the query is executed, this will fetch
+        *fetch_size* rows at a time, keeping the memory usage flat no matter
+        how many results there are. Use it when going over a lot of results
+        only once, like when exporting or generating a report.
+
+        :param fetch_size: the number of rows to fetch at a time
+        """
+        result = self._execute_streaming(fetch_size)
+        try:
+            for values in result:
+                yield self._load_objects(result, values)
+        finally:
+            result.close()
 
 
 class StoqlibStore(Store):
@@ -241,6 +299,9 @@ class StoqlibStore(Store):
         # When using savepoints, this stack will hold what objects were changed
         # (created, deleted or edited) inside that savepoint.
         self._dirties = [[]]
+        # Data cached by the domain classes, see get_cache
+        self._caches = {}
+        self._invalidated_caches = set()
         self.retval = True
         self.obsolete = False
 
@@ -441,6 +502,7 @@ class StoqlibStore(Store):
 
         :param close: If ``True``, the store will also be closed after committed.
         """
+        global _commit_count
         self._check_obsolete()
         self._committing = True
 
@@ -454,10 +516,18 @@ class StoqlibStore(Store):
 
         super(StoqlibStore, self).commit()
         trace('transaction_commit', self)
+        _commit_count += 1
 
         self._savepoints = []
         self._dirties = [[]]
 
+        # The changes are visible for the other stores now, so they
+        # cannot keep using what they cached about them
+        for store in list(_stores):
+            for name in self._invalidated_caches:
+                store._caches.pop(name, None)
+        self._invalidated_caches.clear()
+
         # Reload objects on all other opened stores
         for obj in touched_objs:
             autoreload_object(obj)
@@ -514,10 +584,13 @@ class StoqlibStore(Store):
         if name:
             self.rollback_to_savepoint(name)
         else:
+            for obj_info in self._dirty:
+                clear_deferred_changes(obj_info)
             super(StoqlibStore, self).rollback()
             # If we rollback completely, we need to clear all savepoints
             self._savepoints = []
             self._dirties = [[]]
+            self._invalidated_caches.clear()
 
         # Rolling back resets the application name.
         self._setup_application_name()
@@ -560,6 +633,17 @@ class StoqlibStore(Store):
         else:
             raise TypeError("obj must be a ORMObject or a Viewable, not %r" % (obj, ))
 
+    def autoreload(self, obj=None):
+        self._clear_deferred_values(obj)
+        super(StoqlibStore, self).autoreload(obj)
+
+    def invalidate(self, obj=None):
+        # The objects on the caches would need to be reloaded anyway
+        if obj is None:
+            self._caches.clear()
+        self._clear_deferred_values(obj)
+        super(StoqlibStore, self).invalidate(obj)
+
     def remove(self, obj):
         """Remove an objet from the store
 
@@ -615,6 +699,32 @@ class StoqlibStore(Store):
         # Make sure to autorelad the original values after the rollback
         for obj_info in self._cache.get_cached():
             self.autoreload(obj_info.get_obj())
+        self._caches.clear()
+
+    def get_cache(self, name):
+        """Gets a cache bound to this store
+
+        Domain classes can use it to keep data that would otherwise be
+        queried over and over, like the branch overrides of the sellables.
+        The caches are cleared when the store is committed, rolled back or
+        invalidated and when :meth:`.invalidate_cache` is called.
+
+        :param name: the name of the cache
+        :returns: a dict where the data can be kept
+        """
+        return self._caches.setdefault(name, {})
+
+    def invalidate_cache(self, name):
+        """Invalidates a cache created by :meth:`.get_cache`
+
+        This should be called when the data kept on the cache is modified.
+        The cache is cleared on this store right away and on all the other
+        ones after this store is committed.
+
+        :param name: the name of the cache
+        """
+        self._caches.pop(name, None)
+        self._invalidated_caches.add(name)
 
     def savepoint_exists(self, name):
         """Checks if the given savepoint's name exists
@@ -671,6 +781,16 @@ class StoqlibStore(Store):
         if self.obsolete:
             raise InterfaceError("This transaction has already been closed")
 
+    def _clear_deferred_values(self, obj=None):
+        # The deferred columns are not known by storm, so they need to be
+        # reloaded together with the other columns of the objects
+        if obj is None:
+            obj_infos = self._iter_alive()
+        else:
+            obj_infos = [get_obj_info(obj)]
+        for obj_info in obj_infos:
+            clear_deferred_values(obj_info)
+
 
 def get_default_store():
     """This function returns the default/primary store.
@@ -715,6 +835,117 @@ def new_store():
     return StoqlibStore()
 
 
+def get_commit_count():
+    """Gets the number of times a store was committed by this process
+
+    Data cached outside of the stores can compare this with the value it
+    had when the data was fetched, to find out if it might be outdated.
+
+    :returns: the number of commits
+    """
+    return _commit_count
+
+
+class StorePool(object):
+    """A pool of read-only stores
+
+    Each store opens its own database connection, so threads doing short
+    queries can share a few of them instead of creating new ones all the
+    time. A store is used by one thread at a time and it is rolled back
+    when returned to the pool, so the next thread to use it will see the
+    changes committed meanwhile.
+
+    :param size: the maximum number of stores in the pool
+    """
+
+    def __init__(self, size=3):
+        self.size = size
+        # The stores which are not being used, the last returned is the
+        # first to be used again
+        self._stores = []
+        self._cond = threading.Condition()
+        self._n_created = 0
+
+    #
+    #  Public API
+    #
+
+    @contextlib.contextmanager
+    def store(self):
+        """Gets a store from the pool
+
+        If all of the stores are being used, this will wait until one
+        of them is returned to the pool::
+
+            with pool.store() as store:
+                store.find(...)
+        """
+        store = self._acquire()
+        try:
+            yield store
+        finally:
+            self._release(store)
+
+    def close(self):
+        """Closes the stores which are not being used"""
+        with self._cond:
+            stores, self._stores = self._stores, []
+        for store in stores:
+            self._discard(store)
+
+    #
+    #  Private
+    #
+
+    def _create_store(self):
+        store = new_store()
+        # Make sure nothing gets written by the users of the pool. This is
+        # committed on the connection directly since StoqlibStore.commit
+        # would count it as a change to the database
+        store.execute('SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY')
+        store._connection.commit()
+        return store
+
+    def _acquire(self):
+        with self._cond:
+            # Wait for a store to be returned or for room to create one,
+            # which happens when a broken store is discarded
+            while not self._stores and self._n_created >= self.size:
+                self._cond.wait()
+            if self._stores:
+                return self._stores.pop()
+            self._n_created += 1
+
+        try:
+            return self._create_store()
+        except Exception:
+            with self._cond:
+                self._n_created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, store):
+        try:
+            store.rollback(close=False)
+        except Exception:
+            # Probably the connection was lost, so don't give it to anyone
+            log.exception('Discarding a broken store from the pool')
+            self._discard(store)
+        else:
+            with self._cond:
+                self._stores.append(store)
+                self._cond.notify()
+
+    def _discard(self, store):
+        with self._cond:
+            self._n_created -= 1
+            self._cond.notify()
+        try:
+            store.close()
+        except Exception:
+            pass
+
+
 #
 # User methods
 #
@@ -28,14 +28,20 @@
 
  module is the domain module which lives the classes in the list
  (classA, classB, ...).
+
+ The modules are only imported when one of their tables is requested.
+ The tables of the plugins come from their get_tables, or from the
+ manifest generated by "make plugin-tables" to avoid importing them.
 """
 
 import collections
+import json
 import logging
 import os
 
 from kiwi.python import namedAny
 
+from stoqlib.lib.kiwilibrary import library
 from stoqlib.lib.pluginmanager import get_plugin_manager
 from stoqlib.lib.translation import stoqlib_gettext
 
@@ -73,10 +79,11 @@ _tables = [
                 "ClientCategory",
                 "ClientSalaryHistory",
                 "CreditCheckHistory",
-                "UserBranchAccess"]),
+                "UserBranchAccess",
+                "ClientCreditBalance"]),
     ('synchronization', ["BranchSynchronization"]),
     ('station', ['StationType', "BranchStation"]),
-    ('till', ["Till", "TillEntry", 'TillSummary']),
+    ('till', ["Till", "TillEntry", 'TillSummary', 'TillTotal']),
     ('token', ['AccessToken']),
     ('payment.card', ["CreditProvider", "CreditCardData", 'CardPaymentDevice',
                       'CardOperationCost']),
@@ -172,39 +179,109 @@ _tables = [
     ('message', ['Message']),
 ]
 
+#: the name of the manifest with the tables of the plugins, generated by
+#: :func:`write_plugin_tables_manifest` when building
+PLUGIN_TABLES_MANIFEST = 'plugin-tables.json'
+
 # table name (e.g. "Person") -> class
 _tables_cache = collections.OrderedDict()
+# table name (e.g. "Person") -> the full name of the class
+_table_paths = collections.OrderedDict()
+
+
+def _read_plugin_tables_manifest():
+    if not library.get_resource_exists('stoq', 'misc',
+                                       PLUGIN_TABLES_MANIFEST):
+        return {}
+    try:
+        return json.loads(library.get_resource_string(
+            'stoq', 'misc', PLUGIN_TABLES_MANIFEST).decode())
+    except ValueError as e:
+        log.warning("Could not read the plugin tables manifest: %s" % (e, ))
+        return {}
+
 
+def _get_plugin_tables(p_manager, p_name, manifest):
+    desc = p_manager.get_description_by_name(p_name)
+    entry = manifest.get(p_name)
+    if entry is not None and entry['version'] == desc.version:
+        # The modules of the plugin will be imported without importing
+        # the plugin itself
+        desc.add_to_sys_path()
+        return entry['tables']
+    return p_manager.get_plugin(p_name).get_tables()
 
-def _get_tables_cache():
-    if _tables_cache:
-        return _tables_cache
+
+def _get_table_paths():
+    if _table_paths:
+        return _table_paths
 
     for path, table_names in _tables:
         for table_name in table_names:
-            klass = namedAny('stoqlib.domain.%s.%s' % (path, table_name))
-            _tables_cache[table_name] = klass
+            _table_paths[table_name] = 'stoqlib.domain.%s.%s' % (path,
+                                                                table_name)
 
+    manifest = _read_plugin_tables_manifest()
     p_manager = get_plugin_manager()
     for p_name in p_manager.installed_plugins_names:
-        plugin = p_manager.get_plugin(p_name)
-        for path, table_names in plugin.get_tables():
+        desc = p_manager.get_description_by_name(p_name)
+        basepath = os.path.basename(desc.dirname)
+        for path, table_names in _get_plugin_tables(p_manager, p_name,
+                                                    manifest):
             for table_name in table_names:
-                desc = p_manager.get_description_by_name(p_name)
-                basepath = os.path.basename(desc.dirname)
-                klass = namedAny('.'.join([basepath, path, table_name]))
-                _tables_cache[table_name] = klass
+                _table_paths[table_name] = '.'.join(
+                    [basepath, path, table_name])
+
+    return _table_paths
 
-    return _tables_cache
+
+def clear_tables_cache():
+    """Clears the cached tables
+
+    Needed when the installed plugins change, so their tables are
+    found again.
+    """
+    _tables_cache.clear()
+    _table_paths.clear()
 
 
 def get_table_type_by_name(table_name):
     """Gets a table by name.
 
+    Only the module of the table is imported, the first time it is
+    requested.
+
     :param table_name: name of the table
     """
-    return _get_tables_cache()[table_name]
+    klass = _tables_cache.get(table_name)
+    if klass is None:
+        klass = namedAny(_get_table_paths()[table_name])
+        _tables_cache[table_name] = klass
+    return klass
 
 
 def get_table_types():
-    return list(_get_tables_cache().values())
+    return [get_table_type_by_name(table_name)
+            for table_name in _get_table_paths()]
+
+
+def write_plugin_tables_manifest(filename):
+    """Writes the manifest with the tables of all the available plugins
+
+    This is done when building, so the tables of the plugins can be
+    found without importing them.
+
+    :param filename: the name of the file
+    """
+    p_manager = get_plugin_manager()
+    manifest = collections.OrderedDict()
+    for p_name in sorted(p_manager.available_plugins_names):
+        desc = p_manager.get_description_by_name(p_name)
+        tables = p_manager.get_plugin(p_name).get_tables()
+        manifest[p_name] = collections.OrderedDict([
+            ('version', desc.version),
+            ('tables', [[path, list(table_names)]
+                        for path, table_names in tables])])
+    with open(filename, 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+        fp.write('\n')
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+__tests__ = 'stoqlib/database/debug.py'
+
+import json
+import os
+import tempfile
+
+from storm.tracer import install_tracer, remove_tracer_type
+
+from stoqlib.database.debug import (StoqlibProfilerTracer,
+                                    get_statement_fingerprint)
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.test.domaintest import DomainTest
+
+
+class TestStoqlibProfilerTracer(DomainTest):
+
+    def setUp(self):
+        super(TestStoqlibProfilerTracer, self).setUp()
+        self.store.flush()
+        self.tracer = StoqlibProfilerTracer(repeat_threshold=3)
+        install_tracer(self.tracer)
+
+    def tearDown(self):
+        remove_tracer_type(StoqlibProfilerTracer)
+        super(TestStoqlibProfilerTracer, self).tearDown()
+
+    def test_get_statement_fingerprint(self):
+        self.assertEqual(
+            get_statement_fingerprint(
+                "SELECT sale.id FROM sale\n  WHERE sale.id IN (%s, %s, %s) "
+                "AND sale.status = 'it''s' LIMIT 10"),
+            "SELECT sale.id FROM sale WHERE sale.id IN (?, ...) "
+            "AND sale.status = ? LIMIT ?")
+
+    def test_get_profiles(self):
+        for code in [u'1', u'2', u'3']:
+            list(self.store.find(Sellable, code=code))
+        list(self.store.find(Sellable, barcode=u'1'))
+
+        profiles = self.tracer.get_profiles()
+        self.assertEqual(sorted(p.count for p in profiles
+                                if u'FROM sellable' in p.fingerprint), [1, 3])
+        profile = [p for p in profiles if p.count == 3][0]
+        self.assertEqual(profile.repeated_transactions, 1)
+        self.assertEqual(profile.max_per_transaction, 3)
+        self.assertEqual(len(profile.times), 3)
+        self.assertEqual(profile.p95_time, max(profile.times))
+        # The call site is this test, not the ORM
+        site, count = profile.call_sites.most_common(1)[0]
+        self.assertTrue(site.startswith(
+            os.path.join('stoqlib', 'database', 'test', 'test_debug.py')))
+        self.assertEqual(count, 3)
+
+        report = self.tracer.get_report()
+        self.assertEqual([p['fingerprint'] for p in report['repeated']],
+                         [profile.fingerprint])
+
+    def test_dump(self):
+        list(self.store.find(Sellable, code=u'1'))
+        for suffix in ['.json', '.html']:
+            fd, filename = tempfile.mkstemp(prefix='stoqlib-test-profile-',
+                                            suffix=suffix)
+            os.close(fd)
+            try:
+                self.tracer.dump(filename)
+                with open(filename) as fp:
+                    data = fp.read()
+            finally:
+                os.unlink(filename)
+            if suffix == '.json':
+                self.assertGreater(json.loads(data)['count'], 0)
+            else:
+                self.assertIn('FROM sellable', data)
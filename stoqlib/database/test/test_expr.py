@@ -26,10 +26,14 @@
 
 import datetime
 
-from storm.expr import Cast, Sum
+from storm.expr import Cast, Like, Sum
+from storm.info import ClassAlias
 
-from stoqlib.database.expr import Case, Between, GenerateSeries, Field, Over
+from stoqlib.database.expr import (Case, Between, GenerateSeries, Field, Over,
+                                   between_dates, get_normalized_column)
 from stoqlib.domain.event import Event
+from stoqlib.domain.person import Person
+from stoqlib.domain.sellable import Sellable
 from stoqlib.domain.test.domaintest import DomainTest
 
 
@@ -59,6 +63,30 @@ class ViewableTest(DomainTest):
               event_type=Event.TYPE_SYSTEM, description=u'')
         self.assertEqual(self.store.find(Event, query).count(), 2)
 
+    def test_between_dates(self):
+        self.clean_domain([Event])
+
+        for date in [datetime.datetime(2012, 1, 4, 23, 59),
+                     datetime.datetime(2012, 1, 5),
+                     datetime.datetime(2012, 1, 10, 23, 59),
+                     datetime.datetime(2012, 1, 11)]:
+            Event(store=self.store, date=date,
+                  event_type=Event.TYPE_SYSTEM, description=u'')
+
+        def count(*args):
+            return self.store.find(Event, between_dates(Event.date, *args)).count()
+
+        self.assertEqual(count(datetime.date(2012, 1, 5),
+                               datetime.date(2012, 1, 10)), 2)
+        # The time should be ignored
+        self.assertEqual(count(datetime.datetime(2012, 1, 5, 12),
+                               datetime.datetime(2012, 1, 10, 12)), 2)
+        self.assertEqual(count(datetime.date(2012, 1, 10),
+                               datetime.date(2012, 1, 10)), 1)
+        self.assertEqual(count(datetime.date(2012, 1, 5)), 3)
+        self.assertEqual(count(None, datetime.date(2012, 1, 5)), 2)
+        self.assertIsNone(between_dates(Event.date))
+
     def test_generate_series_date(self):
         a = datetime.datetime(2012, 1, 1)
         b = datetime.datetime(2012, 4, 1)
@@ -131,3 +159,24 @@ class ViewableTest(DomainTest):
 
         self.assertEqual(data, [
             (i, 55, sum(range(i + 1)), i) for i in range(11)])
+
+    def test_get_normalized_column(self):
+        client_person = ClassAlias(Person, 'client_person')
+        self.assertEqual(get_normalized_column(Person.name).name,
+                         'name_normalized')
+        self.assertIs(get_normalized_column(client_person.name).table,
+                      client_person)
+        self.assertEqual(get_normalized_column(Sellable.description).name,
+                         'description_normalized')
+        self.assertIsNone(get_normalized_column(Sellable.code))
+        self.assertIsNone(get_normalized_column(Sum(Sellable.price)))
+
+        sellable = self.create_sellable(description=u'Açúcar Refinado')
+        normalized = get_normalized_column(Sellable.description)
+        self.assertEqual(
+            self.store.find(Sellable, Like(normalized, u'%acucar%')).one(),
+            sellable)
+        sellable.description = u'Café'
+        self.assertEqual(
+            self.store.find(Sellable, Like(normalized, u'%cafe%')).one(),
+            sellable)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+__tests__ = 'stoqlib/database/migration.py'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from stoqlib.database import migration
+from stoqlib.database.migration import StoqlibSchemaMigration
+
+
+class TestLatestAvailableVersion(unittest.TestCase):
+    def setUp(self):
+        self.app_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.app_dir)
+        self.patches_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.patches_dir)
+        self.cache_filename = os.path.join(
+            self.app_dir, migration._PATCH_VERSIONS_FILENAME)
+        for name in ['patch-05-01.sql', 'patch-06-02.py']:
+            self._add_patch(name)
+
+        patchers = [
+            # Don't touch the cache on the real application dir
+            mock.patch('stoqlib.database.migration.get_application_dir',
+                       return_value=self.app_dir),
+            mock.patch.dict(migration._latest_versions, clear=True),
+            mock.patch.object(StoqlibSchemaMigration, '_get_patches_dir',
+                              return_value=self.patches_dir),
+            mock.patch.object(
+                StoqlibSchemaMigration, '_get_patch_names',
+                side_effect=lambda: os.listdir(self.patches_dir)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.migration = StoqlibSchemaMigration()
+
+    def _add_patch(self, name):
+        with open(os.path.join(self.patches_dir, name), 'w'):
+            pass
+        # Make sure the mtime of the directory changes, even on file
+        # systems with a coarse resolution
+        stat = os.stat(self.patches_dir)
+        os.utime(self.patches_dir, (stat.st_atime, stat.st_mtime + 10))
+
+    def _read_cache(self):
+        with open(self.cache_filename) as f:
+            return json.load(f)
+
+    def test_read_latest_version(self):
+        self.assertEqual(self.migration._read_latest_version(), (6, 2))
+        entry = self._read_cache()[self.patches_dir]
+        self.assertEqual(entry['version'], [6, 2])
+        self.assertEqual(entry['mtime'], os.stat(self.patches_dir).st_mtime)
+
+        # The patches are not listed while the directory does not change
+        with mock.patch.object(StoqlibSchemaMigration,
+                               '_get_patch_names') as get_patch_names:
+            self.assertEqual(self.migration._read_latest_version(), (6, 2))
+        self.assertFalse(get_patch_names.called)
+
+    def test_read_latest_version_mtime(self):
+        self.assertEqual(self.migration._read_latest_version(), (6, 2))
+
+        self._add_patch('patch-06-03.sql')
+        self.assertEqual(self.migration._read_latest_version(), (6, 3))
+        self.assertEqual(self._read_cache()[self.patches_dir]['version'],
+                         [6, 3])
+
+    def test_read_latest_version_corrupted_cache(self):
+        for content in ['{"broken', '[1, 2]',
+                        json.dumps({self.patches_dir: {}}),
+                        json.dumps({self.patches_dir: [1, 2]})]:
+            with open(self.cache_filename, 'w') as f:
+                f.write(content)
+            self.assertEqual(self.migration._read_latest_version(), (6, 2))
+            self.assertEqual(
+                self._read_cache()[self.patches_dir]['version'], [6, 2])
+
+    def test_read_latest_version_missing_cache(self):
+        self.assertFalse(os.path.exists(self.cache_filename))
+        self.assertEqual(self.migration._read_latest_version(), (6, 2))
+        self.assertTrue(os.path.exists(self.cache_filename))
+
+        # The version is still returned if the cache can't be written
+        missing_dir = os.path.join(self.app_dir, 'missing')
+        with mock.patch('stoqlib.database.migration.get_application_dir',
+                        return_value=missing_dir):
+            self.assertEqual(self.migration._read_latest_version(), (6, 2))
+        self.assertFalse(os.path.exists(missing_dir))
+
+    def test_read_latest_version_no_directory(self):
+        # The patches may come from somewhere else, like an egg
+        with mock.patch.object(StoqlibSchemaMigration, '_get_patches_dir',
+                               return_value=None):
+            self.assertEqual(self.migration._read_latest_version(), (6, 2))
+        self.assertFalse(os.path.exists(self.cache_filename))
+
+    def test_get_latest_available_version(self):
+        with mock.patch.object(StoqlibSchemaMigration,
+                               '_read_latest_version',
+                               return_value=(6, 2)) as read_latest_version:
+            self.assertEqual(self.migration.get_latest_available_version(),
+                             (6, 2))
+            self.assertEqual(
+                StoqlibSchemaMigration().get_latest_available_version(),
+                (6, 2))
+        self.assertEqual(read_latest_version.call_count, 1)
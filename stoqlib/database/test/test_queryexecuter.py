@@ -23,12 +23,18 @@
 ##
 """ This module tests stoq/database/database.py """
 
+from decimal import Decimal
+
 import mock
+from storm.expr import Avg
+import psycopg2
 
 from stoqlib.domain.test.domaintest import DomainTest
 from stoqlib.domain.person import ClientCategory
-from stoqlib.database.queryexecuter import (QueryExecuter,
-                                            StringQueryState)
+from stoqlib.database.queryexecuter import (AsyncQueryOperation,
+                                            QueryExecuter,
+                                            StringQueryState,
+                                            _OperationExecuter)
 
 
 class QueryExecuterTest(DomainTest):
@@ -135,3 +141,121 @@ class QueryExecuterTest(DomainTest):
         finally:
             self.clean_domain([ClientCategory])
             self.store.commit()
+
+    def test_get_post_result(self):
+        self.create_client_category(u'EYE MOON').max_discount = 10
+        self.create_client_category(u'EYE SUN').max_discount = 5
+        self.create_client_category(u'STONE').max_discount = 20
+        self.qe.set_summary_column('sum', ClientCategory.max_discount)
+        self.qe.set_summary_column('avg', ClientCategory.max_discount, Avg)
+
+        post = self.qe.get_post_result(self._search_string_all(u'eye'))
+        self.assertEqual(post.count, 2)
+        self.assertEqual(post.sum, 15)
+        self.assertEqual(post.avg, Decimal('7.5'))
+
+    def test_search_summary_async(self):
+        self.assertEqual(self.store.find(ClientCategory).count(), 0)
+        try:
+            self.create_client_category(u'EYE MOON').max_discount = 10
+            self.create_client_category(u'EYE SUN').max_discount = 5
+            self.create_client_category(u'STONE').max_discount = 20
+            # search_summary_async uses another connection, just like
+            # search_async, so the store needs to be commited
+            self.store.commit()
+            self.qe.set_summary_column('sum', ClientCategory.max_discount)
+
+            op = self.qe.search_summary_async(self._search_string_all(u'eye'))
+            self.assertEqual(op.priority,
+                             AsyncQueryOperation.PRIORITY_BACKGROUND)
+            self.assertTrue(op.wait())
+            post = op.get_result()
+            self.assertEqual(post.count, 2)
+            self.assertEqual(post.sum, 15)
+        finally:
+            self.clean_domain([ClientCategory])
+            self.store.commit()
+
+
+class OperationExecuterTest(DomainTest):
+    def _create_operation(self, priority):
+        resultset = self.store.find(ClientCategory)
+        return AsyncQueryOperation(self.store, resultset,
+                                   resultset._get_select(),
+                                   priority=priority)
+
+    def test_schedule_priority(self):
+        # The threads are not started, so the operations stay in the queue
+        executer = _OperationExecuter(pool_size=2)
+        background = self._create_operation(
+            AsyncQueryOperation.PRIORITY_BACKGROUND)
+        interactive1 = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        interactive2 = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        for operation in [background, interactive1, interactive2]:
+            executer.schedule(operation)
+
+        self.assertEqual(executer.get_stats()['queue_depth'], 3)
+        self.assertEqual(
+            [executer._queue.get()[2] for i in range(3)],
+            [interactive1, interactive2, background])
+
+    def test_cancel_waiting(self):
+        executer = _OperationExecuter(pool_size=1)
+        operation = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        executer.schedule(operation)
+        operation.cancel()
+        executer.start()
+        executer._queue.join()
+
+        self.assertEqual(operation.status, AsyncQueryOperation.STATUS_CANCELLED)
+        self.assertFalse(operation.wait())
+        stats = executer.get_stats()
+        self.assertEqual(stats['executed'], 1)
+        self.assertEqual(stats['busy'], 0)
+
+    @mock.patch('stoqlib.database.queryexecuter.GLib.idle_add')
+    @mock.patch('stoqlib.database.queryexecuter.psycopg2.connect')
+    def test_execute_error(self, connect, idle_add):
+        executer = _OperationExecuter(pool_size=1)
+        failed = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        error = psycopg2.OperationalError()
+        failed._execute = mock.Mock(side_effect=error)
+        executer.schedule(failed)
+        executer.start()
+        executer._queue.join()
+
+        self.assertEqual(failed.status, AsyncQueryOperation.STATUS_ERROR)
+        self.assertIs(failed.error, error)
+        self.assertFalse(failed.wait())
+        idle_add.assert_called_once_with(failed._on_error)
+        # The possibly broken connection is closed and replaced
+        connect.return_value.close.assert_called_once_with()
+        operation = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        operation._execute = mock.Mock()
+        executer.schedule(operation)
+        executer._queue.join()
+        self.assertEqual(connect.call_count, 2)
+        operation._execute.assert_called_once_with(connect.return_value)
+
+    @mock.patch('stoqlib.database.queryexecuter.GLib.idle_add')
+    @mock.patch('stoqlib.database.queryexecuter.psycopg2.connect')
+    def test_connect_error(self, connect, idle_add):
+        executer = _OperationExecuter(pool_size=1)
+        operation = self._create_operation(
+            AsyncQueryOperation.PRIORITY_INTERACTIVE)
+        error = psycopg2.OperationalError()
+        connect.side_effect = error
+        executer.schedule(operation)
+        executer.start()
+        executer._queue.join()
+
+        self.assertEqual(operation.status, AsyncQueryOperation.STATUS_ERROR)
+        self.assertIs(operation.error, error)
+        self.assertFalse(operation.wait(0))
+        idle_add.assert_called_once_with(operation._on_error)
+        self.assertEqual(executer.get_stats()['busy'], 0)
@@ -24,11 +24,14 @@
 
 """Tests for module :class:`stoqlib.database.runtime`"""
 
+import threading
+
 import mock
 
 from stoqlib.database.exceptions import InterfaceError
 from stoqlib.database.properties import UnicodeCol
-from stoqlib.database.runtime import new_store, StoqlibStore, autoreload_object
+from stoqlib.database.runtime import (new_store, StoqlibStore, StorePool,
+                                      autoreload_object, get_commit_count)
 from stoqlib.domain.base import Domain
 from stoqlib.domain.person import Person, Client, ClientView
 from stoqlib.domain.test.domaintest import DomainTest
@@ -316,6 +319,87 @@ class StoqlibStoreTest(DomainTest):
 
         autoreload_object(obj1)
 
+    def test_get_commit_count(self):
+        count = get_commit_count()
+        with new_store() as store:
+            WillBeCommitted(store=store, test_var=u'XXX')
+        self.assertEqual(get_commit_count(), count + 1)
+
+    def test_store_pool(self):
+        count = get_commit_count()
+        pool = StorePool(size=1)
+        with pool.store() as store1:
+            # Creating the store is not counted as a commit
+            self.assertEqual(get_commit_count(), count)
+            self.assertEqual(store1.find(WillBeCommitted).count(), 0)
+            WillBeCommitted(store=store1, test_var=u'XXX')
+            # The stores are read-only
+            self.assertRaises(Exception, store1.flush)
+
+        with pool.store() as store2:
+            # The same store is reused and nothing done on it was kept
+            self.assertIs(store2, store1)
+            self.assertEqual(store2.find(WillBeCommitted).count(), 0)
+
+        pool.close()
+        self.assertTrue(store1.obsolete)
+
+    def test_store_pool_discard_wakes_waiter(self):
+        pool = StorePool(size=1)
+        broken = mock.Mock()
+        broken.rollback.side_effect = InterfaceError()
+        new = mock.Mock()
+        acquired = []
+
+        def wait_store():
+            with pool.store() as store:
+                acquired.append(store)
+
+        with mock.patch.object(pool, '_create_store',
+                               side_effect=[broken, new]):
+            with pool.store():
+                # The pool is full, so this one has to wait
+                waiter = threading.Thread(target=wait_store)
+                waiter.start()
+                waiter.join(0.1)
+                self.assertTrue(waiter.is_alive())
+            # The broken store was discarded, making room for a new one
+            waiter.join(5)
+
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(acquired, [new])
+        broken.close.assert_called_once_with()
+        self.assertEqual(pool._stores, [new])
+
+    def test_caches(self):
+        store1 = new_store()
+        store2 = new_store()
+        try:
+            store1.get_cache('test')['key'] = 1
+            store2.get_cache('test')['key'] = 2
+            self.assertEqual(store1.get_cache('test'), {'key': 1})
+
+            # Invalidating the cache clears it on the store right away...
+            store1.invalidate_cache('test')
+            self.assertEqual(store1.get_cache('test'), {})
+            self.assertEqual(store2.get_cache('test'), {'key': 2})
+
+            # ...and on the other stores after committing
+            store1.commit()
+            self.assertEqual(store2.get_cache('test'), {})
+
+            store2.get_cache('test')['key'] = 2
+            store2.savepoint('test')
+            store2.rollback_to_savepoint('test')
+            self.assertEqual(store2.get_cache('test'), {})
+
+            store2.get_cache('test')['key'] = 2
+            store2.rollback(close=False)
+            self.assertEqual(store2.get_cache('test'), {})
+        finally:
+            store1.close()
+            store2.close()
+
     def test_transaction_commit_hook(self):
         # Dummy will only be asserted for creation on the first commit.
         # After that it should pass all assert for nothing made.
@@ -462,3 +546,26 @@ class TestStoqlibResultSet(DomainTest):
         for obj, tpl in zip(results, results.fast_iter()):
             for prop in ['name', 'status', 'cpf']:
                 self.assertEqual(getattr(obj, prop), getattr(tpl, prop))
+
+    def test_fast_iter_fetch_size(self):
+        results = self.store.find(Person).order_by(Person.te_id)
+        # Make sure there are more results than the fetch size
+        assert results.count() > 2
+        tpls = list(results.fast_iter(fetch_size=2))
+        self.assertEqual([tpl.id for tpl in tpls],
+                         [obj.id for obj in results])
+
+    def test_stream(self):
+        results = self.store.find(Person).order_by(Person.te_id)
+        assert results.count() > 2
+        self.assertEqual(list(results.stream(fetch_size=2)), list(results))
+
+    def test_stream_viewable(self):
+        results = self.store.find(ClientView).order_by(Client.te_id)
+        assert results.count() > 2
+        streamed = list(results.stream(fetch_size=2))
+        self.assertEqual(len(streamed), results.count())
+        for obj, viewable in zip(results, streamed):
+            self.assertTrue(isinstance(viewable, ClientView))
+            self.assertEqual(obj.id, viewable.id)
+            self.assertEqual(obj.name, viewable.name)
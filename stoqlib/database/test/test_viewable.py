@@ -34,7 +34,8 @@ from stoqlib.domain.commission import Commission
 from stoqlib.domain.payment.method import CheckData
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.views import OutPaymentView
-from stoqlib.domain.person import Person, Client, Individual, Supplier
+from stoqlib.domain.person import (Branch, Person, Client, Individual,
+                                   Supplier)
 from stoqlib.domain.sale import Sale
 from stoqlib.domain.sellable import Sellable
 from stoqlib.domain.test.domaintest import DomainTest
@@ -64,6 +65,30 @@ class ClientView(Viewable):
     group_by = [Person, Client, person_name, supplier_status]
 
 
+class SaleBranchView(Viewable):
+    branch = Branch
+
+    id = Sale.id
+    identifier = Sale.identifier
+
+    tables = [
+        Sale,
+        LeftJoin(Branch, Branch.id == Sale.branch_id),
+    ]
+
+
+class SaleBranchIdView(Viewable):
+    id = Sale.id
+    identifier = Sale.identifier
+    branch_id = Sale.branch_id
+
+    tables = [Sale]
+
+    @property
+    def branch(self):
+        return self.store.get(Branch, self.branch_id)
+
+
 class ViewableTest(DomainTest):
 
     def test_sync(self):
@@ -175,3 +200,37 @@ class ViewableTest(DomainTest):
 
         vf = Supplier.status.variable_factory
         self.assertFalse(vf.keywords['allow_none'])
+
+    def test_identifier_prefix(self):
+        sale = self.create_sale()
+        sale.branch.acronym = u'AB'
+
+        view = self.store.find(SaleBranchView, id=sale.id).one()
+        self.assertEqual(str(view.identifier),
+                         u'AB%05d' % (sale.identifier, ))
+
+        view = self.store.find(SaleBranchIdView, id=sale.id).one()
+        self.assertEqual(str(view.identifier),
+                         u'AB%05d' % (sale.identifier, ))
+
+        # The acronyms are cached, so the branch is not queried again
+        with self.count_tracer() as tracer:
+            list(self.store.find(SaleBranchIdView, id=sale.id))
+        self.assertEqual(tracer.count, 1)
+
+        # Changing the acronym invalidates the cache
+        sale.branch.acronym = u'CD'
+        view = self.store.find(SaleBranchIdView, id=sale.id).one()
+        self.assertEqual(str(view.identifier),
+                         u'CD%05d' % (sale.identifier, ))
+
+        # A branch created after the acronyms were cached is found too
+        other_sale = self.create_sale(branch=self.create_branch())
+        other_sale.branch.acronym = u'EF'
+        view = self.store.find(SaleBranchIdView, id=other_sale.id).one()
+        self.assertEqual(str(view.identifier),
+                         u'EF%05d' % (other_sale.identifier, ))
+
+        sale.branch.acronym = None
+        view = self.store.find(SaleBranchIdView, id=sale.id).one()
+        self.assertEqual(view.identifier.prefix, u'')
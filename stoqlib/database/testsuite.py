@@ -30,8 +30,11 @@
 from stoqlib.lib.kiwilibrary import library
 library  # pylint: disable=W0104
 
+import atexit
 import logging
 import os
+import shutil
+import tempfile
 
 from kiwi.component import provide_utility, utilities
 from storm.expr import And
@@ -45,6 +48,7 @@ from stoqlib.database.settings import db_settings
 from stoqlib.domain.person import Branch, LoginUser, Person, Company
 from stoqlib.domain.station import BranchStation
 from stoqlib.importers.stoqlibexamples import create
+from stoqlib.lib import ibpt, imageutils
 from stoqlib.lib.interfaces import IApplicationDescriptions, ISystemNotifier
 from stoqlib.lib.message import DefaultSystemNotifier
 from stoqlib.lib.osutils import get_username
@@ -162,6 +166,18 @@ def _provide_app_info():
 # Public API
 
 
+def _provide_cache_dir():
+    # Keep the caches created by the tests, like the thumbnails and the
+    # IBPT index, on a temporary directory, so they don't end up on the
+    # user's application directory
+    cache_dir = tempfile.mkdtemp(prefix='stoq-tests-')
+    atexit.register(shutil.rmtree, cache_dir, ignore_errors=True)
+    imageutils._thumbnail_cache_dir = os.path.join(cache_dir, 'thumbnails')
+    ibpt._index = ibpt.TaxesIndex(os.path.join(cache_dir,
+                                               'ibpt-taxes.sqlite'))
+    atexit.register(ibpt._index.close)
+
+
 def provide_database_settings(dbname=None, address=None, port=None, username=None,
                               password=None, createdb=True):
     """
@@ -274,6 +290,8 @@ def bootstrap_suite(address=None, dbname=None, port=5432, username=None,
     settings = get_settings()
     settings.reset()
 
+    _provide_cache_dir()
+
     if quick and not empty:
         provide_utilities(station_name)
         _enable_plugins(extra_plugins=extra_plugins)
@@ -126,6 +126,22 @@ from storm.expr import Expr, JoinExpr
 from storm.properties import PropertyColumn
 
 from stoqlib.database.orm import ORMObject
+from stoqlib.database.properties import IdentifierCol
+
+#: the name of the store cache with the acronyms of the branches used to
+#: prefix the identifiers, see
+#: :meth:`stoqlib.database.runtime.StoqlibStore.get_cache`
+BRANCH_ACRONYMS_CACHE = 'branch_acronyms'
+
+
+def _get_branch_acronym(store, branch_id):
+    acronyms = store.get_cache(BRANCH_ACRONYMS_CACHE)
+    if branch_id not in acronyms:
+        # There are only a few branches, so load all of them at once. Do
+        # it again when one is missing, since it might have been created
+        # after the others were loaded
+        acronyms.update(store.execute('SELECT id, acronym FROM branch'))
+    return acronyms.get(branch_id) or ''
 
 
 class Viewable(ClassInittableObject):
@@ -162,6 +178,11 @@ class Viewable(ClassInittableObject):
     #: still be possible to filter by.
     hidden_columns = []
 
+    #: The name of the attribute holding the id of the branch used to prefix
+    #: the identifiers, for viewables that do not select the branch itself.
+    #: Defaults to ``branch_id``
+    identifier_branch_id = 'branch_id'
+
     @property
     def store(self):
         return self._store
@@ -247,12 +268,75 @@ class Viewable(ClassInittableObject):
 
         cls.cls_spec = tuple(cls_spec)
         cls.cls_attributes = attributes
+        cls._load_row = cls._build_row_loader()
 
         # We store highjacked classes in this dict. Highjacked viewables
         # are the ones that we create programatically changing one or another
         # attribute (e.g. a join). See ProductFullStockView for more details
         cls.highjacked = {}
 
+    @classmethod
+    def _build_row_loader(cls):
+        # Everything that can be figured out from the class definition is
+        # done here, once, instead of for each row loaded from the database
+        attributes = tuple(cls.cls_attributes)
+        identifiers = tuple(
+            i for i, spec in enumerate(cls.cls_spec)
+            if isinstance(spec, PropertyColumn) and
+            spec.variable_factory.func is IdentifierCol.variable_class)
+
+        # Viewables have no __init__, so avoid the cost of calling it and
+        # set the whole __dict__ at once instead of one attribute at a time
+        new = object.__new__
+
+        def load_row(store, values):
+            instance = new(cls)
+            instance.__dict__ = dict(zip(attributes, values),
+                                     # This will be removed later
+                                     _store=store)
+            return instance
+
+        if not identifiers:
+            return load_row
+
+        if 'branch' in attributes:
+            # The branch is selected by the viewable itself, as a domain
+            # object, so its acronym is already loaded
+            branch_index = attributes.index('branch')
+
+            def get_acronym(store, instance, values):
+                branch = values[branch_index]
+                return branch and (branch.acronym or '')
+        elif (hasattr(cls, 'branch') and
+              cls.identifier_branch_id in attributes):
+            # The branch is a property, most likely fetching the object by
+            # the id. Avoid that by using the acronyms cached for the store
+            branch_id_index = attributes.index(cls.identifier_branch_id)
+
+            def get_acronym(store, instance, values):
+                branch_id = values[branch_id_index]
+                return branch_id and _get_branch_acronym(store, branch_id)
+        elif hasattr(cls, 'branch'):
+            def get_acronym(store, instance, values):
+                branch = instance.branch
+                return branch and (branch.acronym or '')
+        else:
+            return load_row
+
+        def load_row_with_identifiers(store, values):
+            instance = new(cls)
+            instance.__dict__ = dict(zip(attributes, values), _store=store)
+            acronym = get_acronym(store, instance, values)
+            # Rows without a branch keep the identifiers without a prefix
+            if acronym is not None:
+                for i in identifiers:
+                    identifier = values[i]
+                    if identifier is not None:
+                        identifier.prefix = acronym
+            return instance
+
+        return load_row_with_identifiers
+
     @classmethod
     def extend_viewable(cls, new_attrs, new_joins=None):
         """Creates a subclass of this extended with the given columns and joins
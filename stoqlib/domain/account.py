@@ -45,7 +45,7 @@ from storm.info import ClassAlias
 from storm.references import Reference
 from zope.interface import implementer
 
-from stoqlib.database.expr import TransactionTimestamp, Date
+from stoqlib.database.expr import TransactionTimestamp, between_dates
 from stoqlib.database.properties import (DateTimeCol, EnumCol, IdCol,
                                          IntCol, PriceCol, UnicodeCol)
 from stoqlib.database.viewable import Viewable
@@ -287,8 +287,7 @@ class Account(Domain):
             raise TypeError("end must be a datetime.datetime, not %s" % (
                 type(end), ))
 
-        query = And(Date(AccountTransaction.date) >= start,
-                    Date(AccountTransaction.date) <= end,
+        query = And(between_dates(AccountTransaction.date, start, end),
                     AccountTransaction.source_account_id != AccountTransaction.account_id)
 
         transactions = self.store.find(AccountTransaction, query)
@@ -29,7 +29,7 @@ Allows other tables to have any kinds of attachments."""
 
 from zope.interface import implementer
 
-from stoqlib.database.properties import BLOBCol, UnicodeCol
+from stoqlib.database.properties import DeferredBLOBCol, UnicodeCol
 from stoqlib.domain.base import Domain
 from stoqlib.domain.interfaces import IDescribable
 from stoqlib.lib.translation import stoqlib_gettext
@@ -47,8 +47,9 @@ class Attachment(Domain):
     #: MIME for the filetype attached
     mimetype = UnicodeCol(default=u'')
 
-    #: blob that contains the file
-    blob = BLOBCol(default=None)
+    #: blob that contains the file. It is only fetched from the
+    #: database when accessed
+    blob = DeferredBLOBCol(default=None)
 
     #
     #  IDescribable implementation
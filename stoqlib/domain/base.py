@@ -27,11 +27,13 @@ The base :class:`Domain` class for Stoq.
 """
 
 import collections
+import hashlib
 import logging
+import re
 import warnings
 
 from storm.exceptions import NotOneError, ClosedError, LostObjectError
-from storm.expr import And, Alias, Like, Max, Select, Update, Undef
+from storm.expr import And, Alias, In, Like, Max, Select, Update, Undef
 from storm.info import get_cls_info, get_obj_info
 from storm.properties import Property
 from storm.references import Reference
@@ -39,7 +41,8 @@ from storm.store import AutoReload, PENDING_ADD, PENDING_REMOVE
 
 from stoqlib.database.expr import CharLength, Field, LPad, UnionAll
 from stoqlib.database.orm import ORMObject
-from stoqlib.database.properties import IntCol, IdCol, UnicodeCol, Identifier
+from stoqlib.database.properties import (IntCol, IdCol, UnicodeCol, Identifier,
+                                         get_deferred_changes)
 from stoqlib.domain.events import DomainMergeEvent
 from stoqlib.domain.system import TransactionEntry
 
@@ -128,8 +131,9 @@ class Domain(ORMObject):
         else:
             # This is storm's approach to check if the obj has pending changes,
             # but only makes sense if the obj is not being created/deleted.
-            if (store._get_changes_map(obj_info, True) and
-                    stoq_pending not in [_OBJ_CREATED, _OBJ_DELETED]):
+            changed = (store._get_changes_map(obj_info, True) or
+                       get_deferred_changes(obj_info))
+            if changed and stoq_pending not in [_OBJ_CREATED, _OBJ_DELETED]:
                 obj_info['stoq-status'] = _OBJ_UPDATED
 
     #
@@ -481,6 +485,57 @@ class Domain(ORMObject):
         # if there's no batch registered on the database
         return max_batch or u''
 
+    @classmethod
+    def allocate_values(cls, store, attr, count=1, scope=None, seed=None,
+                        template=u'%s'):
+        """Allocate new numeric values for a given attr
+
+        Unlike :meth:`.get_max_value`, this doesn't scan the table. The
+        values come from a database sequence for the attr, so two stations
+        will never get the same value. As with any sequence, the values
+        are not given back if the transaction is rolled back.
+
+        The sequence is created the first time it is used, starting after
+        the numeric part of the value returned by *seed*, or of the max
+        value for the attr if not given. Values already used by other
+        objects are skipped.
+
+        :param store: a store
+        :param attr: the attribute to allocate values for
+        :param count: how many values to allocate
+        :param scope: if not ``None``, a string identifying a separate
+          sequence for the attr, like the acronym of a |branch|
+        :param seed: a callable returning the value the sequence should
+          start after, called only if it needs to be created
+        :param template: a format string used to build the values from
+          the allocated numbers
+        :returns: a list with *count* unicode values
+        """
+        cls.validate_attr(attr, expected_type=UnicodeCol)
+        name = u'code_%s_%s' % (cls.__storm_table__, attr.name)
+        if scope:
+            name += u'_' + scope
+        if len(name) > 63:
+            # Postgres would truncate the sequence name
+            name = name[:50] + u'_' + hashlib.md5(
+                name.encode()).hexdigest()[:12]
+
+        values = []
+        while len(values) < count:
+            result = [template % v for v, in store.execute(
+                "SELECT allocate_codes(?, ?)", (name, count - len(values)))]
+            if not result:
+                max_value = (seed or (lambda: cls.get_max_value(store, attr)))()
+                start = re.search(u'([0-9]*)$', max_value).group(1)
+                store.execute("SELECT create_code_sequence(?, ?)",
+                              (name, int(start or 0)))
+                continue
+
+            # Values could have been set by hand after the sequence
+            used = set(store.find(cls, In(attr, result)).values(attr))
+            values.extend(v for v in result if v not in used)
+        return values
+
     @classmethod
     def get_or_create(cls, store, **kwargs):
         """Get the object from the database that matches the given criteria, and if
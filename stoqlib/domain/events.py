@@ -98,6 +98,20 @@ class ProductStockUpdateEvent(Event):
     :param branch: the |branch| on which the stock was modified
     :param old_quantity: the old product stock quantity
     :param new_quantity: the new product stock quantity
+
+    Stock modified by :meth:`Storable.apply_stock_movements
+    <stoqlib.domain.product.Storable.apply_stock_movements>` will also emit
+    :class:`ProductStockBatchUpdateEvent` after this one.
+    """
+
+
+class ProductStockBatchUpdateEvent(Event):
+    """
+    This event is emitted when the stock of a group of products is
+    in/decreased at once.
+
+    :param updates: a list of (product, branch, old_quantity, new_quantity)
+      tuples, one for each stock item that was modified
     """
 
 
@@ -233,6 +247,20 @@ class SaleIsExternalEvent(Event):
     """
 
 
+class SaleIsExternalQueryEvent(Event):
+    """Emitted to get a query matching the external |sales|.
+
+    This is the counterpart of :class:`SaleIsExternalEvent` used when
+    checking lots of sales at once on the database, like when looking
+    for late payments. Plugins handling that event should handle this
+    one too.
+
+    The expected return value should be a storm expression that is
+    ``True`` for the external sales or ``None`` if there's no
+    external sale.
+    """
+
+
 class SaleConfirmedRemoteEvent(Event):
     """Emitted after a remote |sale| was confirmed.
 
@@ -30,8 +30,9 @@ Note that this whole module is Brazil-specific.
 # pylint: enable=E1101
 
 import collections
+import uuid
 
-from storm.expr import LeftJoin, Join, Or
+from storm.expr import Insert, LeftJoin, Join, Or
 from storm.references import Reference
 from zope.interface import implementer
 
@@ -181,6 +182,31 @@ class FiscalBookEntry(Domain):
         return cls._create_fiscal_entry(store, branch, user, FiscalBookEntry.TYPE_SERVICE, group,
                                         cfop, invoice_number, iss_value=value,)
 
+    @classmethod
+    def create_inventory_entries(cls, store, branch: Branch, invoice_number,
+                                 cfop_ids):
+        """Creates the inventory adjustment entries in the fiscal book
+
+        One entry is created for each cfop, all of them in a single
+        statement.
+
+        :param store: a store
+        :param branch: the |branch| where the |inventory| was done
+        :param invoice_number: the invoice number of the adjustment
+        :param cfop_ids: the ids of the :class:`CfopData` of the
+          adjusted |inventoryitems|
+        """
+        date = localnow()
+        rows = [(str(uuid.uuid1()), cls.TYPE_INVENTORY, invoice_number,
+                 branch.id, cfop_id, date, False)
+                for cfop_id in cfop_ids]
+        if not rows:
+            return
+
+        columns = [cls.id, cls.entry_type, cls.invoice_number, cls.branch_id,
+                   cls.cfop_id, cls.date, cls.is_reversal]
+        store.execute(Insert(dict.fromkeys(columns), values=rows, table=cls))
+
     def reverse_entry(self, invoice_number,
                       iss_value=None, icms_value=None, ipi_value=None):
         store = self.store
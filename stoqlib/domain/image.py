@@ -28,12 +28,13 @@
 
 import base64
 
+from storm.expr import And, Eq, In, Ne
 from storm.references import Reference
 from zope.interface import implementer
 
 from stoqlib.database.expr import StatementTimestamp
-from stoqlib.database.properties import (IdCol, BLOBCol, UnicodeCol, BoolCol,
-                                         DateTimeCol)
+from stoqlib.database.properties import (IdCol, DeferredBLOBCol, UnicodeCol,
+                                         BoolCol, DateTimeCol)
 from stoqlib.domain.base import Domain
 from stoqlib.domain.events import (ImageCreateEvent, ImageEditEvent,
                                    ImageRemoveEvent)
@@ -57,11 +58,13 @@ class Image(Domain):
     (THUMBNAIL_SIZE_HEIGHT,
      THUMBNAIL_SIZE_WIDTH) = (128, 128)
 
-    #: the image itself in a bin format
-    image = BLOBCol(default=None)
+    #: the image itself in a bin format. It is only fetched from the
+    #: database when accessed
+    image = DeferredBLOBCol(default=None)
 
-    #: the image thumbnail in a bin format
-    thumbnail = BLOBCol(default=None)
+    #: the image thumbnail in a bin format. It is only fetched from the
+    #: database when accessed
+    thumbnail = DeferredBLOBCol(default=None)
 
     #: the image description
     description = UnicodeCol(default=u'')
@@ -105,6 +108,35 @@ class Image(Domain):
     def get_base64_encoded(self):
         return base64.b64encode(self.image).decode()
 
+    @classmethod
+    def regenerate_thumbnails(cls, store, regenerate_all=False,
+                              batch_size=100):
+        """Regenerates the thumbnails of the images
+
+        The images are fetched in batches, so only *batch_size* of them
+        are kept in memory at once.
+
+        :param store: a store
+        :param regenerate_all: if ``True``, all the thumbnails will be
+          regenerated, not only the missing ones
+        :param batch_size: the number of images of each batch
+        :returns: a generator yielding ``(done, total)`` after each batch,
+          which is a good moment to commit the store
+        """
+        # Avoid importing the gtk stuff unless we really need it
+        from stoqlib.lib.imageutils import get_thumbnail
+
+        query = Ne(cls.image, None)
+        if not regenerate_all:
+            query = And(query, Eq(cls.thumbnail, None))
+        ids = list(store.find(cls.id, query).order_by(cls.id))
+        size = (cls.THUMBNAIL_SIZE_WIDTH, cls.THUMBNAIL_SIZE_HEIGHT)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            for image in store.find(cls, In(cls.id, batch)):
+                image.thumbnail = get_thumbnail(image.image, size)
+            yield start + len(batch), len(ids)
+
     #
     #  IDescribable implementation
     #
@@ -28,19 +28,20 @@
 import collections
 from decimal import Decimal
 
-from storm.expr import And, Eq, Cast, Join, LeftJoin, Or, Coalesce
+from storm.expr import (And, Eq, Cast, In, Insert, Join, LeftJoin, Ne,
+                        Or, Coalesce, Select)
 from storm.references import Reference, ReferenceSet
 
 from stoqlib.database.properties import (QuantityCol, PriceCol, DateTimeCol,
                                          IntCol, UnicodeCol, IdentifierCol,
                                          IdCol, BoolCol, EnumCol)
-from stoqlib.database.expr import StatementTimestamp
+from stoqlib.database.expr import Case, StatementTimestamp
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.base import Domain, IdentifiableDomain
 from stoqlib.domain.fiscal import FiscalBookEntry
 from stoqlib.domain.person import LoginUser, Person, Branch
 from stoqlib.domain.product import (StockTransactionHistory, StorableBatch, Product,
-                                    Storable, ProductStockItem)
+                                    Storable, ProductStockItem, StockMovement)
 from stoqlib.domain.sellable import Sellable
 from stoqlib.domain.station import BranchStation
 from stoqlib.lib.dateutils import localnow
@@ -48,6 +49,10 @@ from stoqlib.lib.translation import stoqlib_gettext
 
 _ = stoqlib_gettext
 
+#: How many |inventoryitems| are adjusted at once by
+#: :meth:`Inventory.iter_adjust_items`
+ADJUST_BATCH_SIZE = 500
+
 
 class InventoryItem(Domain):
     """An |inventory| item
@@ -151,12 +156,19 @@ class InventoryItem(Domain):
     #  Public API
     #
 
-    def adjust(self, user: LoginUser, invoice_number):
+    def adjust(self, user: LoginUser, invoice_number, movements=None,
+               fiscal_items=None):
         """Create an entry in fiscal book registering the adjustment
         with the related cfop data and change the product quantity
         available in stock.
 
         :param invoice_number: invoice number to register
+        :param movements: if not ``None``, the stock adjustment will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being applied
+        :param fiscal_items: if not ``None``, this item will be appended to
+          this list instead of creating its fiscal book entry, so the entries
+          can be created at once with
+          :meth:`FiscalBookEntry.create_inventory_entries <stoqlib.domain.fiscal.FiscalBookEntry.create_inventory_entries>`
         """
         assert self.inventory.is_open()
         assert not self.is_adjusted
@@ -171,6 +183,11 @@ class InventoryItem(Domain):
         adjustment_qty = self.actual_quantity - self.recorded_quantity
         if not adjustment_qty:
             return
+        elif movements is not None:
+            movements.append(StockMovement(
+                storable, self.inventory.branch, adjustment_qty,
+                StockTransactionHistory.TYPE_INVENTORY_ADJUST, self.id,
+                batch=self.batch))
         elif adjustment_qty > 0:
             storable.increase_stock(adjustment_qty,
                                     self.inventory.branch,
@@ -182,7 +199,10 @@ class InventoryItem(Domain):
                                     StockTransactionHistory.TYPE_INVENTORY_ADJUST,
                                     self.id, user, batch=self.batch)
 
-        self._add_inventory_fiscal_entry(invoice_number)
+        if fiscal_items is not None:
+            fiscal_items.append(self)
+        else:
+            self._add_inventory_fiscal_entry(invoice_number)
         self.is_adjusted = True
 
     def get_code(self):
@@ -398,6 +418,56 @@ class Inventory(IdentifiableDomain):
 
         return self.inventory_items.find(counted_quantity=None).is_empty()
 
+    def adjust_items(self, items, user: LoginUser, invoice_number):
+        """Adjust a group of items at once
+
+        This is the same as calling :meth:`InventoryItem.adjust` for each
+        one of the items, but they are adjusted in batches. See
+        :meth:`.iter_adjust_items`
+
+        :param items: a sequence of |inventoryitem| to adjust
+        :param invoice_number: invoice number to register
+        """
+        for adjusted, total in self.iter_adjust_items(items, user,
+                                                      invoice_number):
+            pass
+
+    def iter_adjust_items(self, items, user: LoginUser, invoice_number,
+                          batch_size=ADJUST_BATCH_SIZE):
+        """Adjust a group of items in batches, reporting the progress
+
+        The data of the items in each batch is loaded in a single query,
+        their stock is adjusted with a single
+        :meth:`Storable.apply_stock_movements <stoqlib.domain.product.Storable.apply_stock_movements>`
+        and their fiscal book entries are created in a single statement.
+
+        :param items: a sequence of |inventoryitem| to adjust
+        :param invoice_number: invoice number to register
+        :param batch_size: how many items should be adjusted at once
+        :returns: a generator that adjusts a batch of items each time it is
+          iterated and yields how many items were adjusted so far and the
+          total number of items
+        """
+        items = list(items)
+        total = len(items)
+        for start in range(0, total, batch_size):
+            batch = items[start:start + batch_size]
+            # Load the products, storables and batches of the items in the
+            # store cache, so adjusting them doesn't query them one by one
+            list(self._get_items_data(In(InventoryItem.id,
+                                         [item.id for item in batch])))
+
+            movements = []
+            fiscal_items = []
+            for item in batch:
+                item.adjust(user, invoice_number, movements=movements,
+                            fiscal_items=fiscal_items)
+            Storable.apply_stock_movements(self.store, movements, user)
+            FiscalBookEntry.create_inventory_entries(
+                self.store, self.branch, self.invoice_number,
+                [item.cfop_data_id for item in fiscal_items])
+            yield start + len(batch), total
+
     def get_items(self):
         """Returns all the inventory items related to this inventory
 
@@ -468,15 +538,16 @@ class Inventory(IdentifiableDomain):
         - the |sellable|
         - the |storablebatch|
         """
-        store = self.store
+        return self._get_items_data(InventoryItem.inventory_id == self.id)
+
+    def _get_items_data(self, query):
         tables = [InventoryItem,
                   Join(Product, Product.id == InventoryItem.product_id),
                   Join(Sellable, Sellable.id == Product.id),
                   LeftJoin(Storable, Storable.id == Product.id),
                   LeftJoin(StorableBatch, StorableBatch.id == InventoryItem.batch_id)]
-        return store.using(*tables).find(
-            (InventoryItem, Storable, Product, Sellable, StorableBatch),
-            InventoryItem.inventory_id == self.id)
+        return self.store.using(*tables).find(
+            (InventoryItem, Storable, Product, Sellable, StorableBatch), query)
 
     @classmethod
     def get_sellables_for_inventory(cls, store, branch, extra_query=None):
@@ -491,6 +562,13 @@ class Inventory(IdentifiableDomain):
         :returns: a generator of the following objects:
             (Sellable, Product, Storable, StorableBatch, ProductStockItem)
         """
+        tables, query = cls._get_sellables_query(branch, extra_query)
+        return store.using(*tables).find(
+            (Sellable, Product, Storable, StorableBatch, ProductStockItem),
+            query)
+
+    @classmethod
+    def _get_sellables_query(cls, branch, extra_query):
         # XXX: If we should want all storables to be inclued in the inventory, even if if
         #      never had a ProductStockItem before, than we should inclue this query in the
         #      LeftJoin with ProductStockItem below
@@ -507,9 +585,7 @@ class Inventory(IdentifiableDomain):
                                Or(ProductStockItem.batch_id == StorableBatch.id,
                                   Eq(ProductStockItem.batch_id, None)))),
                   ]
-        return store.using(*tables).find(
-            (Sellable, Product, Storable, StorableBatch, ProductStockItem),
-            query)
+        return tables, query
 
     @classmethod
     def create_inventory(cls, store, branch: Branch, station: BranchStation, responsible,
@@ -525,21 +601,34 @@ class Inventory(IdentifiableDomain):
                         open_date=localnow(),
                         responsible_id=responsible.id)
 
-        for data in cls.get_sellables_for_inventory(store, branch, query):
-            sellable, product, storable, batch, stock_item = data
-            quantity = stock_item and stock_item.quantity or 0
-            if storable.is_batch:
-                # This used to test 'stock_item.quantity > 0' too to avoid
-                # creating inventory items for old batches not used anymore.
-                # We can't do that since that would make it impossible to
-                # adjust a batch that was wrongly set to 0. We need to find a
-                # way to mark the batches as "not used anymore" because they
-                # tend to grow to very large proportions and we are duplicating
-                # everyone here
-                if batch and stock_item:
-                    inventory.add_product(product, quantity, batch=batch)
-            else:
-                inventory.add_product(product, quantity)
+        # The items are created with a single INSERT ... SELECT using the same
+        # query as get_sellables_for_inventory. Storables controlled by batch
+        # have an item for each one of their batches with a stock item.
+        # This used to test 'stock_item.quantity > 0' too to avoid creating
+        # inventory items for old batches not used anymore. We can't do that
+        # since that would make it impossible to adjust a batch that was
+        # wrongly set to 0. We need to find a way to mark the batches as
+        # "not used anymore" because they tend to grow to very large
+        # proportions and we are duplicating everyone here
+        tables, where = cls._get_sellables_query(branch, query)
+        where = And(where, Or(Eq(Storable.is_batch, False),
+                              Ne(StorableBatch.id, None)))
+        columns = [InventoryItem.inventory_id,
+                   InventoryItem.product_id,
+                   InventoryItem.batch_id,
+                   InventoryItem.product_cost,
+                   InventoryItem.recorded_quantity,
+                   InventoryItem.reason]
+        values = Select(
+            [Cast(inventory.id, 'uuid'),
+             Product.id,
+             Case(Storable.is_batch, StorableBatch.id),
+             Sellable.cost,
+             Coalesce(ProductStockItem.quantity, 0),
+             Cast(u'', 'text')],
+            where=where, tables=tables)
+        store.execute(Insert(dict.fromkeys(columns), values=values,
+                             table=InventoryItem))
         return inventory
 
 
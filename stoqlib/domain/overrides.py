@@ -22,7 +22,12 @@
 # Author(s): Stoq Team <stoq-devel@async.com.br>
 #
 
+import time
+
+from storm.expr import And, In
+from storm.info import get_obj_info
 from storm.references import Reference
+from storm.store import PENDING_REMOVE, Store
 
 from stoqlib.database.properties import (BoolCol, DateTimeCol, EnumCol,
                                          IdCol, PercentCol, QuantityCol,
@@ -31,7 +36,102 @@ from stoqlib.domain.base import Domain
 from stoqlib.domain.person import Branch
 
 
-class SellableBranchOverride(Domain):
+class _BranchOverride(object):
+    """Finds the overrides of a branch without querying them over and over
+
+    The overrides are fetched for the objects being resolved, either one
+    at a time by :meth:`.find_by_owner` or all at once by
+    :meth:`.prefetch`, and kept in a cache bound to the store, see
+    :meth:`stoqlib.database.runtime.StoqlibStore.get_cache`. That cache is
+    invalidated when an override gets created, removed or moved to
+    another branch or object, and its entries expire after
+    :attr:`.cache_timeout` seconds so the overrides changed by other
+    stations are seen by long lived stores.
+    """
+
+    #: the name of the column referencing the overridden object
+    owner_column = None
+
+    #: the number of seconds an override is kept in the cache
+    cache_timeout = 30
+
+    @classmethod
+    def prefetch(cls, store, branch, owner_ids):
+        """Fetches the overrides of many objects for a branch at once
+
+        Use this before calling :meth:`.find_by_owner` for a list of
+        objects, to avoid a query per object.
+
+        :param store: a store
+        :param branch: the |branch|
+        :param owner_ids: the ids of the overridden objects
+        """
+        if branch is None:
+            return
+
+        cache = store.get_cache(cls.__storm_table__)
+        now = time.monotonic()
+        owner_ids = set(
+            owner_id for owner_id in owner_ids
+            if not cls._is_cached(cache, branch.id, owner_id, now))
+        if not owner_ids:
+            return
+
+        owner_column = getattr(cls, cls.owner_column)
+        for owner_id in owner_ids:
+            cache[branch.id, owner_id] = (None, now)
+        for override in store.find(cls, And(cls.branch_id == branch.id,
+                                            In(owner_column, owner_ids))):
+            owner_id = getattr(override, cls.owner_column)
+            cache[branch.id, owner_id] = (override, now)
+
+    @classmethod
+    def find_by_owner(cls, store, branch, owner_id):
+        """Finds the override of an object for a branch
+
+        :param store: a store
+        :param branch: the |branch|
+        :param owner_id: the id of the overridden object
+        :returns: the override or ``None`` if there is none
+        """
+        if branch is None:
+            return None
+
+        cls.prefetch(store, branch, [owner_id])
+        cache = store.get_cache(cls.__storm_table__)
+        override = cache[branch.id, owner_id][0]
+        # on_delete is not called for the overrides created in this
+        # transaction, so check if it was removed after being cached
+        if override is not None and (
+                Store.of(override) is not store or
+                get_obj_info(override).get('pending') is PENDING_REMOVE):
+            del cache[branch.id, owner_id]
+            return None
+        return override
+
+    @classmethod
+    def _is_cached(cls, cache, branch_id, owner_id, now):
+        entry = cache.get((branch_id, owner_id))
+        return entry is not None and now - entry[1] < cls.cache_timeout
+
+    def _invalidate_cache(self):
+        store = self.store
+        if store is not None:
+            store.invalidate_cache(self.__storm_table__)
+
+    #
+    #  Domain hooks
+    #
+
+    def on_object_changed(self, attr, old_value, value):
+        if attr in ['branch_id', self.owner_column]:
+            self._invalidate_cache()
+
+    def on_delete(self):
+        self._invalidate_cache()
+
+
+class SellableBranchOverride(_BranchOverride, Domain):
     __storm_table__ = 'sellable_branch_override'
 
     status = EnumCol()
@@ -61,12 +161,14 @@ class SellableBranchOverride(Domain):
     #: specifies whether the product requires kitchen production
     requires_kitchen_production = BoolCol()
 
+    owner_column = 'sellable_id'
+
     @classmethod
     def find_by_sellable(cls, sellable, branch):
-        return sellable.store.find(cls, sellable=sellable, branch=branch).one()
+        return cls.find_by_owner(sellable.store, branch, sellable.id)
 
 
-class ProductBranchOverride(Domain):
+class ProductBranchOverride(_BranchOverride, Domain):
     __storm_table__ = 'product_branch_override'
 
     location = UnicodeCol()
@@ -92,12 +194,14 @@ class ProductBranchOverride(Domain):
     #: Brazil specific. NFE. Código Benefício Fiscal
     c_benef = UnicodeCol(default=None)
 
+    owner_column = 'product_id'
+
     @classmethod
     def find_product(cls, branch: Branch, product):
-        return product.store.find(cls, product=product, branch=branch).one()
+        return cls.find_by_owner(product.store, branch, product.id)
 
 
-class StorableBranchOverride(Domain):
+class StorableBranchOverride(_BranchOverride, Domain):
     __storm_table__ = 'storable_branch_override'
 
     minimum_quantity = QuantityCol()
@@ -109,8 +213,14 @@ class StorableBranchOverride(Domain):
     storable_id = IdCol()
     storable = Reference(storable_id, 'Storable.id')
 
+    owner_column = 'storable_id'
 
-class ServiceBranchOverride(Domain):
+    @classmethod
+    def find_by_storable(cls, storable, branch):
+        return cls.find_by_owner(storable.store, branch, storable.id)
+
+
+class ServiceBranchOverride(_BranchOverride, Domain):
     __storm_table__ = 'service_branch_override'
 
     city_taxation_code = UnicodeCol()
@@ -122,3 +232,9 @@ class ServiceBranchOverride(Domain):
 
     service_id = IdCol()
     service = Reference(service_id, 'Service.id')
+
+    owner_column = 'service_id'
+
+    @classmethod
+    def find_by_service(cls, service, branch):
+        return cls.find_by_owner(service.store, branch, service.id)
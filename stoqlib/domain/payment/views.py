@@ -25,16 +25,19 @@
 # pylint: enable=E1101
 
 import datetime
+import logging
 
 from dateutil.relativedelta import relativedelta
 from kiwi.datatypes import converter
 from storm.expr import (And, Count, Join, LeftJoin, Or, Sum, Alias,
-                        Select, Cast)
+                        Select, Cast, Coalesce, Eq, Exists, In, Not)
 from storm.info import ClassAlias
 
-from stoqlib.database.expr import Date, Field, ArrayAgg, ArrayToString
+from stoqlib.database.expr import (Field, ArrayAgg, ArrayToString,
+                                   between_dates)
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.account import BankAccount
+from stoqlib.domain.events import SaleIsExternalEvent
 from stoqlib.domain.payment.card import (CreditProvider,
                                          CreditCardData, CardPaymentDevice)
 from stoqlib.domain.payment.category import PaymentCategory
@@ -54,6 +57,7 @@ from stoqlib.lib.translation import stoqlib_gettext
 
 
 _ = stoqlib_gettext
+log = logging.getLogger(__name__)
 
 
 _CommentsSummary = Select(columns=[PaymentComment.payment_id,
@@ -195,10 +199,10 @@ class BasePaymentView(Viewable):
 
         if due_date:
             if isinstance(due_date, tuple):
-                date_query = And(Date(cls.due_date) >= due_date[0],
-                                 Date(cls.due_date) <= due_date[1])
+                date_query = between_dates(cls.due_date,
+                                           due_date[0], due_date[1])
             else:
-                date_query = Date(cls.due_date) == due_date
+                date_query = between_dates(cls.due_date, due_date, due_date)
 
             query = And(query, date_query)
 
@@ -242,6 +246,41 @@ class InPaymentView(BasePaymentView):
     def get_parent(self):
         return self.sale or self.renegotiation
 
+    @classmethod
+    def get_late_payments_query(cls, person_id):
+        """Get a query checking if a person has overdue unpaid payments
+
+        Payments of external sales are not considered (see
+        :meth:`stoqlib.domain.sale.Sale.get_external_query`), as they are
+        handled by an external entity (e.g. a payment gateway) meaning that
+        they may be out of sync with the Stoq database.
+
+        :param person_id: the id of the person or a column with it,
+          like ``Person.id``, to check many persons on the same query
+        :returns: an ``EXISTS`` query
+        """
+        tolerance = sysparam.get_int('TOLERANCE_FOR_LATE_PAYMENTS')
+        tables = [Payment,
+                  Join(PaymentGroup, PaymentGroup.id == Payment.group_id)]
+        # The status and type are the ones of payment_pending_in_due_date_idx
+        query = And(PaymentGroup.payer_id == person_id,
+                    Payment.status == Payment.STATUS_PENDING,
+                    Payment.payment_type == Payment.TYPE_IN,
+                    Payment.due_date < localtoday() - relativedelta(
+                        days=tolerance))
+
+        external_query = Sale.get_external_query()
+        if external_query is not None:
+            tables.append(LeftJoin(Sale, Sale.group_id == PaymentGroup.id))
+            query = And(query, Or(Eq(Sale.id, None),
+                                  Not(Coalesce(external_query, False))))
+        elif SaleIsExternalEvent.has_callbacks():
+            log.warning("SaleIsExternalEvent is handled but "
+                        "SaleIsExternalQueryEvent is not, the payments of "
+                        "external sales will be considered late")
+
+        return Exists(Select(1, where=query, tables=tables))
+
     @classmethod
     def has_late_payments(cls, store, person):
         """Checks if the provided person has unpaid payments that are overdue
@@ -250,22 +289,64 @@ class InPaymentView(BasePaymentView):
           check if has late payments
         :returns: True if the person has overdue payments. False otherwise
         """
-        tolerance = sysparam.get_int('TOLERANCE_FOR_LATE_PAYMENTS')
+        if cls._needs_external_sales_check():
+            return bool(cls._find_late_payers_by_sale(store, [person.id]))
+
+        query = cls.get_late_payments_query(person.id)
+        return store.execute(Select(query)).get_one()[0]
+
+    @classmethod
+    def find_late_payers(cls, store, persons):
+        """Find which of the persons have unpaid payments that are overdue
+
+        This does the same as :meth:`.has_late_payments` for lots of
+        persons at once, like the ones of a search.
 
+        :param persons: a sequence of
+          :class:`persons <stoqlib.domain.person.Person>` or of their ids
+        :returns: a set with the ids of the persons with overdue payments
+        """
+        person_ids = [getattr(person, 'id', person) for person in persons]
+        if not person_ids:
+            return set()
+
+        if cls._needs_external_sales_check():
+            return cls._find_late_payers_by_sale(store, person_ids)
+
+        return set(store.find(Person.id, In(Person.id, person_ids),
+                              cls.get_late_payments_query(Person.id)))
+
+    #
+    #  Private
+    #
+
+    @classmethod
+    def _needs_external_sales_check(cls):
+        # The plugins handling SaleIsExternalEvent may not handle
+        # SaleIsExternalQueryEvent, and then the external sales can only
+        # be checked one by one
+        return (SaleIsExternalEvent.has_callbacks() and
+                Sale.get_external_query() is None)
+
+    @classmethod
+    def _find_late_payers_by_sale(cls, store, person_ids):
+        tolerance = sysparam.get_int('TOLERANCE_FOR_LATE_PAYMENTS')
         query = And(
-            cls.person_id == person.id,
+            In(cls.person_id, person_ids),
             cls.status == Payment.STATUS_PENDING,
             cls.due_date < localtoday() - relativedelta(days=tolerance))
 
-        for late_payments in store.find(cls, query):
-            sale = late_payments.sale
+        late_payers = set()
+        for late_payment in store.find(cls, query):
+            if late_payment.person_id in late_payers:
+                continue
+            sale = late_payment.sale
             # Exclude payments for external sales as they are handled by an
             # external entity (e.g. a payment gateway) meaning that they be
             # out of sync with the Stoq database.
             if not sale or not sale.is_external():
-                return True
-
-        return False
+                late_payers.add(late_payment.person_id)
+        return late_payers
 
 
 _InvoiceNumberSummary = Alias(Select(
@@ -67,12 +67,13 @@ from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
 from stoqlib.database.expr import (Age, Case, Concat, Date, DateTrunc, Interval,
-                                   Field, NotIn, StoqNormalizeString)
+                                   Field, NotIn, StoqNormalizeString,
+                                   between_dates)
 from stoqlib.database.properties import (BoolCol, DateTimeCol,
                                          IntCol, PercentCol,
                                          PriceCol, EnumCol,
                                          UnicodeCol, IdCol)
-from stoqlib.database.viewable import Viewable
+from stoqlib.database.viewable import BRANCH_ACRONYMS_CACHE, Viewable
 from stoqlib.domain.address import Address, CityLocation
 from stoqlib.domain.certificate import Certificate
 from stoqlib.domain.base import Domain
@@ -1119,14 +1120,12 @@ class Client(Domain):
 
     @property
     def remaining_store_credit(self):
-        from stoqlib.domain.payment.views import InPaymentView
-        status_query = Or(InPaymentView.status == Payment.STATUS_PENDING,
-                          InPaymentView.status == Payment.STATUS_CONFIRMED)
-        query = And(InPaymentView.person_id == self.person.id,
-                    status_query,
-                    InPaymentView.method_name == u'store_credit')
+        """How much is left of the :obj:`.credit_limit` of this client
 
-        debit = self.store.find(InPaymentView, query).sum(InPaymentView.value) or currency('0.0')
+        That is the credit limit minus the value of the pending and
+        confirmed store credit |payments| of the client.
+        """
+        debit = self._get_credit_balance()[1]
         return currency(self.credit_limit - debit)
 
     def get_credit_transactions(self):
@@ -1159,17 +1158,21 @@ class Client(Domain):
     def credit_account_balance(self):
         """Returns a client's credit balance.
 
-        :returns: The client's credit balance."""
-        transactions = self.get_credit_transactions()
-
-        balance = 0
-        for payment in transactions:
-            if payment.payment_type == payment.TYPE_OUT:
-                balance += payment.paid_value
-            else:
-                balance -= payment.paid_value
+        That is the sum of the paid credit payments given to the client
+        minus the ones used by the client, see :meth:`.get_credit_transactions`
 
-        return currency(balance)
+        :returns: The client's credit balance."""
+        return currency(self._get_credit_balance()[0])
+
+    def _get_credit_balance(self):
+        # Query the values instead of the ClientCreditBalance object, since
+        # they are updated by the database and the object could be cached.
+        # Querying will also flush any pending payment changes.
+        balance = self.store.find(
+            (ClientCreditBalance.credit_balance,
+             ClientCreditBalance.store_credit_debit),
+            ClientCreditBalance.client_id == self.id).one()
+        return balance or (0, 0)
 
     @property
     def salary(self):
@@ -1233,6 +1236,77 @@ class Client(Domain):
         return True
 
 
+class ClientCreditBalance(Domain):
+    """The credit balances of a |client|
+
+    This is maintained by the database as the |payments| paid by the
+    client change, so the balances can be checked without going through
+    all of them. Use :obj:`Client.credit_account_balance` and
+    :obj:`Client.remaining_store_credit` to get the balances.
+    """
+
+    __storm_table__ = 'client_credit_balance'
+
+    #: the rows are created by the database together with the |client|,
+    #: so they should never be created directly
+    created_by_database = True
+
+    client_id = IdCol()
+
+    #: the |client|
+    client = Reference(client_id, 'Client.id')
+
+    #: the balance of the paid credit |payments| of the client
+    credit_balance = PriceCol(default=0)
+
+    #: the value of the pending and confirmed store credit |payments|
+    #: of the client
+    store_credit_debit = PriceCol(default=0)
+
+    @classmethod
+    def find_inconsistent(cls, store):
+        """Find the balances which do not match the payments of the client
+
+        That should only happen if the balance table was changed directly.
+
+        :param store: a store
+        :returns: a list of tuples with the |client|, the current
+          :obj:`.credit_balance` and :obj:`.store_credit_debit` and the
+          ones they should have
+        """
+        results = store.execute("""
+            SELECT client_credit_balance.client_id,
+                   client_credit_balance.credit_balance,
+                   client_credit_balance.store_credit_debit,
+                   totals.credit_balance, totals.store_credit_debit
+            FROM client_credit_balance,
+                 get_client_credit_totals(client_credit_balance.client_id)
+                     AS totals
+            WHERE client_credit_balance.credit_balance != totals.credit_balance OR
+                  client_credit_balance.store_credit_debit !=
+                      totals.store_credit_debit""")
+        return [(store.get(Client, client_id), credit, debit,
+                 expected_credit, expected_debit)
+                for (client_id, credit, debit,
+                     expected_credit, expected_debit) in results]
+
+    @classmethod
+    def rebuild(cls, store):
+        """Recalculate the balances of all the clients from their payments
+
+        :param store: a store
+        """
+        # Clients created before the balances were maintained
+        store.execute("""
+            INSERT INTO client_credit_balance (client_id)
+            SELECT id FROM client WHERE NOT EXISTS (
+                SELECT 1 FROM client_credit_balance
+                WHERE client_credit_balance.client_id = client.id)""")
+        store.execute("""
+            SELECT rebuild_client_credit_balance(id) FROM client""")
+        store.invalidate()
+
+
 @implementer(IActive)
 @implementer(IDescribable)
 class Supplier(Domain):
@@ -1813,6 +1887,10 @@ class Branch(Domain):
         Event.log(self.store, Event.TYPE_SYSTEM,
                   _(u"Created branch '%s'") % (self.get_description(), ))
 
+    def on_object_changed(self, attr, old_value, value):
+        if attr == 'acronym' and self.store is not None:
+            self.store.invalidate_cache(BRANCH_ACRONYMS_CACHE)
+
     # Classmethods
 
     @classmethod
@@ -2155,6 +2233,10 @@ class ClientView(Viewable):
     district = Address.district
     complement = Address.complement
 
+    #: if the client has overdue payments, filled by the client search, see
+    #: :meth:`stoqlib.domain.payment.views.InPaymentView.find_late_payers`
+    has_late_payments = False
+
     tables = [
         Client,
         Join(Person,
@@ -2531,10 +2613,9 @@ class CallsView(Viewable):
 
         if date:
             if isinstance(date, tuple):
-                date_query = And(Date(Calls.date) >= date[0],
-                                 Date(Calls.date) <= date[1])
+                date_query = between_dates(Calls.date, date[0], date[1])
             else:
-                date_query = Date(Calls.date) == date
+                date_query = between_dates(Calls.date, date, date)
 
             queries.append(date_query)
 
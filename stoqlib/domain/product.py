@@ -85,12 +85,13 @@ stock_items are unique:
 
 import collections
 from decimal import Decimal
+import uuid
 
 from kiwi.currency import currency
 from storm.references import Reference, ReferenceSet
 from storm.exceptions import NotOneError
 from storm.expr import (And, Eq, LeftJoin, Alias, Sum, Coalesce, Select, Join,
-                        Cast, Or, In)
+                        Cast, Or, In, Insert, Undef)
 from zope.interface import implementer
 
 from stoqlib.api import api
@@ -104,7 +105,8 @@ from stoqlib.database.runtime import autoreload_object
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.base import Domain
 from stoqlib.domain.events import (ProductCreateEvent, ProductEditEvent,
-                                   ProductRemoveEvent, ProductStockUpdateEvent)
+                                   ProductRemoveEvent, ProductStockUpdateEvent,
+                                   ProductStockBatchUpdateEvent)
 from stoqlib.domain.interfaces import IDescribable
 from stoqlib.domain.overrides import ProductBranchOverride
 from stoqlib.domain.person import Person, Branch, LoginUser
@@ -113,7 +115,6 @@ from stoqlib.exceptions import StockError
 from stoqlib.lib.dateutils import localnow, localtoday
 from stoqlib.lib.defaults import quantize
 from stoqlib.lib.parameters import sysparam
-from stoqlib.lib.stringutils import next_value_for
 from stoqlib.lib.translation import stoqlib_gettext, stoqlib_ngettext
 
 _ = stoqlib_gettext
@@ -837,11 +838,10 @@ class Product(Domain):
         """
         assert not self.child_exists(options)
 
-        new_code = Sellable.get_max_value(self.store, Sellable.code)
-
         child = self.copy_product()
         child.parent = self
-        child.sellable.code = next_value_for(new_code)
+        child.sellable.code = Sellable.allocate_values(self.store,
+                                                       Sellable.code)[0]
         Storable(store=self.store, product=child)
 
         desc_parts = [self.description]
@@ -1148,6 +1148,28 @@ class ProductHistory(Domain):
             sold_date=TransactionTimestamp(),
             store=store)
 
+    @classmethod
+    def add_sold_items(cls, store, branch, sale_items):
+        """Adds a group of |saleitems| to the history at once
+
+        This is the same as calling :meth:`.add_sold_item` for each one of
+        the items, but all the history entries are inserted in a single
+        statement.
+
+        :param store: a store
+        :param branch: the |branch|
+        :param sale_items: the |saleitems| for the sold products
+        """
+        rows = [(str(uuid.uuid1()), branch.id, item.sellable_id,
+                 item.quantity, TransactionTimestamp())
+                for item in sale_items]
+        if not rows:
+            return
+
+        columns = [cls.id, cls.branch_id, cls.sellable_id,
+                   cls.quantity_sold, cls.sold_date]
+        store.execute(Insert(dict.fromkeys(columns), values=rows, table=cls))
+
     @classmethod
     def add_received_item(cls, store, branch, receiving_order_item):
         """
@@ -1280,6 +1302,15 @@ class ProductStockItem(Domain):
                                batch=self.batch)
 
 
+#: A stock movement to be applied by :meth:`Storable.apply_stock_movements`.
+#: The quantity is positive when increasing the stock and negative when
+#: decreasing it, just like :attr:`StockTransactionHistory.quantity`
+StockMovement = collections.namedtuple(
+    'StockMovement', ['storable', 'branch', 'quantity', 'type', 'object_id',
+                      'unit_cost', 'batch', 'cost_center'])
+StockMovement.__new__.__defaults__ = (None, None, None)
+
+
 class Storable(Domain):
     '''Storable represents the stock of a |product|.
 
@@ -1339,6 +1370,145 @@ class Storable(Domain):
 
         return store.using(*tables).find((Sellable, Product, Storable), query)
 
+    @classmethod
+    def apply_stock_movements(cls, store, movements, user: LoginUser):
+        """Apply a group of stock movements at once
+
+        This is equivalent to calling :meth:`.increase_stock` and
+        :meth:`.decrease_stock` for each movement, but the stock items are
+        fetched in a single query, the negative stock rules are validated
+        for all movements before anything is written and the
+        :class:`StockTransactionHistory` rows are inserted in a single statement
+        (the database trigger takes care of updating the stock items).
+
+        A :class:`ProductStockUpdateEvent` is emitted for each movement, just
+        like those methods do, and then a single
+        :class:`ProductStockBatchUpdateEvent` for all of them.
+
+        :param store: a store
+        :param movements: a sequence of :class:`StockMovement`
+        :param user: the |loginuser| responsible for the movements
+        :returns: a list with the |productstockitem| of each movement, in
+            the same order of the movements
+        :raises: :exc:`StockError` if a decrease would make the stock
+            negative and ``ALLOW_NEGATIVE_STOCK`` is not set
+        """
+        movements = list(movements)
+        if not movements:
+            return []
+
+        # Load the products and sellables of the storables in a single query
+        # instead of letting validate_batch fetch them one by one
+        storable_ids = list(set(m.storable.id for m in movements))
+        tables = [Product, Join(Sellable, Sellable.id == Product.id)]
+        list(store.using(*tables).find((Product, Sellable),
+                                       In(Product.id, storable_ids)))
+
+        for movement in movements:
+            if not movement.quantity:
+                raise ValueError(_(u"quantity must be a positive number"))
+            if movement.branch is None:
+                raise ValueError(u"branch cannot be None")
+            storable = movement.storable
+            cls.validate_batch(movement.batch, storable.product.sellable,
+                               storable=storable)
+
+        stock_items = cls._get_stock_items_for_movements(store, movements)
+        old_quantities = dict((key, item.quantity)
+                              for key, item in stock_items.items())
+
+        # Validate the movements in the same order they would be applied
+        allow_negative = sysparam.get_bool('ALLOW_NEGATIVE_STOCK')
+        quantities = old_quantities.copy()
+        for movement in movements:
+            key = cls._get_movement_key(movement)
+            if (movement.quantity < 0 and not allow_negative and
+                    (key not in quantities or
+                     -movement.quantity > quantities[key])):
+                raise StockError(
+                    _('Quantity to decrease is greater than the available stock.'))
+            quantities[key] = quantities.get(key, 0) + movement.quantity
+
+        date = localnow()
+        rows = []
+        cost_center_entries = []
+        for movement in movements:
+            unit_cost = movement.unit_cost
+            stock_item = stock_items.get(cls._get_movement_key(movement))
+            if movement.quantity < 0 and stock_item is not None:
+                # Removing an item from stock does not change the stock cost
+                unit_cost = stock_item.stock_cost
+            transaction_id = str(uuid.uuid1())
+            rows.append((transaction_id, date,
+                         movement.storable.id, movement.branch.id,
+                         movement.batch and movement.batch.id,
+                         movement.quantity, unit_cost, user and user.id,
+                         movement.type, movement.object_id))
+            if movement.cost_center is not None:
+                cost_center_entries.append((movement.cost_center,
+                                            transaction_id))
+
+        columns = [StockTransactionHistory.id,
+                   StockTransactionHistory.date,
+                   StockTransactionHistory.storable_id,
+                   StockTransactionHistory.branch_id,
+                   StockTransactionHistory.batch_id,
+                   StockTransactionHistory.quantity,
+                   StockTransactionHistory.unit_cost,
+                   StockTransactionHistory.responsible_id,
+                   StockTransactionHistory.type,
+                   StockTransactionHistory.object_id]
+        store.execute(Insert(dict.fromkeys(columns), values=rows,
+                             table=StockTransactionHistory))
+
+        for cost_center, transaction_id in cost_center_entries:
+            cost_center.add_stock_transaction(
+                store.get(StockTransactionHistory, transaction_id))
+
+        # The trigger changed the stock items behind storm's back. Invalidate
+        # them so the query below refreshes them with the new values
+        for stock_item in stock_items.values():
+            store.invalidate(stock_item)
+            autoreload_object(stock_item)
+        stock_items = cls._get_stock_items_for_movements(store, movements)
+
+        # The movements were applied in order, so each one changed the
+        # quantity left by the previous one of the same stock item
+        quantities = old_quantities.copy()
+        for movement in movements:
+            key = cls._get_movement_key(movement)
+            old_quantity = quantities.get(key, 0)
+            quantities[key] = old_quantity + movement.quantity
+            ProductStockUpdateEvent.emit(movement.storable.product,
+                                         movement.branch, old_quantity,
+                                         quantities[key])
+
+        updates = []
+        for key in collections.OrderedDict.fromkeys(
+                cls._get_movement_key(m) for m in movements):
+            stock_item = stock_items[key]
+            updates.append((stock_item.storable.product, stock_item.branch,
+                            old_quantities.get(key, 0), stock_item.quantity))
+        ProductStockBatchUpdateEvent.emit(updates)
+
+        return [stock_items[cls._get_movement_key(m)] for m in movements]
+
+    @classmethod
+    def _get_movement_key(cls, movement):
+        return (movement.storable.id, movement.branch.id,
+                movement.batch and movement.batch.id)
+
+    @classmethod
+    def _get_stock_items_for_movements(cls, store, movements):
+        storable_ids = set(m.storable.id for m in movements)
+        branch_ids = set(m.branch.id for m in movements)
+        stock_items = store.find(
+            ProductStockItem,
+            And(In(ProductStockItem.storable_id, list(storable_ids)),
+                In(ProductStockItem.branch_id, list(branch_ids))))
+        return dict(((i.storable_id, i.branch_id, i.batch_id), i)
+                    for i in stock_items)
+
     #
     #  Public API
     #
@@ -1609,9 +1779,41 @@ class StorableBatch(Domain):
         return store.find(cls, query).is_empty()
 
     @classmethod
-    def get_max_batch_number(cls, store):
+    def get_max_batch_number(cls, store, query=Undef):
         attr = SplitPart(cls.batch_number, u'-', 1)
-        return StorableBatch.get_max_value(store, attr, validate_attr=False)
+        return StorableBatch.get_max_value(store, attr, validate_attr=False,
+                                           query=query)
+
+    @classmethod
+    def allocate_batch_numbers(cls, store, count=1, branch=None):
+        """Allocate new batch numbers
+
+        This doesn't scan the batches like :meth:`.get_max_batch_number`
+        and is safe to be used by more than one station at the same time.
+        See :meth:`Domain.allocate_values <stoqlib.domain.base.Domain.allocate_values>`
+
+        :param store: a store
+        :param count: how many batch numbers to allocate
+        :param branch: the |branch| the batches are being created at. On
+          synchronized mode, its acronym is appended to the batch numbers
+          and each branch has its own sequence of numbers
+        :returns: a list with *count* batch numbers
+        """
+        if not sysparam.get_bool('SYNCHRONIZED_MODE'):
+            return cls.allocate_values(
+                store, cls.batch_number, count,
+                seed=lambda: cls.get_max_batch_number(store))
+
+        if branch is None or not branch.acronym:
+            raise ValueError("branch '%s' needs an acronym since we are on "
+                             "synchronized mode" % (
+                                 branch and branch.get_description(), ))
+        suffix = u'-' + branch.acronym
+        query = cls.batch_number.like(u'%' + suffix)
+        return cls.allocate_values(
+            store, cls.batch_number, count, scope=branch.acronym,
+            seed=lambda: cls.get_max_batch_number(store, query=query),
+            template=u'%s' + suffix)
 
     #
     #  Public API
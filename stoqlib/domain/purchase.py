@@ -36,8 +36,8 @@ from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
-from stoqlib.database.expr import (Date, Field, NullIf, TransactionTimestamp,
-                                   ArrayAgg, ArrayToString)
+from stoqlib.database.expr import (Field, NullIf, TransactionTimestamp,
+                                   ArrayAgg, ArrayToString, between_dates)
 from stoqlib.database.properties import (DateTimeCol, UnicodeCol,
                                          PriceCol, BoolCol, QuantityCol,
                                          IdentifierCol, IdCol, EnumCol)
@@ -1006,10 +1006,11 @@ class PurchaseOrderView(Viewable):
 
         if due_date:
             if isinstance(due_date, tuple):
-                date_query = And(Date(cls.expected_receival_date) >= due_date[0],
-                                 Date(cls.expected_receival_date) <= due_date[1])
+                date_query = between_dates(cls.expected_receival_date,
+                                           due_date[0], due_date[1])
             else:
-                date_query = Date(cls.expected_receival_date) == due_date
+                date_query = between_dates(cls.expected_receival_date,
+                                           due_date, due_date)
 
             query = And(query, date_query)
 
@@ -42,7 +42,7 @@ from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.person import LoginUser
 from stoqlib.domain.product import (ProductHistory, StockTransactionHistory,
-                                    StorableBatch)
+                                    StorableBatch, Storable, StockMovement)
 from stoqlib.domain.purchase import PurchaseOrder
 from stoqlib.domain.stockdecrease import StockDecreaseItem
 from stoqlib.lib.dateutils import localnow
@@ -163,9 +163,13 @@ class ReceivingOrderItem(Domain):
         # The unit may be empty
         return data.strip()
 
-    def add_stock_items(self, user: LoginUser):
+    def add_stock_items(self, user: LoginUser, movements=None):
         """This is normally called from ReceivingOrder when
         a the receving order is confirmed.
+
+        :param movements: if not ``None``, the stock increase will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being
+          applied, so it can be applied together with other items'
         """
         store = self.store
         if not self.sellable.product.manage_stock:
@@ -182,9 +186,15 @@ class ReceivingOrderItem(Domain):
         purchase = self.purchase_item.order
         if storable is not None:
             cost = self.cost + (self.ipi_value / self.quantity)
-            storable.increase_stock(self.quantity, branch,
-                                    StockTransactionHistory.TYPE_RECEIVED_PURCHASE,
-                                    self.id, user, cost, batch=self.batch)
+            if movements is None:
+                storable.increase_stock(self.quantity, branch,
+                                        StockTransactionHistory.TYPE_RECEIVED_PURCHASE,
+                                        self.id, user, cost, batch=self.batch)
+            else:
+                movements.append(StockMovement(
+                    storable, branch, self.quantity,
+                    StockTransactionHistory.TYPE_RECEIVED_PURCHASE, self.id,
+                    unit_cost=cost, batch=self.batch))
         purchase.increase_quantity_received(self.purchase_item, self.quantity)
         ProductHistory.add_received_item(store, branch, self)
 
@@ -272,8 +282,10 @@ class ReceivingOrder(IdentifiableDomain):
         if self.receiving_invoice:
             self.receiving_invoice.confirm(user)
 
+        movements = []
         for item in self.get_items():
-            item.add_stock_items(user)
+            item.add_stock_items(user, movements=movements)
+        Storable.apply_stock_movements(self.store, movements, user)
 
         purchases = list(self.purchase_orders)
         for purchase in purchases:
@@ -30,6 +30,7 @@ Sale object and related objects implementation """
 
 import collections
 from decimal import Decimal
+import logging
 
 from kiwi.currency import currency
 from kiwi.python import Settable
@@ -40,8 +41,8 @@ from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
-from stoqlib.database.expr import (Concat, Date, Distinct, Field, NullIf,
-                                   Round, TransactionTimestamp)
+from stoqlib.database.expr import (Concat, Distinct, Field, NullIf,
+                                   Round, TransactionTimestamp, between_dates)
 from stoqlib.database.properties import (UnicodeCol, DateTimeCol, IntCol,
                                          PriceCol, QuantityCol, IdentifierCol,
                                          IdCol, BoolCol, EnumCol, TimeCol)
@@ -53,6 +54,7 @@ from stoqlib.domain.event import Event
 from stoqlib.domain.events import (SaleStatusChangedEvent,
                                    SaleCanCancelEvent,
                                    SaleIsExternalEvent,
+                                   SaleIsExternalQueryEvent,
                                    SaleItemBeforeDecreaseStockEvent,
                                    SaleItemBeforeIncreaseStockEvent,
                                    SaleItemAfterSetBatchesEvent,
@@ -61,13 +63,15 @@ from stoqlib.domain.events import (SaleStatusChangedEvent,
                                    ECFGetPrinterUserNumberEvent)
 from stoqlib.domain.fiscal import FiscalBookEntry, Invoice
 from stoqlib.domain.interfaces import IContainer, IInvoice, IInvoiceItem
+from stoqlib.domain.overrides import SellableBranchOverride
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.person import (Person, Client, Branch, LoginUser,
                                    SalesPerson, Company, Individual,
                                    ClientCategory)
 from stoqlib.domain.product import (Product, ProductHistory, Storable,
-                                    StockTransactionHistory, StorableBatch)
+                                    StockTransactionHistory, StorableBatch,
+                                    StockMovement)
 from stoqlib.domain.returnedsale import ReturnedSale, ReturnedSaleItem
 from stoqlib.domain.sellable import Sellable, SellableCategory
 from stoqlib.domain.service import Service
@@ -78,10 +82,12 @@ from stoqlib.lib.dateutils import localnow
 from stoqlib.lib.defaults import quantize, DECIMAL_PRECISION
 from stoqlib.lib.formatters import format_quantity
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.timing import PhaseTimer
 from stoqlib.lib.translation import stoqlib_gettext
 
 
 _ = stoqlib_gettext
+log = logging.getLogger(__name__)
 
 # pyflakes: Reference requires that CostCenter is imported at least once
 CostCenter  # pylint: disable=W0104
@@ -314,7 +320,16 @@ class SaleItem(Domain):
     #  Public API
     #
 
-    def sell(self, user: LoginUser):
+    def sell(self, user: LoginUser, movements=None):
+        """Sell this item, decreasing its quantity from the stock
+
+        :param movements: if not ``None``, the stock decrease will be
+          appended to this list as a
+          :class:`StockMovement <stoqlib.domain.product.StockMovement>`
+          instead of being applied. The caller is responsible for applying
+          it and calling :meth:`.update_average_cost` after that
+        :returns: ``True`` if a stock decrease was appended to *movements*
+        """
         if not self.sellable.is_available(branch=self.sale.branch):
             raise SellError(_(u"%s is not available for sale. Try making it "
                               u"available first and then try again.") % (
@@ -327,7 +342,16 @@ class SaleItem(Domain):
 
         quantity_to_decrease = self.quantity - self.quantity_decreased
         storable = self.sellable.product_storable
-        if storable and quantity_to_decrease:
+        if storable and quantity_to_decrease and movements is not None:
+            movements.append(StockMovement(
+                storable, self.sale.branch, -quantity_to_decrease,
+                StockTransactionHistory.TYPE_SELL, self.id,
+                batch=self.batch, cost_center=self.sale.cost_center))
+            self.quantity_decreased += quantity_to_decrease
+            # The tax values depend on the average cost, which will only
+            # be known after the movement is applied
+            return True
+        elif storable and quantity_to_decrease:
             try:
                 item = storable.decrease_stock(
                     quantity_to_decrease, self.sale.branch,
@@ -339,6 +363,15 @@ class SaleItem(Domain):
             self.average_cost = item.stock_cost
         self.quantity_decreased += quantity_to_decrease
         self.update_tax_values()
+        return False
+
+    def update_average_cost(self, stock_item):
+        """Update the average cost of this item after it was sold
+
+        :param stock_item: the |productstockitem| this item was sold from
+        """
+        self.average_cost = stock_item.stock_cost
+        self.update_tax_values()
 
     def cancel(self, user: LoginUser):
         # This is emitted here instead of inside the if bellow because one can
@@ -1248,6 +1281,17 @@ class Sale(IdentifiableDomain):
         """
         return bool(SaleIsExternalEvent.emit(self))
 
+    @classmethod
+    def get_external_query(cls):
+        """Get a query matching the external sales
+
+        This is the equivalent of :meth:`.is_external` that can be used
+        on the database.
+
+        :returns: a query or ``None`` if there are no external sales
+        """
+        return SaleIsExternalQueryEvent.emit()
+
     def is_returned(self):
         return self.status == Sale.STATUS_RETURNED
 
@@ -1268,7 +1312,7 @@ class Sale(IdentifiableDomain):
 
         self._set_sale_status(Sale.STATUS_ORDERED, user)
 
-    def confirm(self, user: LoginUser, till=None):
+    def confirm(self, user: LoginUser, till=None, timer=None):
         """Confirms the sale
 
         Confirming a sale means that the customer has confirmed the sale.
@@ -1279,28 +1323,58 @@ class Sale(IdentifiableDomain):
 
         :param till: the |till| where this sale was confirmed. Can
             be `None` in case the process was automated (e.g. a virtual store)
+        :param timer: a :class:`stoqlib.lib.timing.PhaseTimer` that will
+            receive the time spent on each phase of the confirmation. If
+            ``None``, the phases will only be logged
         """
         assert self.can_confirm()
         assert self.branch
 
-        for item in self.get_items():
-            self.validate_batch(item.batch, sellable=item.sellable)
-            if item.sellable.product:
-                ProductHistory.add_sold_item(self.store, self.branch, item)
-            item.sell(user)
+        if timer is None:
+            timer = PhaseTimer('Sale.confirm')
+
+        with timer.phase('load items'):
+            items = self._get_items_for_confirm()
+
+        with timer.phase('items'):
+            movements = []
+            sold_items = []
+            for item, storable in items:
+                self.validate_batch(item.batch, sellable=item.sellable,
+                                    storable=storable)
+                if item.sell(user, movements=movements):
+                    sold_items.append(item)
+            ProductHistory.add_sold_items(
+                self.store, self.branch,
+                [item for item, storable in items if item.sellable.product])
+
+        with timer.phase('stock'):
+            try:
+                stock_items = Storable.apply_stock_movements(
+                    self.store, movements, user)
+            except StockError as err:
+                raise SellError(str(err))
+            for item, stock_item in zip(sold_items, stock_items):
+                item.update_average_cost(stock_item)
+
+        with timer.phase('totals'):
+            subtotal = currency(sum(item.get_total() for item, storable in items))
+            self.total_amount = self.get_total_sale_amount(subtotal=subtotal)
 
-        self.total_amount = self.get_total_sale_amount()
+        with timer.phase('payments'):
+            self.group.confirm()
+            self._add_inpayments(till=till)
 
-        self.group.confirm()
-        self._add_inpayments(till=till)
-        self._create_fiscal_entries(user)
+        with timer.phase('fiscal entries'):
+            self._create_fiscal_entries(user)
 
-        # Save operation_nature and branch in Invoice table.
-        self.invoice.branch = self.branch
+            # Save operation_nature and branch in Invoice table.
+            self.invoice.branch = self.branch
 
-        if self._create_commission_at_confirm():
-            for payment in self.payments:
-                self.create_commission(payment)
+        with timer.phase('commissions'):
+            if self._create_commission_at_confirm():
+                for payment in self.payments:
+                    self.create_commission(payment)
 
         if self.client:
             self.group.payer = self.client.person
@@ -1311,36 +1385,43 @@ class Sale(IdentifiableDomain):
         # automatically paid.
         # Since some plugins may listen to the sale status change event, we should
         # set payments as paid before the status change.
-        source_account = sysparam.get_object(self.store, 'SALES_ACCOUNT')
-        destination_account = sysparam.get_object(self.store, 'TILLS_ACCOUNT')
-        for method in self.store.find(PaymentMethod):
-            if method.operation.pay_on_sale_confirm():
-                self.group.pay_method_payments(method.method_name,
-                                               source_account=source_account,
-                                               destination_account=destination_account)
-
-        old_status = self.status
-        self._set_sale_status(Sale.STATUS_CONFIRMED, user)
-
-        if self.current_sale_token:
-            self.current_sale_token.close_token()
-
-        # do not log money payments twice
-        if not self.only_paid_with_money():
-            if self.client:
-                msg = _(u"Sale {sale_number} to client {client_name} was "
-                        u"confirmed with value {total_value:.2f}.").format(
-                    sale_number=self.identifier,
-                    client_name=self.client.person.name,
-                    total_value=self.get_total_sale_amount())
-            else:
-                msg = _(u"Sale {sale_number} without a client was "
-                        u"confirmed with value {total_value:.2f}.").format(
-                    sale_number=self.identifier,
-                    total_value=self.get_total_sale_amount())
-            Event.log(self.store, Event.TYPE_SALE, msg)
-
-        StockOperationConfirmedEvent.emit(self, old_status)
+        with timer.phase('pay on confirm'):
+            source_account = sysparam.get_object(self.store, 'SALES_ACCOUNT')
+            destination_account = sysparam.get_object(self.store, 'TILLS_ACCOUNT')
+            # Only the methods used by this sale's payments can have
+            # something to be paid
+            methods = set(payment.method for payment in self.payments)
+            for method in methods:
+                if method.operation.pay_on_sale_confirm():
+                    self.group.pay_method_payments(method.method_name,
+                                                   source_account=source_account,
+                                                   destination_account=destination_account)
+
+        with timer.phase('status'):
+            old_status = self.status
+            self._set_sale_status(Sale.STATUS_CONFIRMED, user)
+
+            if self.current_sale_token:
+                self.current_sale_token.close_token()
+
+            # do not log money payments twice
+            if not self.only_paid_with_money():
+                if self.client:
+                    msg = _(u"Sale {sale_number} to client {client_name} was "
+                            u"confirmed with value {total_value:.2f}.").format(
+                        sale_number=self.identifier,
+                        client_name=self.client.person.name,
+                        total_value=self.total_amount)
+                else:
+                    msg = _(u"Sale {sale_number} without a client was "
+                            u"confirmed with value {total_value:.2f}.").format(
+                        sale_number=self.identifier,
+                        total_value=self.total_amount)
+                Event.log(self.store, Event.TYPE_SALE, msg)
+
+            StockOperationConfirmedEvent.emit(self, old_status)
+
+        timer.log(log)
 
     def set_paid(self):
         """Mark the sale as paid
@@ -1672,7 +1753,10 @@ class Sale(IdentifiableDomain):
 
         :returns: list of sale items that need kitchen production
         """
-        return [item for item in self.get_items()
+        items = list(self.get_items())
+        SellableBranchOverride.prefetch(
+            self.store, self.branch, [item.sellable_id for item in items])
+        return [item for item in items
                 if item.sellable.get_requires_kitchen_production(self.branch)]
 
     def get_details_str(self):
@@ -2041,6 +2125,20 @@ class Sale(IdentifiableDomain):
         # discount/surchage cannot have more than 2 decimal points
         return quantize(currency(perc_value))
 
+    def _get_items_for_confirm(self):
+        # Load the items together with their sellables, products and
+        # storables in a single query. The references will be resolved
+        # from the store's cache after that
+        tables = [SaleItem,
+                  Join(Sellable, Sellable.id == SaleItem.sellable_id),
+                  LeftJoin(Product, Product.id == Sellable.id),
+                  LeftJoin(Storable, Storable.id == Product.id)]
+        result = self.store.using(*tables).find(
+            (SaleItem, Sellable, Product, Storable),
+            SaleItem.sale_id == self.id).order_by(SaleItem.te_id)
+        return [(item, storable)
+                for item, sellable, product, storable in result]
+
     def _add_inpayments(self, till=None):
         payments = self.payments
         if not payments.count():
@@ -2861,10 +2959,9 @@ class SalesPersonSalesView(Viewable):
     def find_by_date(cls, store, date):
         if date:
             if isinstance(date, tuple):
-                date_query = And(Date(Sale.confirm_date) >= date[0],
-                                 Date(Sale.confirm_date) <= date[1])
+                date_query = between_dates(Sale.confirm_date, date[0], date[1])
             else:
-                date_query = Date(Sale.confirm_date) == date
+                date_query = between_dates(Sale.confirm_date, date, date)
 
             results = store.find(cls, date_query)
         else:
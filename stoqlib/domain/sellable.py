@@ -40,10 +40,11 @@ from decimal import Decimal
 
 from kiwi.currency import currency
 from stoqdrivers.enum import TaxType, UnitType
-from storm.expr import And, Or, In, Eq
+from storm.expr import And, Coalesce, Or, In, Eq, Ne, Select
 from storm.references import Reference, ReferenceSet
 from zope.interface import implementer
 
+from stoqlib.database.expr import Case, Date, StatementTimestamp
 from stoqlib.database.properties import (BoolCol, DateTimeCol, EnumCol,
                                          IdCol, IntCol, PercentCol,
                                          PriceCol, UnicodeCol)
@@ -615,17 +616,81 @@ class Sellable(Domain):
     #  Accessors
     #
 
-    def _get_table_price(self, branch):
-        table_price = sysparam.get_object(self.store, 'DEFAULT_TABLE_PRICE')
+    @classmethod
+    def get_table_price(cls, store, branch=None):
+        """Gets the |clientcategory| used as the table price
+
+        :param store: a store
+        :param branch: if not ``None``, its default |clientcategory| is
+          used instead of the one defined by the system parameters
+        :returns: a |clientcategory| or ``None``
+        """
+        table_price = sysparam.get_object(store, 'DEFAULT_TABLE_PRICE')
         if branch and branch.default_client_category:
             table_price = branch.default_client_category
         return table_price
 
+    @classmethod
+    def get_price_column(cls, category=None):
+        """Gets an expression calculating the price of the sellables
+
+        The price is calculated the same way :meth:`.get_price` does: the
+        on sale price when the sellable is on sale, the price for
+        *category* when there is one or the base price otherwise.
+
+        :param category: a |clientcategory| or ``None`` to ignore the
+          category prices
+        :returns: an expression that can be used as a column
+        """
+        today = Date(StatementTimestamp())
+        start_date = cls.on_sale_start_date
+        end_date = cls.on_sale_end_date
+        on_sale = And(Ne(cls.on_sale_price, 0),
+                      Or(Ne(start_date, None), Ne(end_date, None)),
+                      Or(Eq(start_date, None), today >= Date(start_date)),
+                      Or(Eq(end_date, None), today <= Date(end_date)))
+
+        price = cls.base_price
+        if category is not None:
+            category_price = Select(
+                ClientCategoryPrice.price,
+                tables=[ClientCategoryPrice],
+                where=And(ClientCategoryPrice.sellable_id == cls.id,
+                          ClientCategoryPrice.category_id == category.id))
+            price = Coalesce(category_price, price)
+        return Case(condition=on_sale, result=cls.on_sale_price, else_=price)
+
+    @classmethod
+    def get_prices(cls, store, sellables, branch=None, category=None):
+        """Gets the prices of many sellables at once
+
+        This is the same as calling :meth:`.get_price` for each one of
+        *sellables*, but all the prices are fetched in a single query.
+
+        :param store: a store
+        :param sellables: a sequence of |sellables|
+        :param branch: the |branch| whose default |clientcategory| is used
+          when *category* is not given
+        :param category: the |clientcategory| whose prices should be used
+          instead of the ones of the table price
+        :returns: a dict mapping the ids of the sellables to their prices
+        """
+        ids = [sellable.id for sellable in sellables]
+        if not ids:
+            return {}
+
+        if category is None:
+            category = cls.get_table_price(store, branch)
+        results = store.find((cls.id, cls.get_price_column(category)),
+                             In(cls.id, ids))
+        return dict((sellable_id, currency(price))
+                    for sellable_id, price in results)
+
     def get_price(self, branch=None):
         if self.is_on_sale():
             return self.on_sale_price
 
-        category = self._get_table_price(branch)
+        category = self.get_table_price(self.store, branch)
         if category:
             info = self.get_category_price_info(category)
             if info:
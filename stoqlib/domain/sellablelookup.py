@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""
+Finds a |sellable| given a text scanned or typed by the user.
+
+The text is matched, ignoring the case, against the barcode and the code
+of the sellables and against the batch number of the |batches|, in this
+order. All of that is done in a single query which uses the functional
+indexes created on those lowered columns.
+"""
+
+import collections
+
+from storm.expr import And, Eq, In, LeftJoin, Lower, Or, Select
+
+from stoqlib.database.expr import Case, UnionAll
+from stoqlib.domain.events import ProductEditEvent, ServiceEditEvent
+from stoqlib.domain.product import Product, StorableBatch
+from stoqlib.domain.sellable import Sellable
+
+
+class SellableLookup(object):
+    """Finds |sellables| by their barcode, code or batch number
+
+    When *cache_size* is given, the ids of the last found sellables are
+    kept in a LRU cache keyed by the searched text. The cached entries are
+    validated against the objects before being used and the ones referring
+    to a |product| or a |service| are dropped when it gets edited.
+
+    :param cache_size: the number of entries to keep in the cache
+      or ``0`` to disable it
+    """
+
+    def __init__(self, cache_size=0):
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        if cache_size:
+            # Events keep weak references to the callbacks, so there is
+            # no need to disconnect them when the lookup is destroyed
+            ProductEditEvent.connect(self._on_sellable_edited)
+            ServiceEditEvent.connect(self._on_sellable_edited)
+
+    #
+    #  Public API
+    #
+
+    def find(self, store, text, available_only=True, exclude_grid=True):
+        """Finds a sellable by its barcode, code or batch number
+
+        :param store: a store
+        :param text: the barcode, code or batch number
+        :param available_only: if only available sellables should be found
+        :param exclude_grid: if the parent |product| of a grid should be
+          ignored, since it cannot be added directly to a sale
+        :returns: a tuple with the |sellable| and the |batch| or
+          ``(None, None)`` if nothing was found. The batch is only returned
+          when it was the batch number that matched the text
+        """
+        text = text.lower()
+        key = (text, exclude_grid)
+        result = self._get_cached(store, key, available_only)
+        if result is None:
+            result = self._find(store, text, available_only, exclude_grid)
+            if result[0] is not None and self._cache_size:
+                self._cache_result(key, result)
+        return result
+
+    def find_all(self, store, text, available_only=True, exclude_grid=True):
+        """Finds all the sellables matching a barcode, code or batch number
+
+        This is useful when the sellables are going to be filtered further,
+        since the one :meth:`.find` would return might not be acceptable
+        while another one matching the text is. The cache is not used here.
+
+        :param store: a store
+        :param text: the barcode, code or batch number
+        :param available_only: if only available sellables should be found
+        :param exclude_grid: if the parent |product| of a grid should be
+          ignored, since it cannot be added directly to a sale
+        :returns: a list of tuples with the |sellable| and the |batch|,
+          the ones matching the barcode first, then the code and then the
+          batch number. The batch is only set when it was the batch number
+          that matched the text
+        """
+        return self._find_all(store, text.lower(), available_only,
+                              exclude_grid)
+
+    def clear_cache(self):
+        """Removes all the entries from the cache"""
+        self._cache.clear()
+
+    #
+    #  Private
+    #
+
+    def _find(self, store, text, available_only, exclude_grid):
+        results = self._find_all(store, text, available_only, exclude_grid,
+                                 limit=1)
+        if not results:
+            return None, None
+        return results[0]
+
+    def _find_all(self, store, text, available_only, exclude_grid,
+                  limit=None):
+        barcode_match = Lower(Sellable.barcode) == text
+        code_match = Lower(Sellable.code) == text
+        batch_match = Lower(StorableBatch.batch_number) == text
+
+        # Each one of those selects uses its own index, which would not be
+        # the case if they were Or'ed together in a single where clause
+        candidates = UnionAll(
+            Select(Sellable.id, where=barcode_match),
+            Select(Sellable.id, where=code_match),
+            Select(StorableBatch.storable_id, where=batch_match))
+        tables = [
+            Sellable,
+            LeftJoin(Product, Product.id == Sellable.id),
+            LeftJoin(StorableBatch,
+                     And(StorableBatch.storable_id == Sellable.id,
+                         batch_match)),
+        ]
+        query = In(Sellable.id, candidates)
+        if exclude_grid:
+            query = And(query, Or(Eq(Product.id, None),
+                                  Eq(Product.is_grid, False)))
+        if available_only:
+            query = And(query, Sellable.status == Sellable.STATUS_AVAILABLE)
+
+        # There might be a product with a code equal to another product's
+        # barcode, so barcodes are preferred over codes and both of them
+        # over batch numbers
+        priority = Case(barcode_match, 0, Case(code_match, 1, 2))
+        rows = store.using(*tables).find(
+            (Sellable, Product, StorableBatch), query).order_by(priority)
+        if limit is not None:
+            rows = rows[:limit]
+
+        results = []
+        for sellable, product, batch in rows:
+            if self._matches_sellable(sellable, text):
+                batch = None
+            results.append((sellable, batch))
+        return results
+
+    def _matches_sellable(self, sellable, text):
+        return ((sellable.barcode or u'').lower() == text or
+                (sellable.code or u'').lower() == text)
+
+    def _get_cached(self, store, key, available_only):
+        ids = self._cache.get(key)
+        if ids is None:
+            return None
+
+        text = key[0]
+        sellable_id, batch_id = ids
+        sellable = store.get(Sellable, sellable_id)
+        batch = batch_id and store.get(StorableBatch, batch_id)
+        # Something might have changed since the result was cached, on
+        # another station for instance, so make sure it is still valid
+        if (sellable is None or
+                (available_only and
+                 sellable.status != Sellable.STATUS_AVAILABLE) or
+                (batch_id is None and
+                 not self._matches_sellable(sellable, text)) or
+                (batch_id is not None and
+                 (batch is None or batch.batch_number.lower() != text))):
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return sellable, batch
+
+    def _cache_result(self, key, result):
+        sellable, batch = result
+        self._cache[key] = (sellable.id, batch and batch.id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    #
+    #  Callbacks
+    #
+
+    def _on_sellable_edited(self, obj):
+        # Product.id and Service.id are the same as their Sellable.id
+        for key, (sellable_id, batch_id) in list(self._cache.items()):
+            if sellable_id == obj.id:
+                del self._cache[key]
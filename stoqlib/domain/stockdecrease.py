@@ -41,7 +41,8 @@ from stoqlib.domain.fiscal import Invoice
 from stoqlib.domain.interfaces import IInvoice, IInvoiceItem
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.person import LoginUser, Branch
-from stoqlib.domain.product import ProductHistory, StockTransactionHistory
+from stoqlib.domain.product import (ProductHistory, StockTransactionHistory,
+                                    Storable, StockMovement)
 from stoqlib.domain.station import BranchStation
 from stoqlib.domain.taxes import check_tax_info_presence
 from stoqlib.exceptions import DatabaseInconsistency
@@ -193,14 +194,28 @@ class StockDecreaseItem(Domain):
     # Public API
     #
 
-    def decrease(self, user: LoginUser):
+    def decrease(self, user: LoginUser, movements=None):
+        """Decrease the stock of this item
+
+        :param movements: if not ``None``, the stock decrease will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being applied
+        """
         storable = self.sellable.product_storable
-        if storable:
+        if not storable:
+            return
+
+        if movements is None:
             storable.decrease_stock(self.quantity, self.stock_decrease.branch,
                                     StockTransactionHistory.TYPE_STOCK_DECREASE,
                                     self.id, user,
                                     cost_center=self.stock_decrease.cost_center,
                                     batch=self.batch)
+        else:
+            movements.append(StockMovement(
+                storable, self.stock_decrease.branch, -self.quantity,
+                StockTransactionHistory.TYPE_STOCK_DECREASE, self.id,
+                batch=self.batch,
+                cost_center=self.stock_decrease.cost_center))
 
     #
     # Accessors
@@ -436,10 +451,12 @@ class StockDecrease(IdentifiableDomain):
 
         store = self.store
         branch = self.branch
+        movements = []
         for item in self.get_items():
             if item.sellable.product:
                 ProductHistory.add_decreased_item(store, branch, item)
-            item.decrease(user)
+            item.decrease(user, movements=movements)
+        Storable.apply_stock_movements(store, movements, user)
 
         old_status = self.status
         self.status = StockDecrease.STATUS_CONFIRMED
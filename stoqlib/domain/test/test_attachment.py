@@ -35,3 +35,15 @@ class TestAttachment(DomainTest):
     def test_get_description(self):
         attachment = Attachment(name=u'TesteAttachment')
         self.assertEqual(attachment.get_description(), u'TesteAttachment')
+
+    def test_blob(self):
+        attachment = Attachment(name=u'TesteAttachment', blob=b'data')
+        self.assertEqual(attachment.blob, b'data')
+
+        self.store.add(attachment)
+        self.store.flush()
+        self.store.invalidate()
+        self.assertEqual(attachment.blob, b'data')
+        self.assertEqual(
+            self.store.find(Attachment, Attachment.blob == b'data').one(),
+            attachment)
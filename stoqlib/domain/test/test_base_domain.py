@@ -185,6 +185,24 @@ class TestSelect(DomainTest):
         self.assertEqual(Ding.get_max_value(self.store, Ding.str_field,
                                             query=(Ding.int_field == 2)), u'100')
 
+    def test_allocate_values(self):
+        Ding(store=self.store, str_field=u'5')
+        self.assertEqual(Ding.allocate_values(self.store, Ding.str_field,
+                                              count=2), [u'6', u'7'])
+
+        # Values set by hand should be skipped
+        Ding(store=self.store, str_field=u'8')
+        self.assertEqual(Ding.allocate_values(self.store, Ding.str_field),
+                         [u'9'])
+
+        # Each scope has its own sequence
+        values = Ding.allocate_values(self.store, Ding.str_field, scope=u'x',
+                                      seed=lambda: u'AB0010',
+                                      template=u'AB%s')
+        self.assertEqual(values, [u'AB11'])
+        self.assertEqual(Ding.allocate_values(self.store, Ding.str_field),
+                         [u'10'])
+
     def test_check_unique_value_exists(self):
         ding_1 = Ding(store=self.store, str_field=u'Ding_1')
         ding_2 = Ding(store=self.store, str_field=u'Ding_2')
@@ -24,6 +24,14 @@
 
 __tests__ = 'stoqlib/domain/image.py'
 
+import io
+import shutil
+import tempfile
+
+import mock
+from PIL import Image as PILImage
+from storm.expr import Update
+
 from stoqlib.domain.image import Image
 from stoqlib.domain.test.domaintest import DomainTest
 from stoqlib.domain.events import (ImageCreateEvent, ImageEditEvent)
@@ -40,6 +48,65 @@ class TestImage(DomainTest):
         # the second argument is the string 'teste' with base64 encoding
         self.assertEqual(image.get_base64_encoded(), 'dGVzdGU=')
 
+    def test_deferred_blobs(self):
+        image = self.create_image()
+        image.image = b'image'
+        self.assertEqual(image.image, b'image')
+        self.assertEqual(image.thumbnail, None)
+        self.store.flush()
+
+        # The values should come from the database now
+        self.store.invalidate()
+        self.assertEqual(image.image, b'image')
+        self.assertEqual(image.thumbnail, None)
+
+        self.store.savepoint('before_change')
+        image.thumbnail = b'thumbnail'
+        self.assertEqual(image.thumbnail, b'thumbnail')
+        self.store.rollback_to_savepoint('before_change')
+        self.assertEqual(image.thumbnail, None)
+
+        with self.assertRaises(TypeError):
+            image.image = u'image'
+
+    def test_deferred_blobs_autoreload(self):
+        image = self.create_image()
+        image.image = b'image'
+        self.store.flush()
+        self.assertEqual(image.image, b'image')
+
+        # Simulate another store changing the image and committing,
+        # which autoreloads it on this store
+        self.store.execute(Update({Image.image: b'other'},
+                                  Image.id == image.id, Image))
+        self.assertEqual(image.image, b'image')
+        self.store.autoreload(image)
+        self.assertEqual(image.image, b'other')
+
+    def test_regenerate_thumbnails(self):
+        with io.BytesIO() as f:
+            PILImage.new('RGB', (512, 256)).save(f, 'png')
+            data = f.getvalue()
+        image = self.create_image()
+        image.image = data
+        other_image = self.create_image()
+        other_image.image = data
+        other_image.thumbnail = b'thumbnail'
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with mock.patch('stoqlib.lib.imageutils._thumbnail_cache_dir',
+                        cache_dir):
+            progress = list(Image.regenerate_thumbnails(self.store,
+                                                        batch_size=1))
+            self.assertEqual(progress[-1][0], progress[-1][1])
+            self.assertEqual(other_image.thumbnail, b'thumbnail')
+            with io.BytesIO(image.thumbnail) as f:
+                self.assertEqual(PILImage.open(f).size, (128, 64))
+
+            list(Image.regenerate_thumbnails(self.store, regenerate_all=True))
+            self.assertEqual(other_image.thumbnail, image.thumbnail)
+
     def test_get_description(self):
         image = self.create_image()
         image.description = u'Test test'
@@ -258,6 +258,36 @@ class TestInventory(DomainTest):
         inventory.status = inventory.STATUS_CLOSED
         self.assertFalse(inventory.all_items_counted())
 
+    def test_iter_adjust_items(self):
+        inventory = self.create_inventory()
+        inventory.invoice_number = 13
+        cfop = self.create_cfop_data()
+        items = [self.create_inventory_item(inventory, quantity=5)
+                 for i in range(5)]
+        for i, item in enumerate(items):
+            item.actual_quantity = i + 3
+            item.cfop_data = cfop
+
+        progress = list(inventory.iter_adjust_items(
+            items, self.current_user, inventory.invoice_number,
+            batch_size=2))
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+        for item in items:
+            storable = item.product.storable
+            self.assertEqual(storable.get_balance_for_branch(inventory.branch),
+                             item.actual_quantity)
+        # The item with the same quantity didn't need an adjustment
+        self.assertEqual([item.is_adjusted for item in items],
+                         [True, True, False, True, True])
+
+        entries = self.store.find(FiscalBookEntry,
+                                  entry_type=FiscalBookEntry.TYPE_INVENTORY)
+        self.assertEqual(entries.count(), 4)
+        self.assertEqual(set((e.cfop, e.branch, e.invoice_number)
+                             for e in entries),
+                         set([(cfop, inventory.branch, 13)]))
+
     def test_branch_name(self):
         inventory = self.create_inventory()
         inventory.branch = self.create_branch(name=u'Dummy',
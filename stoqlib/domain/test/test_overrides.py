@@ -23,7 +23,12 @@
 
 __tests__ = 'stoqlib/domain/overrides.py'
 
-from stoqlib.domain.overrides import ProductBranchOverride
+import time
+
+import mock
+
+from stoqlib.domain.overrides import (ProductBranchOverride,
+                                      SellableBranchOverride)
 from stoqlib.domain.test.domaintest import DomainTest
 
 
@@ -107,3 +112,62 @@ class TestProductOverride(DomainTest):
                                          branch=self.current_branch)
         override.c_benef = 'RJ111111'
         self.assertEqual(override.c_benef, 'RJ111111')
+
+
+class TestSellableOverride(DomainTest):
+
+    def test_find_by_sellable(self):
+        branch = self.create_branch()
+        sellables = [self.create_sellable() for i in range(3)]
+        overrides = [
+            self.create_sellable_branch_override(sellable=sellable,
+                                                 branch=branch)
+            for sellable in sellables[:2]]
+
+        # The overrides being resolved are fetched at once
+        with self.count_tracer() as tracer:
+            SellableBranchOverride.prefetch(
+                self.store, branch, [sellable.id for sellable in sellables])
+            for sellable, override in zip(sellables, overrides + [None]):
+                self.assertEqual(
+                    SellableBranchOverride.find_by_sellable(sellable, branch),
+                    override)
+        self.assertEqual(tracer.count, 1)
+
+        # Only the missing ones are fetched later
+        other = self.create_sellable()
+        with self.count_tracer() as tracer:
+            for sellable in sellables + [other]:
+                SellableBranchOverride.find_by_sellable(sellable, branch)
+        self.assertEqual(tracer.count, 1)
+
+        # And they are fetched again after the cache timeout
+        with mock.patch('stoqlib.domain.overrides.time.monotonic') as monotonic:
+            monotonic.return_value = (
+                time.monotonic() + SellableBranchOverride.cache_timeout)
+            with self.count_tracer() as tracer:
+                self.assertEqual(
+                    SellableBranchOverride.find_by_sellable(sellables[0],
+                                                            branch),
+                    overrides[0])
+            self.assertEqual(tracer.count, 1)
+
+        # Creating an override invalidates the cache
+        override = self.create_sellable_branch_override(
+            sellable=sellables[2], branch=branch)
+        self.assertEqual(
+            SellableBranchOverride.find_by_sellable(sellables[2], branch),
+            override)
+
+        # And so does removing it
+        self.store.remove(override)
+        self.assertIsNone(
+            SellableBranchOverride.find_by_sellable(sellables[2], branch))
+
+        # Moving it to another branch
+        overrides[0].branch = self.create_branch()
+        self.assertIsNone(
+            SellableBranchOverride.find_by_sellable(sellables[0], branch))
+
+        self.assertIsNone(
+            SellableBranchOverride.find_by_sellable(sellables[1], None))
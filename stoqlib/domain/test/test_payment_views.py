@@ -25,10 +25,14 @@
 __tests__ = 'stoqlib/domain/payment/views.py'
 
 from dateutil.relativedelta import relativedelta
+import mock
 
+from stoqlib.domain.events import (SaleIsExternalEvent,
+                                   SaleIsExternalQueryEvent)
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.views import InPaymentView
+from stoqlib.domain.sale import Sale
 from stoqlib.domain.test.domaintest import DomainTest
 from stoqlib.lib.dateutils import localtoday
 
@@ -61,3 +65,70 @@ class TestInPaymentView(DomainTest):
         payment.group.payer = client.person
         self.assertTrue(InPaymentView.has_late_payments(self.store,
                                                         client.person))
+
+    def test_has_late_payments_external_sale(self):
+        client = self.create_client()
+        sale = self.create_sale(client=client)
+        payment = self.create_payment(Payment.TYPE_IN,
+                                      localtoday() - relativedelta(days=2),
+                                      group=sale.group)
+        payment.status = Payment.STATUS_PENDING
+        sale.group.payer = client.person
+        self.assertTrue(InPaymentView.has_late_payments(self.store,
+                                                        client.person))
+
+        # The payments of external sales are not considered
+        def callback():
+            return Sale.id == sale.id
+
+        SaleIsExternalQueryEvent.connect(callback)
+        try:
+            self.assertFalse(InPaymentView.has_late_payments(self.store,
+                                                             client.person))
+        finally:
+            SaleIsExternalQueryEvent.disconnect(callback)
+
+    def test_has_late_payments_external_sale_no_query(self):
+        client = self.create_client()
+        sale = self.create_sale(client=client)
+        payment = self.create_payment(Payment.TYPE_IN,
+                                      localtoday() - relativedelta(days=2),
+                                      group=sale.group)
+        payment.status = Payment.STATUS_PENDING
+        sale.group.payer = client.person
+
+        # The sales are checked one by one when only SaleIsExternalEvent
+        # is handled
+        def callback(s):
+            return s == sale
+
+        SaleIsExternalEvent.connect(callback)
+        try:
+            self.assertFalse(InPaymentView.has_late_payments(self.store,
+                                                             client.person))
+            self.assertEqual(
+                InPaymentView.find_late_payers(self.store, [client.person]),
+                set())
+            with mock.patch('stoqlib.domain.payment.views.log') as log:
+                InPaymentView.get_late_payments_query(client.person.id)
+            self.assertEqual(log.warning.call_count, 1)
+        finally:
+            SaleIsExternalEvent.disconnect(callback)
+
+    def test_find_late_payers(self):
+        late_client = self.create_client()
+        client = self.create_client()
+        self.assertEqual(InPaymentView.find_late_payers(self.store, []), set())
+
+        payment = self.create_payment(Payment.TYPE_IN,
+                                      localtoday() - relativedelta(days=2))
+        payment.status = Payment.STATUS_PENDING
+        payment.group = self.create_payment_group()
+        payment.group.payer = late_client.person
+
+        payers = InPaymentView.find_late_payers(
+            self.store, [late_client.person, client.person])
+        self.assertEqual(payers, {late_client.person.id})
+        payers = InPaymentView.find_late_payers(self.store,
+                                                [client.person.id])
+        self.assertEqual(payers, set())
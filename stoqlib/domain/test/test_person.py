@@ -47,6 +47,7 @@ from stoqlib.domain.fiscal import CfopData
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.person import (Branch, Client, ClientCategory,
+                                   ClientCreditBalance,
                                    ClientSalaryHistory, Company,
                                    Employee, EmployeeRole,
                                    EmployeeRoleHistory, Individual,
@@ -818,6 +819,56 @@ class TestClient(_PersonFacetTest, DomainTest):
         payment.payment_type = payment.TYPE_IN
         self.assertEqual(client.credit_account_balance, -100)
 
+        payment.cancel()
+        self.assertEqual(client.credit_account_balance, 0)
+
+    def test_remaining_store_credit(self):
+        method = PaymentMethod.get_by_name(self.store, u'store_credit')
+        client = self.create_client()
+        client.credit_limit = 1000
+        self.assertEqual(client.remaining_store_credit, 1000)
+
+        group = self.create_payment_group()
+        group.payer = client.person
+        payment = self.create_payment(payment_type=Payment.TYPE_IN,
+                                      value=300, method=method, group=group)
+        # Preview payments are not considered
+        self.assertEqual(client.remaining_store_credit, 1000)
+        payment.set_pending()
+        self.assertEqual(client.remaining_store_credit, 700)
+
+        # The payment is now from another client
+        other_client = self.create_client()
+        other_client.credit_limit = 500
+        group.payer = other_client.person
+        self.assertEqual(client.remaining_store_credit, 1000)
+        self.assertEqual(other_client.remaining_store_credit, 200)
+
+        payment.cancel()
+        self.assertEqual(other_client.remaining_store_credit, 500)
+
+    def test_credit_balance_rebuild(self):
+        method = PaymentMethod.get_by_name(self.store, u'store_credit')
+        client = self.create_client()
+        group = self.create_payment_group()
+        group.payer = client.person
+        payment = self.create_payment(payment_type=Payment.TYPE_IN,
+                                      value=300, method=method, group=group)
+        payment.set_pending()
+        self.store.flush()
+        self.assertEqual(ClientCreditBalance.find_inconsistent(self.store), [])
+
+        # Simulate the balance getting out of sync
+        self.store.execute(
+            "UPDATE client_credit_balance SET store_credit_debit = 10 "
+            "WHERE client_id = '%s'" % (client.id, ))
+        self.assertEqual(ClientCreditBalance.find_inconsistent(self.store),
+                         [(client, 0, 10, 0, 300)])
+
+        ClientCreditBalance.rebuild(self.store)
+        self.assertEqual(ClientCreditBalance.find_inconsistent(self.store), [])
+        self.assertEqual(client.remaining_store_credit, -300)
+
 
 class TestClientCategory(DomainTest):
     def test_get_description(self):
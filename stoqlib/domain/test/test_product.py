@@ -29,7 +29,9 @@ from storm.exceptions import NotOneError
 from stoqlib.exceptions import StockError
 from stoqlib.database.runtime import new_store
 from stoqlib.domain.events import (ProductCreateEvent, ProductEditEvent,
-                                   ProductRemoveEvent)
+                                   ProductRemoveEvent,
+                                   ProductStockBatchUpdateEvent,
+                                   ProductStockUpdateEvent)
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.person import Branch
@@ -39,7 +41,7 @@ from stoqlib.domain.product import (ProductSupplierInfo, Product,
                                     ProductQualityTest, Storable,
                                     StorableBatch, StorableBatchView,
                                     StockTransactionHistory, ProductManufacturer,
-                                    GridOption, GridGroup)
+                                    GridOption, GridGroup, StockMovement)
 from stoqlib.domain.production import (ProductionOrder, ProductionProducedItem,
                                        ProductionItemQualityResult,
                                        ProductionItem)
@@ -1373,6 +1375,73 @@ class TestStorable(DomainTest):
 
         self.assertFalse(cost_center.get_stock_transaction_entries().is_empty())
 
+    def test_apply_stock_movements(self):
+        b1 = self.create_branch()
+        b2 = self.create_branch()
+        s1 = self.create_storable(branch=b1, stock=10)
+        s2 = self.create_storable()
+        cost_center = self.create_cost_center()
+
+        updates = []
+        item_updates = []
+
+        def _on_stock_update(items):
+            updates.extend(items)
+
+        def _on_item_stock_update(product, branch, old_quantity, new_quantity):
+            item_updates.append((product, branch, old_quantity, new_quantity))
+        ProductStockBatchUpdateEvent.connect(_on_stock_update)
+        ProductStockUpdateEvent.connect(_on_item_stock_update)
+        try:
+            Storable.apply_stock_movements(self.store, [
+                StockMovement(s1, b1, -4, StockTransactionHistory.TYPE_INITIAL,
+                              None, cost_center=cost_center),
+                StockMovement(s1, b2, 3, StockTransactionHistory.TYPE_INITIAL,
+                              None, unit_cost=10),
+                StockMovement(s2, b1, 5, StockTransactionHistory.TYPE_INITIAL,
+                              None, unit_cost=2),
+                # Decreasing what was just increased is fine
+                StockMovement(s2, b1, -5, StockTransactionHistory.TYPE_INITIAL,
+                              None),
+            ], self.current_user)
+        finally:
+            ProductStockBatchUpdateEvent.disconnect(_on_stock_update)
+            ProductStockUpdateEvent.disconnect(_on_item_stock_update)
+
+        self.assertEqual(s1.get_balance_for_branch(b1), 6)
+        self.assertEqual(s1.get_balance_for_branch(b2), 3)
+        self.assertEqual(s2.get_balance_for_branch(b1), 0)
+        self.assertEqual(s1.get_stock_item(b2, None).stock_cost, 10)
+        self.assertEqual(s2.get_stock_item(b1, None).stock_cost, 2)
+        self.assertFalse(cost_center.get_stock_transaction_entries().is_empty())
+        self.assertEqual(updates, [(s1.product, b1, 10, 6),
+                                   (s1.product, b2, 0, 3),
+                                   (s2.product, b1, 0, 0)])
+        self.assertEqual(item_updates, [(s1.product, b1, 10, 6),
+                                        (s1.product, b2, 0, 3),
+                                        (s2.product, b1, 0, 5),
+                                        (s2.product, b1, 5, 0)])
+
+    def test_apply_stock_movements_error(self):
+        storable = self.create_storable(branch=self.current_branch, stock=1)
+        branch = self.current_branch
+
+        with self.assertRaises(ValueError):
+            Storable.apply_stock_movements(self.store, [
+                StockMovement(storable, None, 1,
+                              StockTransactionHistory.TYPE_INITIAL, None)],
+                self.current_user)
+
+        # Nothing should be applied if any of the movements is invalid
+        with self.assertRaises(StockError):
+            Storable.apply_stock_movements(self.store, [
+                StockMovement(storable, branch, 5,
+                              StockTransactionHistory.TYPE_INITIAL, None),
+                StockMovement(storable, branch, -10,
+                              StockTransactionHistory.TYPE_INITIAL, None)],
+                self.current_user)
+        self.assertEqual(storable.get_balance_for_branch(branch), 1)
+
     def test_update_stock_cost(self):
         stock_item = self.create_product_stock_item(quantity=10, stock_cost=50)
         self.assertEqual(stock_item.quantity, 10)
@@ -1416,6 +1485,22 @@ class TestStorableBatch(DomainTest):
         self.assertFalse(StorableBatch.is_batch_number_available(
             self.store, u'321', exclude_storable=storable))
 
+    def test_allocate_batch_numbers(self):
+        storable = self.create_storable(is_batch=True)
+        self.create_storable_batch(storable=storable, batch_number=u'130-ZZ')
+        self.create_storable_batch(storable=storable, batch_number=u'200-XY')
+        branch = self.create_branch()
+        branch.acronym = u'ZZ'
+
+        with self.sysparam(SYNCHRONIZED_MODE=True):
+            self.assertEqual(
+                StorableBatch.allocate_batch_numbers(self.store, 2, branch),
+                [u'131-ZZ', u'132-ZZ'])
+
+            branch.acronym = None
+            with self.assertRaises(ValueError):
+                StorableBatch.allocate_batch_numbers(self.store, 1, branch)
+
     def test_get_max_batch_number(self):
         storable = self.create_storable(is_batch=True)
 
@@ -35,12 +35,13 @@ from stoqlib.api import api
 from stoqlib.database.interfaces import ICurrentUser
 from stoqlib.domain.commission import Commission, CommissionSource
 from stoqlib.domain.event import Event
-from stoqlib.domain.events import SaleIsExternalEvent
+from stoqlib.domain.events import SaleIsExternalEvent, SaleIsExternalQueryEvent
 from stoqlib.domain.fiscal import FiscalBookEntry
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment, PaymentChangeHistory
 from stoqlib.domain.person import LoginUser
-from stoqlib.domain.product import StockTransactionHistory, Storable
+from stoqlib.domain.product import (ProductHistory, StockTransactionHistory,
+                                    Storable)
 from stoqlib.domain.returnedsale import ReturnedSaleItem
 from stoqlib.domain.sale import (ClientsWithSaleView, Delivery,
                                  ReturnedSaleItemsView, ReturnedSaleView, Sale,
@@ -54,6 +55,7 @@ from stoqlib.exceptions import DatabaseInconsistency, SellError
 from stoqlib.lib.dateutils import localdate, localdatetime, localtoday
 from stoqlib.lib.formatters import format_quantity
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.timing import PhaseTimer
 
 __tests__ = 'stoqlib/domain/sale.py'
 
@@ -417,6 +419,29 @@ class TestSale(DomainTest):
         self.assertEqual(book_entry.cfop.code, u'5.102')
         self.assertEqual(book_entry.icms_value, Decimal("1.8"))
 
+    def test_confirm_timer(self):
+        sale = self.create_sale()
+        sellable = self.add_product(sale, quantity=2)
+        storable = sellable.product_storable
+        self.add_payments(sale, u'money')
+        sale.order(self.current_user)
+
+        timer = PhaseTimer('confirm')
+        sale.confirm(self.current_user, timer=timer)
+        self.assertEqual(sale.status, Sale.STATUS_CONFIRMED)
+        self.assertEqual(
+            list(timer.phases),
+            ['load items', 'items', 'stock', 'totals', 'payments',
+             'fiscal entries', 'commissions', 'pay on confirm', 'status'])
+
+        item = sale.get_items().one()
+        self.assertEqual(item.quantity_decreased, 2)
+        stock_item = storable.get_stock_item(sale.branch, None)
+        self.assertEqual(item.average_cost, stock_item.stock_cost)
+        self.assertEqual(
+            self.store.find(ProductHistory, sellable=item.sellable,
+                            branch=sale.branch).one().quantity_sold, 2)
+
     def test_confirm_money_with_till(self):
         sale = self.create_sale()
         self.add_product(sale)
@@ -1958,6 +1983,20 @@ class TestSale(DomainTest):
         self.assertTrue(sale.is_external())
         SaleIsExternalEvent.disconnect(callback)
 
+    def test_get_external_query(self):
+        sale = self.create_sale()
+        self.assertIsNone(Sale.get_external_query())
+
+        def callback():
+            return Sale.id == sale.id
+
+        SaleIsExternalQueryEvent.connect(callback)
+        try:
+            query = Sale.get_external_query()
+            self.assertEqual(self.store.find(Sale, query).one(), sale)
+        finally:
+            SaleIsExternalQueryEvent.disconnect(callback)
+
     def test_get_delivery_item(self):
         sale = self.create_sale()
         prod = self.create_product()
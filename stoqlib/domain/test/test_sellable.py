@@ -43,7 +43,7 @@ from stoqlib.domain.test.domaintest import DomainTest
 from stoqlib.domain.views import (ProductFullStockView,
                                   ProductFullWithClosedStockView,
                                   ProductClosedStockView)
-from stoqlib.lib.dateutils import localdate
+from stoqlib.lib.dateutils import localdate, localnow
 from stoqlib.lib.parameters import sysparam
 
 __tests__ = 'stoqlib/domain/sellable.py'
@@ -873,6 +873,36 @@ class TestSellable(DomainTest):
         ClientCategoryPrice(sellable=sellable, category=category, price=200, store=self.store)
         self.assertEqual(sellable.get_price(branch), 200)
 
+    def test_get_prices(self):
+        sellables = [self.create_sellable(price=100) for i in range(3)]
+        category = self.create_client_category(u'Cat 1')
+        ClientCategoryPrice(sellable=sellables[1], category=category,
+                            price=155, store=self.store)
+        sellables[2].on_sale_price = 50
+        sellables[2].on_sale_start_date = localnow() - datetime.timedelta(1)
+        ClientCategoryPrice(sellable=sellables[2], category=category,
+                            price=160, store=self.store)
+        branch = self.create_branch()
+
+        self.assertEqual(Sellable.get_prices(self.store, []), {})
+        self.assertEqual(
+            Sellable.get_prices(self.store, sellables, branch=branch),
+            {sellables[0].id: 100, sellables[1].id: 100, sellables[2].id: 50})
+
+        with self.count_tracer() as tracer:
+            prices = Sellable.get_prices(self.store, sellables,
+                                         category=category)
+        self.assertEqual(tracer.count, 1)
+        self.assertEqual(prices, {sellables[0].id: 100,
+                                  sellables[1].id: 155,
+                                  sellables[2].id: 50})
+
+        # The branch category is used, like on get_price
+        branch.default_client_category = category
+        prices = Sellable.get_prices(self.store, sellables, branch=branch)
+        for sellable in sellables:
+            self.assertEqual(prices[sellable.id], sellable.get_price(branch))
+
     def test_remove_category_price(self):
         category_price = self.create_client_category_price()
 
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.sellablelookup import SellableLookup
+from stoqlib.domain.test.domaintest import DomainTest
+
+__tests__ = 'stoqlib/domain/sellablelookup.py'
+
+
+class TestSellableLookup(DomainTest):
+    def test_find(self):
+        lookup = SellableLookup()
+        sellable = self.create_sellable(code=u'ABC123')
+        sellable.barcode = u'7891234567890'
+        other = self.create_sellable(code=u'7891234567890')
+        storable = self.create_storable(product=other.product, is_batch=True)
+        batch = self.create_storable_batch(storable=storable,
+                                           batch_number=u'Lot-1')
+
+        # Barcodes have precedence over codes
+        self.assertEqual(lookup.find(self.store, u'7891234567890'),
+                         (sellable, None))
+        self.assertEqual(lookup.find(self.store, u'abc123'),
+                         (sellable, None))
+        self.assertEqual(lookup.find(self.store, u'LOT-1'), (other, batch))
+        self.assertEqual(lookup.find(self.store, u'nothing'), (None, None))
+
+        other.status = Sellable.STATUS_CLOSED
+        self.assertEqual(lookup.find(self.store, u'lot-1'), (None, None))
+        self.assertEqual(
+            lookup.find(self.store, u'lot-1', available_only=False),
+            (other, batch))
+
+    def test_find_all(self):
+        lookup = SellableLookup()
+        sellable = self.create_sellable(code=u'ABC123')
+        sellable.barcode = u'7891234567890'
+        other = self.create_sellable(code=u'7891234567890')
+        self.assertEqual(lookup.find_all(self.store, u'7891234567890'),
+                         [(sellable, None), (other, None)])
+        self.assertEqual(lookup.find_all(self.store, u'nothing'), [])
+
+    def test_find_grid(self):
+        lookup = SellableLookup()
+        product = self.create_product(code=u'GRID', is_grid=True)
+        self.assertEqual(lookup.find(self.store, u'grid'), (None, None))
+        self.assertEqual(
+            lookup.find(self.store, u'grid', exclude_grid=False),
+            (product.sellable, None))
+
+    def test_cache(self):
+        lookup = SellableLookup(cache_size=1)
+        sellable = self.create_sellable(code=u'CACHED')
+        other = self.create_sellable(code=u'OTHER')
+        self.assertEqual(lookup.find(self.store, u'cached'), (sellable, None))
+
+        with self.count_tracer() as tracer:
+            self.assertEqual(lookup.find(self.store, u'cached'),
+                             (sellable, None))
+        self.assertLessEqual(tracer.count, 1)
+
+        # Changing the code makes the cached entry invalid
+        sellable.code = u'CHANGED'
+        self.assertEqual(lookup.find(self.store, u'cached'), (None, None))
+
+        # Only one entry is kept
+        lookup.find(self.store, u'changed')
+        lookup.find(self.store, u'other')
+        self.assertEqual(list(lookup._cache), [(u'other', True)])
+
+        # Editing the product removes its entries
+        other.product.ncm = u'12345678'
+        other.product.on_update()
+        self.assertEqual(list(lookup._cache), [])
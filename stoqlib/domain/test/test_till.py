@@ -303,6 +303,49 @@ class TestTill(DomainTest):
         till.add_debit_entry(10)
         self.assertEqual(till.get_balance(), -10)
 
+    def test_get_day_summary_data(self):
+        till = Till(store=self.store,
+                    branch=self.current_branch,
+                    station=self.create_station())
+        till.open_till(self.current_user)
+        money = PaymentMethod.get_by_name(self.store, u'money')
+        bill = PaymentMethod.get_by_name(self.store, u'bill')
+
+        till.add_credit_entry(currency(10), u"")
+        till.add_debit_entry(currency(4), u"")
+        till.add_entry(self._create_inpayment())
+        till.add_entry(self._create_outpayment())
+        entry = till.add_entry(self._create_inpayment())
+        self.assertEqual(till.get_day_summary_data(),
+                         {(money, None, None): 6, (bill, None, None): 10})
+
+        self.store.remove(entry)
+        self.assertEqual(till.get_day_summary_data(),
+                         {(money, None, None): 6, (bill, None, None): 0})
+        self.assertEqual(till.get_balance(), 6)
+        self.assertEqual(till.get_credits_total(), 20)
+        self.assertEqual(till.get_debits_total(), -14)
+
+    def test_rebuild_totals(self):
+        till = Till(store=self.store,
+                    branch=self.current_branch,
+                    station=self.create_station())
+        till.open_till(self.current_user)
+        till.add_credit_entry(currency(10), u"")
+        till.add_entry(self._create_outpayment())
+        self.assertEqual(till.get_balance(), 0)
+
+        # Simulate the totals getting out of sync
+        self.store.execute(
+            "UPDATE till_total SET credits_total = 100 "
+            "WHERE till_id = '%s'" % (till.id, ))
+        self.assertEqual(till.get_balance(), 90)
+
+        till.rebuild_totals()
+        self.assertEqual(till.get_balance(), 0)
+        self.assertEqual(till.get_credits_total(), 10)
+        self.assertEqual(till.get_debits_total(), -10)
+
     def test_get_last(self):
         till = Till(store=self.store,
                     branch=self.current_branch,
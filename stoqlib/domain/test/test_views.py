@@ -436,6 +436,19 @@ class TestProductFullStockView(DomainTest):
             ProductFullStockView.product_id == p1.id)
         self.assertEqual(results[0].price, 10)
 
+    def test_with_category_prices(self):
+        branch = self.create_branch()
+        p1 = self.create_product(branch=branch, stock=1, price=10)
+        category = self.create_client_category()
+        self.create_client_category_price(sellable=p1.sellable,
+                                          category=category, price=8)
+
+        view = ProductFullStockView.with_category_prices(category)
+        results = view.find_by_branch(self.store, branch).find(
+            ProductFullStockView.product_id == p1.id)
+        self.assertEqual(results[0].price, 8)
+        self.assertEqual(results[0].stock, 1)
+
     def test_with_unblocked_sellables_query(self):
         p1 = self.create_product()
         supplier = self.create_supplier()
@@ -575,6 +588,22 @@ class TestSellableFullStockView(DomainTest):
             SellableFullStockView.product_id == p1.id)
         self.assertEqual(results[0].price, Decimal('10.15'))
 
+    def test_with_category_prices(self):
+        branch = self.create_branch()
+        p1 = self.create_product(branch=branch, stock=1, price=10)
+        category = self.create_client_category()
+        self.create_client_category_price(sellable=p1.sellable,
+                                          category=category, price=8)
+
+        self.assertIs(SellableFullStockView.with_category_prices(None),
+                      SellableFullStockView)
+        view = SellableFullStockView.with_category_prices(category)
+        self.assertIs(SellableFullStockView.with_category_prices(category),
+                      view)
+        results = view.find_by_branch(self.store, branch).find(
+            view.product_id == p1.id)
+        self.assertEqual(results[0].price, 8)
+
 
 class TestSellableCategoryView(DomainTest):
     def test_category(self):
@@ -36,14 +36,13 @@ from storm.expr import And, Eq, Join, LeftJoin, Or
 from storm.info import ClassAlias
 from storm.references import Reference, ReferenceSet
 
-from stoqlib.database.expr import Date, TransactionTimestamp
+from stoqlib.database.expr import Date, TransactionTimestamp, between_dates
 from stoqlib.database.properties import (PriceCol, DateTimeCol, UnicodeCol,
                                          IdentifierCol, IdCol, EnumCol)
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.base import Domain, IdentifiableDomain
 from stoqlib.domain.events import TillOpenedEvent, TillClosedEvent
-from stoqlib.domain.payment.card import CreditCardData
-from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.payment.card import CreditCardData, CreditProvider
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.person import Person, LoginUser
 from stoqlib.domain.station import BranchStation
@@ -212,7 +211,7 @@ class Till(IdentifiableDomain):
             # Make sure that the till has not been opened today
             today = localtoday().date()
             if not self.store.find(Till,
-                                   And(Date(Till.opening_date) >= today,
+                                   And(between_dates(Till.opening_date, today),
                                        Till.station_id == self.station.id)).is_empty():
                 raise TillError(_("A till has already been opened today"))
 
@@ -317,7 +316,8 @@ class Till(IdentifiableDomain):
         :returns: the balance
         :rtype: currency
         """
-        total = self.get_entries().sum(TillEntry.value) or 0
+        total = self._get_totals().sum(
+            TillTotal.credits_total + TillTotal.debits_total) or 0
         return currency(self.initial_cash_amount + total)
 
     def get_cash_amount(self):
@@ -327,18 +327,11 @@ class Till(IdentifiableDomain):
         :returns: the cash amount on the till
         :rtype: currency
         """
-        store = self.store
-        money = PaymentMethod.get_by_name(store, u'money')
-
-        clause = And(Or(Eq(TillEntry.payment_id, None),
-                        Payment.method_id == money.id),
-                     TillEntry.till_id == self.id)
-
-        join = LeftJoin(Payment, Payment.id == TillEntry.payment_id)
-        results = store.using(TillEntry, join).find(TillEntry, clause)
-
-        return currency(self.initial_cash_amount +
-                        (results.sum(TillEntry.value) or 0))
+        money = PaymentMethod.get_by_name(self.store, u'money')
+        results = self._get_totals(Or(Eq(TillTotal.method_id, None),
+                                      TillTotal.method_id == money.id))
+        total = results.sum(TillTotal.credits_total + TillTotal.debits_total)
+        return currency(self.initial_cash_amount + (total or 0))
 
     def get_entries(self):
         """Fetches all the entries related to this till
@@ -352,23 +345,17 @@ class Till(IdentifiableDomain):
         :returns: total credit
         :rtype: currency
         """
-        results = self.store.find(
-            TillEntry, And(TillEntry.value > 0,
-                           TillEntry.till_id == self.id))
-        return currency(results.sum(TillEntry.value) or 0)
+        return currency(self._get_totals().sum(TillTotal.credits_total) or 0)
 
     def get_debits_total(self):
         """Calculates the total debit for all entries in this till
         :returns: total debit
         :rtype: currency
         """
-        results = self.store.find(
-            TillEntry, And(TillEntry.value < 0,
-                           TillEntry.till_id == self.id))
-        return currency(results.sum(TillEntry.value) or 0)
+        return currency(self._get_totals().sum(TillTotal.debits_total) or 0)
 
     def get_day_summary_data(self) -> Dict[Tuple[PaymentMethod,
-                                                 Optional['CreditProvider'],
+                                                 Optional[CreditProvider],
                                                  Optional[str]], currency]:
         """Get the summary of this till.
         """
@@ -378,20 +365,33 @@ class Till(IdentifiableDomain):
         # payment was not with card
         day_history[(money_method, None, None)] = currency(0)
 
-        for entry in self.get_entries():
-            provider = card_type = None
-            payment = entry.payment
-            method = payment.method if payment else money_method
-            if payment and payment.card_data:
-                provider = payment.card_data.provider
-                card_type = payment.card_data.card_type
-
-            key = (method, provider, card_type)
+        tables = [
+            TillTotal,
+            LeftJoin(PaymentMethod, PaymentMethod.id == TillTotal.method_id),
+            LeftJoin(CreditProvider,
+                     CreditProvider.id == TillTotal.provider_id),
+        ]
+        # Entries without a payment are considered money
+        results = self.store.using(*tables).find(
+            (PaymentMethod, CreditProvider, TillTotal.card_type,
+             TillTotal.credits_total + TillTotal.debits_total),
+            TillTotal.till_id == self.id,
+            Or(TillTotal.credits_total != 0, TillTotal.debits_total != 0))
+        for method, provider, card_type, value in results:
+            key = (method or money_method, provider, card_type)
             day_history.setdefault(key, currency(0))
-            day_history[key] += entry.value
+            day_history[key] += value
 
         return day_history
 
+    def rebuild_totals(self):
+        """Recalculates the totals of this till from its entries
+
+        The totals are kept up to date by the database as the entries
+        are added, so this should only be needed if they got out of sync.
+        """
+        self.store.execute("SELECT rebuild_till_total(?)", (self.id, ))
+
     @deprecated(new='create_day_summary')
     def get_day_summary(self):
         return self.create_day_summary()  # pragma nocover
@@ -412,6 +412,11 @@ class Till(IdentifiableDomain):
     # Private
     #
 
+    def _get_totals(self, *args):
+        # Query the values instead of the TillTotal objects, since they are
+        # updated by the database. Querying also flushes the new entries
+        return self.store.find(TillTotal, TillTotal.till_id == self.id, *args)
+
     def _get_last_closed_till(self):
         results = self.store.find(Till, status=Till.STATUS_CLOSED,
                                   station=self.station).order_by(Till.opening_date)
@@ -483,6 +488,39 @@ class TillEntry(IdentifiableDomain):
         return self.branch.get_description()
 
 
+class TillTotal(Domain):
+    """The running totals of the |tillentries| of a |till|
+
+    There is one for each payment method, credit provider and card type
+    used in the till, the same way the :class:`TillSummary` is grouped.
+    They are maintained by the database as the entries are added, so the
+    till balances don't need to go through all the entries.
+    """
+    __storm_table__ = 'till_total'
+
+    till_id = IdCol(allow_none=False)
+    #: the |till| this total takes part of
+    till = Reference(till_id, 'Till.id')
+
+    method_id = IdCol(allow_none=True)
+    #: the |paymentmethod| of the entries or ``None`` for the entries
+    #: without a |payment|
+    method = Reference(method_id, 'PaymentMethod.id')
+
+    provider_id = IdCol(allow_none=True)
+    #: the |creditprovider| of the card payments of the entries
+    provider = Reference(provider_id, 'CreditProvider.id')
+
+    #: the card type of the card payments of the entries
+    card_type = EnumCol(allow_none=True)
+
+    #: the sum of the positive entries
+    credits_total = PriceCol(default=0)
+
+    #: the sum of the negative entries
+    debits_total = PriceCol(default=0)
+
+
 class TillSummary(Domain):
     """A TillSummary is a summary of the state of all payment methods when the till was
     closed.
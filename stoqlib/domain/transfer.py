@@ -42,7 +42,8 @@ from stoqlib.database.viewable import Viewable
 from stoqlib.domain.base import Domain, IdentifiableDomain
 from stoqlib.domain.events import StockOperationConfirmedEvent
 from stoqlib.domain.fiscal import Invoice
-from stoqlib.domain.product import ProductHistory, StockTransactionHistory
+from stoqlib.domain.product import (ProductHistory, StockTransactionHistory,
+                                    Storable, StockMovement)
 from stoqlib.domain.person import Person, Branch, Company, LoginUser, Employee
 from stoqlib.domain.interfaces import IContainer, IInvoice, IInvoiceItem
 from stoqlib.domain.sellable import Sellable
@@ -154,49 +155,76 @@ class TransferOrderItem(Domain):
         """Returns the total cost of a transfer item eg quantity * cost"""
         return self.quantity * self.sellable.cost
 
-    def send(self, user: LoginUser):
+    def send(self, user: LoginUser, movements=None):
         """Sends this item to it's destination |branch|.
         This method should never be used directly, and to send a transfer you
         should use TransferOrder.send().
+
+        :param movements: if not ``None``, the stock decrease will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being applied
         """
         product = self.sellable.product
         if product.manage_stock:
             storable = product.storable
-            storable.decrease_stock(self.quantity,
-                                    self.transfer_order.source_branch,
-                                    StockTransactionHistory.TYPE_TRANSFER_TO,
-                                    self.id, user, batch=self.batch)
+            if movements is None:
+                storable.decrease_stock(self.quantity,
+                                        self.transfer_order.source_branch,
+                                        StockTransactionHistory.TYPE_TRANSFER_TO,
+                                        self.id, user, batch=self.batch)
+            else:
+                movements.append(StockMovement(
+                    storable, self.transfer_order.source_branch,
+                    -self.quantity, StockTransactionHistory.TYPE_TRANSFER_TO,
+                    self.id, batch=self.batch))
         ProductHistory.add_transfered_item(self.store,
                                            self.transfer_order.source_branch,
                                            self)
 
-    def receive(self, user: LoginUser):
+    def receive(self, user: LoginUser, movements=None):
         """Receives this item, increasing the quantity in the stock.
         This method should never be used directly, and to receive a transfer
         you should use TransferOrder.receive().
+
+        :param movements: if not ``None``, the stock increase will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being applied
         """
         product = self.sellable.product
         if product.manage_stock:
             storable = product.storable
-            storable.increase_stock(self.quantity,
-                                    self.transfer_order.destination_branch,
-                                    StockTransactionHistory.TYPE_TRANSFER_FROM,
-                                    self.id, user, unit_cost=self.stock_cost,
-                                    batch=self.batch)
-
-    def cancel(self, user: LoginUser):
+            if movements is None:
+                storable.increase_stock(self.quantity,
+                                        self.transfer_order.destination_branch,
+                                        StockTransactionHistory.TYPE_TRANSFER_FROM,
+                                        self.id, user, unit_cost=self.stock_cost,
+                                        batch=self.batch)
+            else:
+                movements.append(StockMovement(
+                    storable, self.transfer_order.destination_branch,
+                    self.quantity, StockTransactionHistory.TYPE_TRANSFER_FROM,
+                    self.id, unit_cost=self.stock_cost, batch=self.batch))
+
+    def cancel(self, user: LoginUser, movements=None):
         """Cancel the receiving of this transfer item.
 
         This method will return the product to the stock from source branch.
         This method should never be used directly, and to cancel a transfer you
         should use TransferOrder.cancel()
+
+        :param movements: if not ``None``, the stock increase will be
+          appended to this list as a :class:`StockMovement <stoqlib.domain.product.StockMovement>` instead of being applied
         """
         storable = self.sellable.product_storable
-        storable.increase_stock(self.quantity,
-                                self.transfer_order.source_branch,
-                                StockTransactionHistory.TYPE_CANCELLED_TRANSFER,
-                                self.id, user, unit_cost=self.stock_cost,
-                                batch=self.batch)
+        if movements is None:
+            storable.increase_stock(self.quantity,
+                                    self.transfer_order.source_branch,
+                                    StockTransactionHistory.TYPE_CANCELLED_TRANSFER,
+                                    self.id, user, unit_cost=self.stock_cost,
+                                    batch=self.batch)
+        else:
+            movements.append(StockMovement(
+                storable, self.transfer_order.source_branch, self.quantity,
+                StockTransactionHistory.TYPE_CANCELLED_TRANSFER, self.id,
+                unit_cost=self.stock_cost, batch=self.batch))
 
 
 @implementer(IContainer)
@@ -395,8 +423,10 @@ class TransferOrder(IdentifiableDomain):
         """
         assert self.can_send()
 
+        movements = []
         for item in self.get_items():
-            item.send(user)
+            item.send(user, movements=movements)
+        Storable.apply_stock_movements(self.store, movements, user)
 
         # Save the operation nature and branch in Invoice table.
         self.invoice.operation_nature = self.operation_nature
@@ -411,8 +441,10 @@ class TransferOrder(IdentifiableDomain):
         """
         assert self.can_receive()
 
+        movements = []
         for item in self.get_items():
-            item.receive(user)
+            item.receive(user, movements=movements)
+        Storable.apply_stock_movements(self.store, movements, user)
 
         self.receival_date = receival_date or localnow()
         self.destination_responsible = responsible
@@ -423,8 +455,10 @@ class TransferOrder(IdentifiableDomain):
         """Cancel a transfer order"""
         assert self.can_cancel(current_branch)
 
+        movements = []
         for item in self.get_items():
-            item.cancel(user)
+            item.cancel(user, movements=movements)
+        Storable.apply_stock_movements(self.store, movements, user)
 
         self.cancel_date = cancel_date or localnow()
         self.cancel_responsible_id = responsible.id
@@ -491,6 +525,8 @@ class BaseTransferView(Viewable):
 
     group_by = [TransferOrder, source_branch_name, destination_branch_name]
 
+    identifier_branch_id = 'source_branch_id'
+
     tables = [
         TransferOrder,
         Join(TransferOrderItem,
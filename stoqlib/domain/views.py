@@ -29,8 +29,7 @@ from storm.expr import (And, Coalesce, Eq, Join, LeftJoin, Or, Sum, Select,
                         Alias, Count, Cast, Ne, JoinExpr)
 from storm.info import ClassAlias
 
-from stoqlib.database.expr import (Case, Distinct, Field, NullIf,
-                                   StatementTimestamp, Date, Concat, Round)
+from stoqlib.database.expr import Distinct, Field, NullIf, Concat, Round
 from stoqlib.database.viewable import Viewable
 from stoqlib.domain.account import Account, AccountTransaction
 from stoqlib.domain.address import Address
@@ -81,15 +80,23 @@ _StockBranchSummary = Alias(Select(
                                            ProductStockItem.storable_id == Storable.id))],
     group_by=[Storable.id, Branch.id]), '_stock_summary')
 
-_price_search = Case(
-    condition=Or(And(Date(StatementTimestamp()) >= Date(Sellable.on_sale_start_date),
-                     Date(StatementTimestamp()) <= Date(Sellable.on_sale_end_date)),
-                 And(Eq(Sellable.on_sale_start_date, None),
-                     Date(StatementTimestamp()) <= Date(Sellable.on_sale_end_date)),
-                 And(Date(StatementTimestamp()) >= Date(Sellable.on_sale_start_date),
-                     Eq(Sellable.on_sale_end_date, None))),
-    result=Sellable.on_sale_price,
-    else_=Sellable.base_price)
+_price_search = Sellable.get_price_column()
+
+
+def _get_category_price_view(view, category):
+    # Highjack the view replacing its price column, like
+    # ProductFullStockView.find_by_branch does with the stock join
+    if category is None:
+        return view
+
+    key = ('category_price', category.id)
+    hv = view.highjacked.get(key, None)
+    if hv is None:
+        hv = type("Highjacked%s" % (view.__name__, ), (view, ),
+                  dict(price=Sellable.get_price_column(category)))
+        view.highjacked[key] = hv
+        hv.highjacked[key] = hv
+    return hv
 
 
 class ProductFullStockView(Viewable):
@@ -232,6 +239,19 @@ class ProductFullStockView(Viewable):
 
         return store.find(hv)
 
+    @classmethod
+    def with_category_prices(cls, category):
+        """Gets this view with the prices of a |clientcategory|
+
+        The price column of the returned view is calculated by
+        :meth:`stoqlib.domain.sellable.Sellable.get_price_column`, so it
+        considers the prices of *category*.
+
+        :param category: a |clientcategory| or ``None``
+        :returns: a subclass of this view
+        """
+        return _get_category_price_view(cls, category)
+
     def get_product_and_category_description(self):
         """Returns the product and the category description in one string.
         The category description will be formatted inside square
@@ -531,6 +551,17 @@ class SellableFullStockView(Viewable):
                    Eq(Field('_stock_summary', 'branch_id'), None))
         return store.find(cls, query)
 
+    @classmethod
+    def with_category_prices(cls, category):
+        """Gets this view with the prices of a |clientcategory|
+
+        See :meth:`ProductFullStockView.with_category_prices`
+
+        :param category: a |clientcategory| or ``None``
+        :returns: a subclass of this view
+        """
+        return _get_category_price_view(cls, category)
+
 
 class SellableCategoryView(Viewable):
     """Stores information about categories.
@@ -29,6 +29,7 @@ import tempfile
 from kiwi.currency import currency
 import xlwt
 
+from stoqlib.database.runtime import StoqlibResultSet
 from stoqlib.exporters.xlsutils import (get_date_format,
                                         get_number_format,
                                         write_app_description,
@@ -151,5 +152,9 @@ class XLSExporter(object):
             c.data_type for c in columns])
         self.set_column_headers([
             getattr(c, 'long_title', None) or c.title for c in columns])
+        if isinstance(data, StoqlibResultSet):
+            # Avoid having all the results in memory at the same time,
+            # they are only needed while their row is being written
+            data = data.stream()
         self.add_cells(objectlist.get_cell_contents(data),
                        filter_description=filter_description)
@@ -581,12 +581,19 @@ class BatchIncreaseSelectionDialog(BatchSelectionDialog):
 
     validate_max_quantity = True
 
+    def __init__(self, store, model, quantity, original_batches=None):
+        # The batch numbers suggested by this dialog
+        self._suggested = set()
+        BatchSelectionDialog.__init__(self, store, model, quantity,
+                                      original_batches=original_batches)
+
     #
     #  _BatchSelectionDialog
     #
 
     def on_confirm(self):
         super(BatchIncreaseSelectionDialog, self).on_confirm()
+        self._replace_taken_suggestions()
 
         used = set(batch for batch in self.retval)
         # Replace the existing one instead of replacing since some batches
@@ -601,7 +608,9 @@ class BatchIncreaseSelectionDialog(BatchSelectionDialog):
         if not api.sysparam.get_bool('SUGGEST_BATCH_NUMBER'):
             return None
 
-        return self._get_next_batch_number()
+        batch_number = self._get_next_batch_number()
+        self._suggested.add(batch_number)
+        return batch_number
 
     def validate_entry(self, entry):
         batch_number = str(entry.get_text())
@@ -644,6 +653,35 @@ class BatchIncreaseSelectionDialog(BatchSelectionDialog):
                              "synchronized mode" % (branch.get_description(),))
         return '-'.join([next_value_for(max_used), branch.acronym])
 
+    def _replace_taken_suggestions(self):
+        # The suggestions are based on the batches this station can see, so
+        # another one may have created some of them since they were
+        # suggested. Allocate new numbers from the database sequence for
+        # those, since it is safe to be used by more than one station at the
+        # same time. Doing that only here avoids wasting its numbers on
+        # suggestions that were never used.
+        taken = set(
+            batch for batch in self.retval
+            if batch in self._suggested and
+            not StorableBatch.is_batch_number_available(
+                self.store, batch, exclude_storable=self.model))
+        if not taken:
+            return
+
+        used = self._get_used_batches() | set(self.retval)
+        branch = api.get_current_branch(self.store)
+        numbers = []
+        while len(numbers) < len(taken):
+            numbers.extend(
+                number for number in StorableBatch.allocate_batch_numbers(
+                    self.store, len(taken) - len(numbers), branch=branch)
+                if number not in used)
+        numbers = iter(numbers)
+
+        self.retval = collections.OrderedDict(
+            (next(numbers) if batch in taken else batch, quantity)
+            for batch, quantity in self.retval.items())
+
     def _get_used_batches(self, exclude=None):
         in_use = set()
 
@@ -35,6 +35,7 @@ from kiwi.ui.objectlist import Column
 from stoqlib.api import api
 from stoqlib.domain.inventory import Inventory, InventoryItem
 from stoqlib.gui.base.dialogs import run_dialog
+from stoqlib.gui.dialogs.progressdialog import ProgressDialog
 from stoqlib.gui.editors.baseeditor import BaseEditor
 from stoqlib.gui.fields import CfopField
 from stoqlib.lib.decorators import cached_property
@@ -172,12 +173,27 @@ class InventoryAdjustmentEditor(BaseEditor):
         self._run_adjustment_dialog(selected)
 
     def on_adjust_all_button__clicked(self, button):
-        for item in self.inventory_items:
-            if item.is_adjusted:
-                continue
+        items = [item for item in self.inventory_items if not item.is_adjusted]
+        for item in items:
             item.actual_quantity = item.counted_quantity
             item.reason = _(u'Automatic adjustment')
-            item.adjust(api.get_current_user(self.store), self.model.invoice_number)
+
+        d = ProgressDialog(_('Adjusting items'), pulse=False)
+        d.set_transient_for(self.main_dialog)
+        d.start(wait=0)
+        d.cancel.hide()
+        try:
+            for adjusted, total in self.model.iter_adjust_items(
+                    items, api.get_current_user(self.store),
+                    self.model.invoice_number):
+                d.progressbar.set_text('%s/%s' % (adjusted, total))
+                d.progressbar.set_fraction(adjusted / float(total))
+                while Gtk.events_pending():
+                    Gtk.main_iteration_do(False)
+        finally:
+            d.stop()
+
+        for item in items:
             self.inventory_items.update(item)
 
     def on_inventory_items__row_activated(self, objectlist, item):
@@ -32,6 +32,7 @@ from gi.repository import Pango
 from storm.expr import Eq
 
 from stoqlib.api import api
+from stoqlib.domain.payment.views import InPaymentView
 from stoqlib.domain.person import (EmployeeRole,
                                    Branch, BranchView,
                                    Client, ClientView,
@@ -179,6 +180,23 @@ class ClientSearch(BasePersonSearch):
 
     def setup_widgets(self):
         self.add_csv_button(_("Client"), _("client"))
+        column = self.results.get_column_by_name('has_late_payments')
+        column.treeview_column.connect(
+            'notify::visible', self._on_late_payments_column__notify_visible)
+
+    def _update_late_payments(self, results):
+        column = results.get_column_by_name('has_late_payments')
+        # It needs a query, so only do it if the column is being displayed
+        if not column.treeview_column.get_visible():
+            return
+
+        # Check all the clients found at once instead of one by one
+        late_payers = InPaymentView.find_late_payers(
+            self.store, [client_view.person_id for client_view in results])
+        for client_view in results:
+            client_view.has_late_payments = (
+                client_view.person_id in late_payers)
+        results.refresh(view_only=True)
 
     #
     # SearchDialog Hooks
@@ -223,11 +241,16 @@ class ClientSearch(BasePersonSearch):
                 SearchColumn('fancy_name', _('Fancy Name'), data_type=str,
                              width=150, visible=False),
                 SearchColumn('email', _('Email'), data_type=str,
-                             width=150, visible=False)]
+                             width=150, visible=False),
+                Column('has_late_payments', _('Late payments'), bool,
+                       width=100, visible=False)]
 
     def get_editor_model(self, client_view):
         return client_view.client
 
+    def search_completed(self, results, states):
+        self._update_late_payments(results)
+
     def on_details_button_clicked(self, *args):
         selected = self.results.get_selected()
         run_dialog(ClientDetailsDialog, self, self.store, selected.client)
@@ -237,6 +260,13 @@ class ClientSearch(BasePersonSearch):
         self.set_details_button_sensitive(client_view is not None)
         self.set_edit_button_sensitive(client_view is not None)
 
+    #
+    # Callbacks
+    #
+
+    def _on_late_payments_column__notify_visible(self, column, pspec):
+        self._update_late_payments(self.results)
+
 
 class TransporterSearch(BasePersonSearch):
     title = _('Transporter Search')
@@ -288,7 +288,11 @@ class ProductSearch(SellableSearch):
             branch = None
         else:
             branch = store.get(Branch, branch_id)
-        results = self.search_spec.find_by_branch(store, branch)
+        # Show the prices of the table price, which is what will be charged
+        # when selling on the branch. They are calculated by the query itself
+        search_spec = self.search_spec.with_category_prices(
+            Sellable.get_table_price(store, branch))
+        results = search_spec.find_by_branch(store, branch)
         return results.find(Eq(Product.is_composed, False))
 
     #
@@ -502,16 +502,14 @@ class SearchDialog(BasicDialog):
             self.csv_button.set_sensitive(bool(obj))
 
     def _on_export_csv_button__clicked(self, widget):
-        if not self.unlimited_results:
-            # FIXME: This is making the filters set by the user be respected
-            # when exporting the results.
-            executer = self.search.get_query_executer()
-            states = [(sf.get_state()) for sf in self.search.get_search_filters()]
-            data = executer.search(states, limit=-1)
-        else:
-            # The results are already unlimited, let the exporter get the data
-            # from the objectlist
-            data = None
+        # FIXME: This is making the filters set by the user be respected
+        # when exporting the results.
+        # Even if the results are already unlimited, export a result set
+        # instead of the objectlist, so the exporter can stream it from the
+        # database instead of having all the rows in memory at once
+        executer = self.search.get_query_executer()
+        states = [(sf.get_state()) for sf in self.search.get_search_filters()]
+        data = executer.search(states, limit=-1)
 
         sse = SpreadSheetExporter()
         sse.export(object_list=self.results,
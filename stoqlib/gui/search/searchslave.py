@@ -32,6 +32,7 @@ from kiwi.currency import currency
 from kiwi.ui.objectlist import SummaryLabel
 from kiwi.ui.delegates import SlaveDelegate
 from kiwi.utils import gsignal
+from storm.expr import Expr
 from zope.interface.verify import verifyClass
 
 from stoqlib.api import api
@@ -562,6 +563,12 @@ class SearchSlave(SlaveDelegate):
             self._summary_label.get_parent().remove(self._summary_label)
         if self._lazy_search:
             summary_label_class = LazySummaryLabel
+            # The lazy label shows the sum calculated by the database,
+            # which needs to know which column should be summed
+            executer = self.get_query_executer()
+            attribute = getattr(executer.search_spec, column, None)
+            if isinstance(attribute, Expr):
+                executer.set_summary_column('sum', attribute)
         else:
             summary_label_class = SummaryLabel
         self._summary_label = summary_label_class(klist=self.result_view,
@@ -24,8 +24,11 @@
 
 import datetime
 
+import mock
+
 from stoqlib.api import api
-from stoqlib.domain.product import StorableBatchView, StockTransactionHistory
+from stoqlib.domain.product import (StorableBatch, StorableBatchView,
+                                    StockTransactionHistory)
 from stoqlib.gui.dialogs.batchselectiondialog import (BatchSelectionDialog,
                                                       BatchIncreaseSelectionDialog)
 from stoqlib.gui.test.uitestutils import GUITest
@@ -150,6 +153,29 @@ class TestBatchIncreaseSelectionDialog(GUITest):
             # it should consider it's batch numbers for the next suggestion
             self.assertEqual(dialog._last_entry.get_text(), '126')
 
+    def test_batch_number_suggestion_taken(self):
+        storable = self.create_storable(is_batch=True)
+        storable.register_initial_stock(1, self.create_branch(), 0,
+                                        self.current_user, batch_number=u'123')
+
+        with self.sysparam(SUGGEST_BATCH_NUMBER=True):
+            dialog = BatchIncreaseSelectionDialog(self.store, storable, 10)
+            self.assertEqual(dialog._last_entry.get_text(), '124')
+            spinbutton = dialog.get_spin_by_entry(dialog._last_entry)
+            spinbutton.update(5)
+            self.assertEqual(dialog._last_entry.get_text(), '125')
+
+            # Simulate another station creating a suggested batch number
+            self.create_storable_batch(batch_number=u'124')
+            with mock.patch.object(StorableBatch, 'allocate_batch_numbers',
+                                   return_value=[u'125', u'130']) as allocate:
+                self.click(dialog.main_dialog.ok_button)
+
+        # Only the taken one is allocated, skipping the ones already in use
+        self.assertEqual(allocate.call_count, 1)
+        self.assertNotIn(u'124', dialog.retval)
+        self.assertEqual(dialog.retval[u'130'], 5)
+
     def test_batch_number_suggestion_synchronized_mode(self):
         branch = api.get_current_branch(self.store)
         branch.acronym = u'AB'
@@ -57,7 +57,8 @@ class TestProductAdjustmentDialog(GUITest):
 
         self.assertEqual(run_dialog.call_count, 1)
 
-    def test_adjust_all(self):
+    @mock.patch('stoqlib.gui.editors.inventoryadjustmenteditor.ProgressDialog')
+    def test_adjust_all(self, ProgressDialog):
         inventory = self.create_inventory()
         item = self.create_inventory_item(inventory, 5)
         item.counted_quantity = 10
@@ -68,6 +69,10 @@ class TestProductAdjustmentDialog(GUITest):
         self.click(dialog.adjust_all_button)
         self.assertEqual(item.actual_quantity, 10)
         self.assertEqual(item.reason, 'Automatic adjustment')
+        ProgressDialog.assert_called_once_with('Adjusting items', pulse=False)
+        ProgressDialog.return_value.progressbar.set_text.assert_called_once_with(
+            '1/1')
+        self.assertTrue(item.is_adjusted)
 
 
 class TestAdjustmentDialog(GUITest):
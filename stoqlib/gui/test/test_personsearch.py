@@ -24,9 +24,12 @@
 
 import datetime
 
+import mock
+
 from stoqlib.api import api
 from stoqlib.domain.commission import Commission
 from stoqlib.domain.payment.payment import Payment
+from stoqlib.domain.payment.views import InPaymentView
 from stoqlib.domain.person import (Client, Employee, EmployeeRoleHistory,
                                    Supplier, Transporter, EmployeeRole)
 from stoqlib.domain.product import ProductSupplierInfo
@@ -42,6 +45,7 @@ from stoqlib.gui.search.personsearch import (ClientSearch, EmployeeSearch,
                                              ClientsWithCreditSearch)
 from stoqlib.gui.search.searchfilters import DateSearchFilter
 from stoqlib.gui.test.uitestutils import GUITest
+from stoqlib.lib.dateutils import localtoday
 
 
 class TestPersonSearch(GUITest):
@@ -122,6 +126,39 @@ class TestPersonSearch(GUITest):
         search.search.refresh()
         self.check_search(search, 'client-birthday-interval-filter')
 
+    def test_client_search_late_payments(self):
+        self.clean_domain([Commission, SaleItem, Sale, Client])
+
+        late_client = self.create_client(u'Richard Stallman')
+        self.create_client(u'Junio C. Hamano')
+        payment = self.create_payment(
+            Payment.TYPE_IN, localtoday() - datetime.timedelta(days=2))
+        payment.status = Payment.STATUS_PENDING
+        payment.group = self.create_payment_group()
+        payment.group.payer = late_client.person
+
+        search = ClientSearch(self.store)
+        column = search.results.get_column_by_name('has_late_payments')
+        with mock.patch.object(InPaymentView, 'find_late_payers') as find:
+            search.search.refresh()
+        # The column is hidden by default, so there's no need to query
+        self.assertEqual(find.call_count, 0)
+
+        # Showing the column checks the clients already found
+        column.treeview_column.set_visible(True)
+        self.assertEqual(
+            {client_view.name: client_view.has_late_payments
+             for client_view in search.results},
+            {u'Richard Stallman': True, u'Junio C. Hamano': False})
+
+        # And the ones found after that
+        late_client.person.name = u'Richard M. Stallman'
+        search.search.refresh()
+        self.assertEqual(
+            {client_view.name: client_view.has_late_payments
+             for client_view in search.results},
+            {u'Richard M. Stallman': True, u'Junio C. Hamano': False})
+
     def test_client_as_company(self):
         self.clean_domain([Commission, SaleItem, Sale, Client])
 
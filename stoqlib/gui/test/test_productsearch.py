@@ -184,6 +184,22 @@ class TestProductSearch(GUITest):
         search = ProductSearch(self.store, hide_price_column=True)
         self.check_search(search, 'product-search-without-price')
 
+    def test_search_table_price(self):
+        branch = get_current_branch(self.store)
+        product = self.create_product(price=10, description=u'Cleats')
+        self.create_storable(product=product)
+        category = self.create_client_category()
+        self.create_client_category_price(category=category,
+                                          sellable=product.sellable, price=8)
+        branch.default_client_category = category
+
+        search = ProductSearch(self.store)
+        search.set_searchbar_search_string('cleats')
+        search.branch_filter.set_state(branch.id)
+        search.search.refresh()
+        # The price is the one of the branch table price
+        self.assertEqual([r.price for r in search.results], [8])
+
 
 class TestProductSearchQuantity(GUITest):
     def _show_search(self):
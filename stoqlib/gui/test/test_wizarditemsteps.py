@@ -86,6 +86,20 @@ class TestProductionServiceStep(BaseTest, GUITest):
     step_class = ProductionServiceStep
     search_name = 'item-step-production-service'
 
+    def test_find_sellable_and_batch(self):
+        service = self.create_service()
+        service.sellable.code = u'SRV-1'
+        # The product is not in the view of this step, so the service
+        # should be found even though barcodes have precedence
+        product = self.create_product()
+        product.sellable.barcode = u'SRV-1'
+        self.assertEqual(self.step._find_sellable_and_batch(u'srv-1'),
+                         (service.sellable, None))
+
+        service.sellable.code = u'SRV-2'
+        self.assertEqual(self.step._find_sellable_and_batch(u'srv-1'),
+                         (None, None))
+
 
 class TestProductionItemStep(BaseTest, GUITest):
     wizard_class = ProductionWizard
@@ -92,16 +92,57 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
         self._load_result_set(result)
 
     def _load_result_set(self, result):
-        self._post_result = self._executer.get_post_result(result)
-        if self._post_result is not None:
-            count = self._post_result.count
+        # The summary (which includes the count) is calculated on another
+        # connection, so fetch the first rows while waiting for it. When
+        # sorting in descending order we need the count to know which are
+        # the first rows, so they will be fetched later.
+        operation = self._executer.search_summary_async(result)
+        first_rows = None
+        if self._sort_order != Gtk.SortType.DESCENDING:
+            first_rows = list(
+                self._get_ordered_result()[0:self._initial_count])
+
+        if operation.wait():
+            self._post_result = operation.get_result()
         else:
-            count = result.count()
+            self._post_result = self._executer.get_post_result(result)
+        count = self._post_result.count
         self._count = count
         self._iters = list(range(0, count))
         self._result = result
         self._values = [empty_marker] * count
-        self.load_items_from_results(0, self._initial_count)
+        if first_rows is not None:
+            # Something could have been created after the count was done
+            self._set_items(0, first_rows[:count])
+        else:
+            self.load_items_from_results(0, self._initial_count)
+
+    def _get_ordered_result(self):
+        column = self._objectlist.get_columns()[self._sort_column_id]
+        if hasattr(column, 'search_attribute'):
+            # Even if it's defined, it could be None
+            order_attr = column.search_attribute or column.attribute
+        else:
+            order_attr = column.attribute
+        return self._executer.get_ordered_result(self._orig_result,
+                                                 order_attr)
+
+    def _set_items(self, start, items):
+        has_loaded = False
+        for i, item in enumerate(items, start):
+            if self._values[i] is not empty_marker:
+                continue
+            has_loaded = True
+            self._values[i] = item
+            path = (i, )
+            titer = self.create_tree_iter(i)
+            # We are bypassing ObjectList to insert items in the model, but
+            # ObjectList depends on knowing where the model is present for a few
+            # actions. Let it know about this new item
+            self._objectlist.set_instance_iter(item, titer)
+            self.row_changed(path, titer)
+
+        return has_loaded
 
     # GtkTreeModel
 
@@ -251,14 +292,7 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
         # If we moved the start value in the for above, also move the end value
         end = min(start + load_total, self._count)
 
-        column = self._objectlist.get_columns()[self._sort_column_id]
-        if hasattr(column, 'search_attribute'):
-            # Even if it's defined, it could be None
-            order_attr = column.search_attribute or column.attribute
-        else:
-            order_attr = column.attribute
-        self._result = self._executer.get_ordered_result(self._orig_result,
-                                                         order_attr)
+        self._result = self._get_ordered_result()
 
         if self._sort_order == Gtk.SortType.DESCENDING:
             # Results should be reversed, so we need to invert the start and
@@ -271,21 +305,7 @@ class LazyObjectModel(GenericTreeModel, Gtk.TreeSortable):
         else:
             results = list(self._result[start:end])
 
-        has_loaded = False
-        for i, item in enumerate(results, start):
-            if self._values[i] is not empty_marker:
-                continue
-            has_loaded = True
-            self._values[i] = item
-            path = (i, )
-            titer = self.create_tree_iter(i)
-            # We are bypassing ObjectList to insert items in the model, but
-            # ObjectList depends on knowing where the model is present for a few
-            # actions. Let it know about this new item
-            self._objectlist.set_instance_iter(item, titer)
-            self.row_changed(path, titer)
-
-        return has_loaded
+        return self._set_items(start, results)
 
     def get_post_data(self):
         return self._post_result
@@ -50,6 +50,7 @@ from stoqlib.lib.translation import stoqlib_gettext as _
 _NEW_ITEM_MARKER = object()
 _LOADING_ITEM_MARKER = object()
 _NO_ITENS_MARKER = object()
+_ERROR_ITEM_MARKER = object()
 (COL_ITEM,
  COL_MARKUP,
  COL_TOOLTIP,
@@ -113,6 +114,14 @@ class _QueryEntryPopup(PopupWindow):
 
         GLib.idle_add(self._resize)
 
+    def set_error(self):
+        self.set_loading(False)
+        self._model.clear()
+        self._model.append(
+            (_ERROR_ITEM_MARKER, self.entry_gadget.SEARCH_ERROR_TEXT,
+             None, False, 0))
+        GLib.idle_add(self._resize)
+
     def scroll(self, relative=None, absolute=None):
         model, titer = self._selection.get_selected()
 
@@ -250,7 +259,8 @@ class _QueryEntryPopup(PopupWindow):
         return self.loading
 
     def _select_item(self, item, fallback_to_search=False):
-        if item in [_LOADING_ITEM_MARKER, _NO_ITENS_MARKER]:
+        if item in [_LOADING_ITEM_MARKER, _NO_ITENS_MARKER,
+                    _ERROR_ITEM_MARKER]:
             pass
         elif item is _NEW_ITEM_MARKER:
             self.popdown()
@@ -308,6 +318,7 @@ class QueryEntryGadget(object):
     EDIT_ITEM_TOOLTIP = _("Edit the selected item")
     INFO_ITEM_TOOLTIP = _("See info about the selected item")
     NO_ITEMS_FOUND_TEXT = _("No items found")
+    SEARCH_ERROR_TEXT = _("Could not search the items, try again")
     advanced_search = True
     selection_only = False
     item_editor = None
@@ -477,6 +488,8 @@ class QueryEntryGadget(object):
         self._last_operation = self._find_items(value)
         self._last_operation.connect(
             'finish', lambda o: self._popup.add_items(o.get_result()))
+        self._last_operation.connect(
+            'error', lambda o, error: self._popup.set_error())
 
     def _run_search(self):
         if not self.search_class:
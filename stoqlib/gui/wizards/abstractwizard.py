@@ -39,13 +39,14 @@ from kiwi.datatypes import ValidationError
 from kiwi.ui.objectlist import SummaryLabel
 from kiwi.utils import gsignal
 from kiwi.python import Settable
-from storm.expr import And, Lower
+from storm.expr import And, In
 
 from stoqlib.api import api
 from stoqlib.domain.sellable import Sellable
+from stoqlib.domain.sellablelookup import SellableLookup
 from stoqlib.domain.payment.payment import Payment
 from stoqlib.domain.payment.group import PaymentGroup
-from stoqlib.domain.product import Product, StorableBatch
+from stoqlib.domain.product import Product
 from stoqlib.domain.sale import SaleItem
 from stoqlib.domain.workorder import WorkOrderItem
 from stoqlib.domain.service import ServiceView
@@ -670,31 +671,20 @@ class SellableItemSlave(BaseEditorSlave):
         """
         viewable, default_query = self.get_sellable_view_query()
 
-        # FIXME: Put this logic for getting the sellable based on
-        # barcode/code/batch_number on domain. Note that something very
-        # simular is done on POS app
-
-        # First try barcode, then code since there might be a product
-        # with a code equal to another product's barcode
-        for attr in [viewable.barcode, viewable.code]:
-            query = Lower(attr) == text.lower()
-            if default_query:
-                query = And(query, default_query)
-
-            result = self.store.find(viewable, query).one()
-            if result:
-                return result.sellable, None
-
-        # if none of the above worked, try to find by batch number
-        query = Lower(StorableBatch.batch_number) == text.lower()
-        batch = self.store.find(StorableBatch, query).one()
-        if batch:
-            sellable = batch.storable.product.sellable
-            query = viewable.id == sellable.id
-            if default_query:
-                query = And(query, default_query)
-            # Make sure batch's sellable is in the view
-            if not self.store.find(viewable, query).is_empty():
+        candidates = SellableLookup().find_all(
+            self.store, text, available_only=False, exclude_grid=False)
+        if not candidates:
+            return None, None
+
+        # The sellable whose barcode matches might not be in the view
+        # while another one whose code matches is, so use the first
+        # candidate that is in the view
+        query = In(viewable.id, [sellable.id for sellable, batch in candidates])
+        if default_query:
+            query = And(query, default_query)
+        in_view = set(result.id for result in self.store.find(viewable, query))
+        for sellable, batch in candidates:
+            if sellable.id in in_view:
                 return sellable, batch
 
         return None, None
@@ -249,7 +249,11 @@ class SaleQuoteItemStep(SellableItemStep):
                           Eq(Field('_stock_summary', 'branch_id'), None))
         query = And(branch_query,
                     Sellable.get_available_sellables_query(self.store))
-        return self.sellable_view, query
+        # Show the prices of the client category, calculated by the query
+        # itself instead of one query for each sellable
+        viewable = self.sellable_view.with_category_prices(
+            self.model.client_category)
+        return viewable, query
 
     def setup_slaves(self):
         SellableItemStep.setup_slaves(self)
@@ -36,6 +36,7 @@ from stoqlib.api import api
 from stoqlib.domain.costcenter import CostCenter
 from stoqlib.domain.events import CreatePaymentEvent
 from stoqlib.domain.fiscal import CfopData
+from stoqlib.domain.overrides import SellableBranchOverride
 from stoqlib.domain.payment.card import CreditProvider
 from stoqlib.domain.payment.method import PaymentMethod
 from stoqlib.domain.payment.payment import Payment
@@ -952,7 +953,10 @@ class ConfirmSaleWizard(BaseWizard):
             run_dialog(MissingItemsDialog, self, self.model, missing)
             return False
 
-        for item in self.model.get_items():
+        items = list(self.model.get_items())
+        SellableBranchOverride.prefetch(
+            self.store, self.model.branch, [item.sellable_id for item in items])
+        for item in items:
             sellable = item.sellable
             if not sellable.is_available(self.model.branch):
                 self.close()
@@ -28,11 +28,9 @@ CSV import classes
 """
 
 import csv
-import datetime
-import time
 
 from stoqlib.database.runtime import new_store
-from stoqlib.importers.importer import Importer
+from stoqlib.importers.importer import Importer, copy_rows
 from stoqlib.lib.dateutils import localdate
 
 
@@ -56,10 +54,19 @@ class CSVImporter(Importer):
     :cvar fields: field names, a list of strings
     :cvar optional_fields: optional field names, a list of strings
     :cvar dialect: optional, csv dialect, defaults to excel
+    :cvar copy_table: optional, when set the rows are bulk loaded into
+      this table using ``COPY`` instead of calling :meth:`process_one`
+      for each of them. See :meth:`get_copy_row`
+    :cvar copy_columns: optional, the columns of *copy_table* to load,
+      defaults to *fields* + *optional_fields*
     """
     fields = []
     optional_fields = []
     dialect = 'excel'
+    batch_commits = True
+    resumable = True
+    copy_table = None
+    copy_columns = None
 
     def __init__(self, lines=500, dry=False):
         """
@@ -79,14 +86,28 @@ class CSVImporter(Importer):
         self.before_start(store)
         store.commit(close=True)
         self.lineno = 1
-        self.rows = list(csv.reader(fp, dialect=self.dialect))
+        self._copy_buffer = []
+        if fp.seekable():
+            # Count the rows without keeping them around and rewind, so
+            # that they can be read lazily while processing
+            self._n_rows = sum(1 for row in csv.reader(
+                fp, dialect=self.dialect))
+            fp.seek(0)
+            self._reader = csv.reader(fp, dialect=self.dialect)
+        else:
+            rows = list(csv.reader(fp, dialect=self.dialect))
+            self._n_rows = len(rows)
+            self._reader = iter(rows)
 
     def get_n_items(self):
-        return len(self.rows)
+        return self._n_rows
+
+    def skip_item(self, item_no):
+        next(self._reader)
+        self.lineno += 1
 
     def process_item(self, store, item_no):
-        t = time.time()
-        item = self.rows[item_no]
+        item = next(self._reader)
         if not item or item[0].startswith('%'):
             self.lineno += 1
             return False
@@ -110,24 +131,33 @@ class CSVImporter(Importer):
 
         row = CSVRow(item, field_names)
         try:
-            self.process_one(row, row.fields, store)
+            if self.copy_table is not None:
+                self._copy_buffer.append(self.get_copy_row(row))
+            else:
+                self.process_one(row, row.fields, store)
         except Exception:
             print()
             print('Error while processing row %d %r' % (self.lineno, row, ))
             print()
             raise
 
-        if self.items != -1:
-            if self.lineno % self.items == 0:
-                t2 = time.time()
-                print('%s Imported %d entries in %2.2f sec total=%d' % (
-                    datetime.datetime.now().strftime('%H:%M:%S'), self.items,
-                    t2 - t, self.lineno))
-                t = t2
-
         self.lineno += 1
         return True
 
+    def flush(self, store):
+        if not self._copy_buffer:
+            return
+        copy_rows(store, self.copy_table, self.get_copy_columns(),
+                  self._copy_buffer)
+        self._copy_buffer = []
+
+    def get_copy_columns(self):
+        """Gets the columns loaded when using ``COPY``
+
+        :returns: a sequence of column names
+        """
+        return self.copy_columns or self.fields + self.optional_fields
+
     def parse_date(self, data):
         return localdate(*map(int, data.split('-')))
 
@@ -144,6 +174,18 @@ class CSVImporter(Importer):
     # Override this in a subclass
     #
 
+    def get_copy_row(self, row):
+        """Converts a row to the values which are going to be loaded
+        using ``COPY``. Override this in a subclass to convert the
+        values read from the file.
+
+        :param row: object representing a row in the input
+        :returns: a sequence of values in the same order as
+          :meth:`get_copy_columns`
+        """
+        return [getattr(row, column, None)
+                for column in self.get_copy_columns()]
+
     def process_one(self, row, fields, store):
         """Processes one line in a csv file, you can access the columns
         using attributes on the data object.
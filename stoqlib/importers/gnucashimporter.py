@@ -84,8 +84,9 @@ class GnuCashXMLImporter(Importer):
 
     def __init__(self):
         Importer.__init__(self)
+        # The accounts are referenced by the transactions imported after
+        # them, so everything is imported in a single transaction
         self._accounts = {}
-        self.items = []
 
     #
     # Public API
@@ -24,7 +24,9 @@
 ##
 
 import datetime
+import io
 import logging
+import os
 import time
 
 from kiwi.python import namedAny
@@ -55,7 +57,16 @@ _available_importers = {
 class Importer(object):
     """Class to assist the process of importing csv files.
 
+    :cvar batch_commits: if the store should be committed every
+      :meth:`set_items_per_commit` items. Importers keeping objects
+      from the store between items must leave this off, since those
+      objects are not valid after the store is committed and closed
+    :cvar resumable: if an interrupted import can be resumed from a
+      checkpoint, see :meth:`set_checkpoint`. Importers keeping state
+      from the items already imported must leave this off
     """
+    batch_commits = False
+    resumable = False
 
     def __init__(self, items=500, dry=False):
         """
@@ -65,6 +76,8 @@ class Importer(object):
         """
         self.items = items
         self.dry = dry
+        self.checkpoint = None
+        self._lookup_cache = {}
 
     def feed_file(self, filename):
         """Feeds csv data from filename to the importer
@@ -79,7 +92,7 @@ class Importer(object):
         before committing
         :param items: number of items or
         """
-        self.n_items = items
+        self.items = items
 
     def set_dry(self, dry):
         """Tells the CSVImporter to run in dry mode, eg without committing
@@ -88,25 +101,69 @@ class Importer(object):
         """
         self.dry = dry
 
+    def set_checkpoint(self, filename):
+        """Sets a file where the number of committed items is recorded.
+
+        When the file exists at the start of :meth:`process`, the items
+        which were already committed are skipped and the import resumes
+        from the first one which was not. The file is removed after the
+        import finishes successfully. This is only supported by the
+        importers which are :attr:`resumable`.
+
+        Note that the checkpoint is written right after each commit, so
+        if the process dies between the two the last batch is imported again.
+
+        :param filename: the checkpoint filename or ``None`` to disable it
+        """
+        self.checkpoint = filename
+
     def process(self, store=None):
-        """Do the main logic, create stores, import items etc"""
+        """Do the main logic, create stores, import items etc
+
+        When *store* is not given, a new one is created and, unless
+        running in dry mode, it is committed every
+        :meth:`set_items_per_commit` items if :attr:`batch_commits`
+        is set.
+        """
+        first_item = self._read_checkpoint()
+        if first_item:
+            if not self.resumable:
+                raise ValueError(
+                    "%s can not resume an import, remove the checkpoint "
+                    "%s to import everything again" % (
+                        type(self).__name__, self.checkpoint))
+            log.info('Resuming import from item %d' % (first_item, ))
+
         n_items = self.get_n_items()
         log.info('Importing %d items' % (n_items, ))
         create_log.info('ITEMS:%d' % (n_items, ))
         t1 = time.time()
 
+        # Only commit in the middle of the import if we are the ones
+        # managing the store. Callers passing a store expect it to be
+        # used for the whole import.
+        batched = (self.batch_commits and not store and not self.dry and
+                   self.items > 0)
+
         imported_items = 0
+        self._lookup_cache.clear()
         if not store:
             store = new_store()
         self.before_start(store)
-        for i in range(n_items):
+        for i in range(first_item):
+            self.skip_item(i)
+        for i in range(first_item, n_items):
             if self.process_item(store, i):
                 create_log.info('ITEM:%d' % (i + 1, ))
                 imported_items += 1
-            if not self.dry and i + 1 % 100 == 0:
+            if batched and (i + 1) % self.items == 0:
+                self.flush(store)
                 store.commit(close=True)
+                self._write_checkpoint(i + 1)
+                self._log_rate(i + 1 - first_item, t1)
                 store = new_store()
 
+        self.flush(store)
         if not self.dry:
             store.commit(close=True)
             store = new_store()
@@ -115,11 +172,13 @@ class Importer(object):
 
         if not self.dry:
             store.commit(close=True)
+            self._remove_checkpoint()
 
         t2 = time.time()
         log.info('%s Imported %d entries in %2.2f sec' % (
             datetime.datetime.now().strftime('%H:%M:%S'), n_items,
             t2 - t1))
+        self._log_rate(n_items - first_item, t1)
         create_log.info('IMPORTED-ITEMS:%d' % (imported_items, ))
 
     def feed(self, fp, filename='<stdin>'):
@@ -138,10 +197,54 @@ class Importer(object):
         """
         raise NotImplementedError
 
+    def get_or_create(self, store, table, **attributes):
+        """Gets an object matching attributes, creating it if needed
+
+        The result of the lookup is cached for the whole import, so
+        importing many rows referencing the same object (e.g. the
+        same category) will only query the database once for it.
+
+        :param store: a store
+        :param table: the domain class of the object
+        :param attributes: the attributes the object must have
+        :returns: an instance of *table*
+        """
+        key = (table, tuple(sorted(
+            (name, getattr(value, 'id', value))
+            for name, value in attributes.items())))
+        obj_id = self._lookup_cache.get(key)
+        if obj_id is not None:
+            # The cache only holds ids since the objects themselves
+            # will not be valid after the store they were in is committed
+            obj = store.get(table, obj_id)
+            if obj is not None:
+                return obj
+
+        obj = store.find(table, **attributes).one()
+        if obj is None:
+            obj = table(store=store, **attributes)
+        self._lookup_cache[key] = obj.id
+        return obj
+
     #
     # Optional to implement
     #
 
+    def skip_item(self, item_no):
+        """This is called for each item which was already imported
+        when resuming from a checkpoint.
+
+        Subclasses reading their input sequentially should consume
+        the item here.
+        """
+
+    def flush(self, store):
+        """This is called before the store is committed and at the
+        end of the import, even in dry mode.
+
+        Subclasses buffering items should write them to the store here.
+        """
+
     def before_start(self, store):
         """This is called before all the lines are parsed but
         after creating a store.
@@ -152,6 +255,89 @@ class Importer(object):
         before committing.
         """
 
+    #
+    # Private
+    #
+
+    def _read_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as fp:
+            return int(fp.read().strip() or 0)
+
+    def _write_checkpoint(self, item_no):
+        if not self.checkpoint:
+            return
+        # Write to a temporary file and rename it so that a crash while
+        # writing will not leave us with a truncated checkpoint
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as fp:
+            fp.write('%d\n' % (item_no, ))
+        os.rename(tmp, self.checkpoint)
+
+    def _remove_checkpoint(self):
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def _log_rate(self, n_items, start):
+        elapsed = time.time() - start
+        if elapsed <= 0:
+            return
+        create_log.info('ROWS-PER-SEC:%.1f' % (n_items / elapsed, ))
+
+
+def _copy_escape(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    value = str(value)
+    for char, escaped in [('\\', '\\\\'), ('\t', '\\t'),
+                          ('\n', '\\n'), ('\r', '\\r')]:
+        value = value.replace(char, escaped)
+    return value
+
+
+def copy_rows(store, table, columns, rows):
+    """Bulk loads rows into a table using ``COPY``
+
+    This is a lot faster than creating domain objects, but since it
+    bypasses the ORM it should only be used for plain tables, where
+    there is no logic to be executed when the object is created.
+    Columns not in *columns* (like ``id`` and ``te_id``) will get
+    their default values.
+
+    :param store: a store
+    :param table: the domain class or the name of the table
+    :param columns: a sequence of column names
+    :param rows: a sequence of rows, each one a sequence of values in
+      the same order as *columns*
+    :returns: the number of rows copied
+    """
+    table = getattr(table, '__storm_table__', table)
+    buf = io.StringIO()
+    n_rows = 0
+    for row in rows:
+        buf.write('\t'.join(_copy_escape(value) for value in row))
+        buf.write('\n')
+        n_rows += 1
+    if not n_rows:
+        return 0
+
+    buf.seek(0)
+    # Make sure objects created by the ORM, that might be referenced by
+    # the rows being copied, are already in the database
+    store.flush()
+    cursor = store._connection.build_raw_cursor()
+    try:
+        cursor.copy_expert('COPY %s (%s) FROM STDIN' % (
+            table, ', '.join(columns)), buf)
+    finally:
+        cursor.close()
+    return n_rows
+
 
 def get_by_type(importer_type):
     """Gets an importers class, instantiates it returns it
@@ -74,13 +74,9 @@ class ProductImporter(CSVImporter):
 
         self.tax_constant_id = sysparam.get_object_id(
             'DEFAULT_PRODUCT_TAX_CONSTANT')
-        self._code = 1
 
     def _get_or_create(self, table, store, **attributes):
-        obj = store.find(table, **attributes).one()
-        if obj is None:
-            obj = table(store=store, **attributes)
-        return obj
+        return self.get_or_create(store, table, **attributes)
 
     def _maybe_create_taxes(self, store):
         icms_template = self._get_or_create(ProductTaxTemplate,
@@ -143,8 +139,8 @@ class ProductImporter(CSVImporter):
                             description=data.description,
                             price=Decimal(data.price))
         sellable.barcode = data.barcode
-        sellable.code = u'%02d' % self._code
-        self._code += 1
+        sellable.code = Sellable.allocate_values(store, Sellable.code,
+                                                 template=u'%02d')[0]
         if u'unit' in fields:
             if not data.unit in self.units:
                 raise ValueError(u"invalid unit: %s" % data.unit)
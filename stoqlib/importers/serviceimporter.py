@@ -44,8 +44,6 @@ class ServiceImporter(CSVImporter):
         default_store = get_default_store()
         self.tax_constant = SellableTaxConstant.get_by_type(
             TaxType.SERVICE, default_store)
-
-        self._code = 11
         assert self.tax_constant
 
     def process_one(self, data, fields, store):
@@ -55,8 +53,8 @@ class ServiceImporter(CSVImporter):
                             price=int(data.price),
                             cost=int(data.cost))
         sellable.tax_constant = tax
-        sellable.code = u'%02d' % self._code
-        self._code += 1
+        sellable.code = Sellable.allocate_values(store, Sellable.code,
+                                                 template=u'%02d')[0]
         sellable.barcode = data.barcode
 
         Service(sellable=sellable,
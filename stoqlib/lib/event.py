@@ -184,6 +184,15 @@ class Event(ClassInittableObject):
     def disconnect(cls, callback):
         cls._callbacks_list.remove(_WeakRef(callback))
 
+    @classmethod
+    def has_callbacks(cls):
+        """Checks if there's any callback connected to this event
+
+        :returns: ``True`` if emitting this event would call something
+        """
+        cls._resolve_lazy_callbacks()
+        return bool(cls._callbacks_list)
+
     #
     #  Private
     #
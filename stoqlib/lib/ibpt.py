@@ -27,24 +27,78 @@ IBPT - Instituto Brasileiro de Planejamento Tributário (Brazilian Institute
 of Tributary Planning)
 According to Law 12,741 of 12/08/2012 - Taxes in Coupon.
 """
+import csv
+import logging
+import os
+import sqlite3
+import threading
 from collections import namedtuple
+from decimal import Decimal
 
 from kiwi.environ import environ
 
-import csv
-from decimal import Decimal
-
-from stoqlib.database.runtime import get_current_branch, new_store
+from stoqlib.database.runtime import get_current_branch
 from stoqlib.lib.defaults import quantize
+from stoqlib.lib.osutils import get_application_dir
 from stoqlib.lib.parameters import sysparam
+from stoqlib.lib.threadutils import threadit
+
+log = logging.getLogger(__name__)
+
+#: Increase this when the layout of the index changes, so that indexes
+#: created by older versions are rebuilt
+INDEX_VERSION = 1
+
+# How long to wait for other processes compiling the index, in seconds
+_LOCK_TIMEOUT = 10 * 60
 
-taxes_data = {}
 TaxInfo = namedtuple('TaxInfo', 'nacionalfederal, importadosfederal, estadual,'
                      'fonte, chave')
+_no_tax = TaxInfo(Decimal('0'), Decimal('0'), Decimal('0'), '', '0')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tax (
+    state TEXT NOT NULL,
+    ncm TEXT NOT NULL,
+    ex TEXT NOT NULL,
+    nacionalfederal TEXT NOT NULL,
+    importadosfederal TEXT NOT NULL,
+    estadual TEXT NOT NULL,
+    fonte TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    PRIMARY KEY (state, ncm, ex)
+) WITHOUT ROWID;
+"""
+
+
+def get_available_states():
+    """Gets the states which have an IBPT table
+
+    :returns: a sorted list of states
+    """
+    directory = environ.get_resource_filename('stoq', 'csv', 'ibpt_tables')
+    prefix = 'TabelaIBPTax'
+    return sorted(name[len(prefix):-len('.csv')]
+                  for name in os.listdir(directory)
+                  if name.startswith(prefix) and name.endswith('.csv'))
 
 
-def load_taxes_csv(state):
-    """ Load the fields of IBPT table.
+def _get_csv_filename(state):
+    return environ.get_resource_filename('stoq', 'csv', 'ibpt_tables',
+                                         'TabelaIBPTax%s.csv' % state)
+
+
+def _get_csv_signature(filename):
+    stat = os.stat(filename)
+    return '%d:%d:%d' % (INDEX_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def iter_taxes_csv(state):
+    """Iterates over the fields of IBPT table of a state.
 
     - Fields:
         - ncm: Nomenclatura Comum do Sul.
@@ -60,35 +114,203 @@ def load_taxes_csv(state):
         - chave: Chave que associa a Tabela IBPT baixada com a empresa.
         - versao: Versão das alíquotas usadas para cálculo.
         - Fonte: Fonte
+
+    :param state: the state, e.g. ``SP``
+    :returns: an iterator of ``(ncm, ex, tax_info)`` tuples
     """
+    with open(_get_csv_filename(state), 'r', encoding='latin1') as fp:
+        for (ncm, ex, tipo, descricao, nacionalfederal, importadosfederal,
+             estadual, municipal, vigenciainicio, vigenciafim, chave,
+             versao, fonte) in csv.reader(fp, delimiter=';'):
+            # Ignore the header and the service codes
+            # (NBS - Nomenclatura Brasileira de Serviços)
+            if ncm == 'codigo' or tipo == '1':
+                continue
+            yield ncm, ex, TaxInfo(Decimal(nacionalfederal),
+                                   Decimal(importadosfederal),
+                                   Decimal(estadual), fonte, chave)
+
+
+class TaxesIndex(object):
+    """A sqlite index of the IBPT tables, keyed by (state, ncm, ex)
+
+    Parsing the csv of a state takes a while and keeping it in memory
+    takes a lot of space, so the tables are compiled into a sqlite
+    database which is memory mapped and queried on demand.
+
+    A state is (re)compiled the first time it is used after its csv
+    changes, which means the index can also be created beforehand,
+    at build or update time, by calling :meth:`compile`. The index
+    can be shared by many processes: while one of them is compiling a
+    state, the others wait for it instead of compiling it too.
+
+    :param filename: the index filename. Defaults to a file
+      in the application directory
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename or os.path.join(get_application_dir(),
+                                                 'ibpt-taxes.sqlite')
+        self._conn = None
+        self._compiled = set()
+        # The connection is shared by all threads in the process
+        self._lock = threading.Lock()
+
+    #
+    #  Public API
+    #
 
-    if state in taxes_data:
-        return
+    def compile(self, state):
+        """Compiles the IBPT table of a state into the index
+
+        Nothing is done if the table did not change since it was compiled.
+
+        :param state: the state, e.g. ``SP``
+        """
+        with self._lock:
+            self._compile(state)
+
+    def get_options(self, state, ncm):
+        """Gets the taxes for a ncm
+
+        :param state: the state, e.g. ``SP``
+        :param ncm: the ncm or service code
+        :returns: a dict mapping each ex to a :class:`TaxInfo`
+        """
+        with self._lock:
+            self._compile(state)
+            rows = self._get_connection().execute(
+                'SELECT ex, nacionalfederal, importadosfederal, estadual, '
+                'fonte, chave FROM tax WHERE state = ? AND ncm = ?',
+                (state, ncm))
+            return {ex: TaxInfo(Decimal(nacionalfederal),
+                                Decimal(importadosfederal),
+                                Decimal(estadual), fonte, chave)
+                    for (ex, nacionalfederal, importadosfederal, estadual,
+                         fonte, chave) in rows}
+
+    def close(self):
+        """Closes the index"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._compiled.clear()
+
+    #
+    #  Private
+    #
+
+    def _get_connection(self):
+        if self._conn is None:
+            # The transactions are handled by _compile
+            self._conn = sqlite3.connect(self.filename,
+                                         timeout=_LOCK_TIMEOUT,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute('PRAGMA mmap_size = %d' % (64 * 1024 * 1024))
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _compile(self, state):
+        if state in self._compiled:
+            return
+
+        conn = self._get_connection()
+        signature = _get_csv_signature(_get_csv_filename(state))
+        key = 'source:%s' % (state, )
+        if self._get_meta(key) != signature:
+            # Take the write lock of the database before checking again,
+            # so other processes trying to compile the same state will
+            # wait for this one and then find it already compiled
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self._get_meta(key) != signature:
+                    self._compile_table(state, key, signature)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        self._compiled.add(state)
+
+    def _get_meta(self, key):
+        row = self._get_connection().execute(
+            'SELECT value FROM meta WHERE key = ?', (key, )).fetchone()
+        return row and row[0]
+
+    def _compile_table(self, state, key, signature):
+        log.info('Compiling IBPT table for %s into %s' % (
+            state, self.filename))
+        conn = self._get_connection()
+        conn.execute('DELETE FROM tax WHERE state = ?', (state, ))
+        # Later lines replace earlier ones, just like
+        # a dict would do
+        conn.executemany(
+            'INSERT OR REPLACE INTO tax VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            ((state, ncm, ex, str(info.nacionalfederal),
+              str(info.importadosfederal), str(info.estadual),
+              info.fonte, info.chave)
+             for ncm, ex, info in iter_taxes_csv(state)))
+        conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                     (key, signature))
+
+
+_index = None
+
+
+def get_taxes_index():
+    """Gets the :class:`TaxesIndex` shared by the whole process"""
+    global _index
+    if _index is None:
+        _index = TaxesIndex()
+    return _index
+
+
+def compile_taxes_index(states=None):
+    """Compiles the IBPT tables into the index shared by the process
+
+    :param states: the states to compile or ``None`` to compile all
+      the available ones
+    :returns: the :class:`TaxesIndex`
+    """
+    index = get_taxes_index()
+    for state in states or get_available_states():
+        index.compile(state)
+    return index
+
+
+def compile_branch_taxes_in_background(branch):
+    """Compiles the IBPT table of the state of a branch in a thread
+
+    This avoids making the first coupon emitted after the tables
+    changed wait for them to be compiled.
+
+    :param branch: the |branch|
+    :returns: the thread compiling the table or ``None`` if there is
+      no table for the state of the branch
+    """
+    address = branch.person.get_main_address()
+    state = address and address.city_location.state
+    if state not in get_available_states():
+        return None
 
-    filename = environ.get_resource_filename('stoq', 'csv', 'ibpt_tables',
-                                             'TabelaIBPTax%s.csv' % state)
-    csv_file = (csv.reader(open(filename, "r", encoding='latin1'), delimiter=';'))
+    def compile_():
+        try:
+            compile_taxes_index([state])
+        except Exception:
+            log.exception('Could not compile the IBPT table for %s' % (
+                state, ))
 
-    state_taxes_data = {}
-    for (ncm, ex, tipo, descricao, nacionalfederal, importadosfederal,
-         estadual, municipal, vigenciainicio, vigenciafim, chave,
-         versao, fonte) in csv_file:
-        # Ignore service codes (NBS - Nomenclatura Brasileira de Serviços)
-        if tipo == '1':
-            continue
-        tax_dict = state_taxes_data.setdefault(ncm, {})
-        tax_dict[ex] = TaxInfo(nacionalfederal, importadosfederal, estadual,
-                               fonte, chave)
-    taxes_data[state] = state_taxes_data
+    return threadit(compile_)
 
 
 class IBPTGenerator:
     def __init__(self, items, include_services=False, branch=None):
-        store = new_store()
-        branch = branch or get_current_branch(store)
+        # There is no need to fetch the branch in a store of its own,
+        # we are only going to read its state
+        branch = branch or get_current_branch()
         address = branch.person.get_main_address()
         self.state = address.city_location.state
-        load_taxes_csv(self.state)
         self.items = items
         self.include_services = include_services
 
@@ -114,10 +336,10 @@ class IBPTGenerator:
             code = '%04d' % int(service.service_list_item_code.replace('.', ''))
             ex_tipi = ''
 
-        options = taxes_data[self.state].get(code, {})
+        options = get_taxes_index().get_options(self.state, code)
         n_options = len(options)
         if n_options == 0:
-            tax_values = TaxInfo('0', '0', '0', '', '0')
+            tax_values = _no_tax
         elif n_options == 1:
             tax_values = options['']
         else:
@@ -145,10 +367,10 @@ class IBPTGenerator:
 
         # Values (0, 3, 4, 5, 8) represent the taxes codes of brazilian origin.
         if origin in [0, 3, 4, 5, 8]:
-            federal_tax = Decimal(tax_values.nacionalfederal) / 100
+            federal_tax = tax_values.nacionalfederal / 100
         # Different codes, represent taxes of international origin.
         else:
-            federal_tax = Decimal(tax_values.importadosfederal) / 100
+            federal_tax = tax_values.importadosfederal / 100
         total_item = quantize(item.price * item.quantity)
         return total_item * federal_tax
 
@@ -156,7 +378,7 @@ class IBPTGenerator:
         if tax_values is None:
             return Decimal("0")
         total_item = quantize(item.price * item.quantity)
-        state_tax = Decimal(tax_values.estadual) / 100
+        state_tax = tax_values.estadual / 100
         return total_item * state_tax
 
     def get_ibpt_message(self):
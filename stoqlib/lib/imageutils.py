@@ -28,17 +28,143 @@ Some of those functions were borrowed from datagrid_gtk3:
 https://github.com/nowsecure/datagrid-gtk3/blob/master/datagrid_gtk3/utils/imageutils.py
 """
 
+import hashlib
 import io
+import logging
+import os
+import tempfile
 
 from gi.repository import GdkPixbuf
 from PIL import Image, ImageFilter
 
+from stoqlib.lib.osutils import get_application_dir
+
+log = logging.getLogger(__name__)
+
 _image_border_size = 6
 _image_shadow_size = 6
 _image_shadow_offset = 2
 # Generating a drop shadow is an expensive operation. Keep a cache
 # of already generated drop shadows so they can be reutilized
 _drop_shadows_cache = {}
+# The directory where the generated images are cached, see
+# get_thumbnail_cache_dir
+_thumbnail_cache_dir = None
+# The maximum size in bytes of the images cached on the directory above.
+# When it gets bigger than that, the least recently used ones are removed
+_thumbnail_cache_max_size = 64 * 1024 * 1024
+
+
+def get_thumbnail_cache_dir():
+    """Get the directory where the generated images are cached
+
+    The thumbnails and the images rendered by :func:`get_pixbuf` are
+    saved there, named after a hash of the image they were generated
+    from, so they are generated only once for each image. The least
+    recently used images are removed when the cache gets bigger than
+    ``_thumbnail_cache_max_size`` bytes.
+
+    :returns: the path of the directory
+    """
+    global _thumbnail_cache_dir
+    if _thumbnail_cache_dir is None:
+        _thumbnail_cache_dir = os.path.join(get_application_dir(),
+                                            'thumbnails')
+    return _thumbnail_cache_dir
+
+
+def clear_thumbnail_cache():
+    """Remove all the images cached on :func:`get_thumbnail_cache_dir`"""
+    cache_dir = get_thumbnail_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    for filename in os.listdir(cache_dir):
+        try:
+            os.remove(os.path.join(cache_dir, filename))
+        except OSError as e:
+            log.warning('Could not remove cached image %s: %s' % (
+                filename, e))
+
+
+def _get_cache_filename(image_bytes, variant):
+    digest = hashlib.sha1(image_bytes).hexdigest()
+    return os.path.join(get_thumbnail_cache_dir(),
+                        '%s-%s.png' % (digest, variant))
+
+
+def _read_cache(filename):
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+
+    # The modification time tells how recently the image was used,
+    # see _prune_cache
+    try:
+        os.utime(filename, None)
+    except OSError:
+        pass
+    return data
+
+
+def _prune_cache(cache_dir):
+    entries = []
+    total_size = 0
+    for filename in os.listdir(cache_dir):
+        if not filename.endswith('.png'):
+            continue
+        path = os.path.join(cache_dir, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Removed by another process meanwhile
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total_size += st.st_size
+
+    if total_size <= _thumbnail_cache_max_size:
+        return
+
+    entries.sort()
+    for mtime, size, path in entries:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total_size -= size
+        if total_size <= _thumbnail_cache_max_size:
+            break
+
+
+def _write_cache(filename, data):
+    # The cache is just an optimization, failing to write to it is not fatal
+    cache_dir = os.path.dirname(filename)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first, so other processes reading the
+        # cache will never find a partially written image
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_filename, filename)
+        _prune_cache(cache_dir)
+    except (IOError, OSError) as e:
+        log.warning('Could not cache image %s: %s' % (filename, e))
+
+
+def _get_png_bytes(image):
+    with io.BytesIO() as f:
+        image.save(f, 'png')
+        return f.getvalue()
+
+
+def _png2pixbuf(data):
+    loader = GdkPixbuf.PixbufLoader.new_with_type('png')
+    loader.write(data)
+    pixbuf = loader.get_pixbuf()
+    loader.close()
+    return pixbuf
 
 
 def image2pixbuf(image):
@@ -49,14 +175,7 @@ def image2pixbuf(image):
     :returns: the newly created pixbuf
     :rtype: `GdkPixbuf.Pixbuf`
     """
-    with io.BytesIO() as f:
-        image.save(f, 'png')
-        loader = GdkPixbuf.PixbufLoader.new_with_type('png')
-        loader.write(f.getvalue())
-        pixbuf = loader.get_pixbuf()
-        loader.close()
-
-    return pixbuf
+    return _png2pixbuf(_get_png_bytes(image))
 
 
 def add_border(image, border_size=5,
@@ -146,22 +265,34 @@ def add_drop_shadow(image, iterations=3, border_size=2, offset=(2, 2),
 def get_thumbnail(image_bytes, size):
     """Generate a thumbnail of the image by the given size.
 
+    The thumbnail is cached on :func:`get_thumbnail_cache_dir`, so
+    it will only be generated again for a different image or size.
+
     :param str image_bytes: The image bytes (e.g. the image from the database)
     :param tuple size: The size to generate the thumbnail
     :returns: The thumbnail image
     :rtype: str
     """
+    filename = _get_cache_filename(image_bytes, '%dx%d' % tuple(size))
+    data = _read_cache(filename)
+    if data is not None:
+        return data
+
     with io.BytesIO(image_bytes) as f:
         im = Image.open(f)
         im.thumbnail(size, Image.BICUBIC)
-        with io.BytesIO() as new_f:
-            im.save(new_f, 'png')
-            return new_f.getvalue()
+        data = _get_png_bytes(im)
+
+    _write_cache(filename, data)
+    return data
 
 
 def get_pixbuf(image_bytes, draw_border=True, fill_image=None):
     """Render image into a pixbuf doing the necessary transformations.
 
+    The rendered image is cached on :func:`get_thumbnail_cache_dir`,
+    since adding the border and the drop shadow is expensive.
+
     :param str image_bytes: The image bytes (e.g. the image from the database)
     :param bool draw_border: if we should add a border on the image
     :param tuple fill_image: If we should fill the image with a transparent
@@ -170,28 +301,26 @@ def get_pixbuf(image_bytes, draw_border=True, fill_image=None):
     :returns: the resized pixbuf
     :rtype: :class:`GdkPixbuf.Pixbuf`
     """
-    with io.BytesIO(image_bytes) as f:
-        image = Image.open(f)
-        w, h = image.size
-
-        if draw_border:
-            image = add_border(image, border_size=_image_border_size)
-            image = add_drop_shadow(
-                image, border_size=_image_shadow_size,
-                offset=(_image_shadow_offset, _image_shadow_offset))
-
-            # After the border and the dropshadow, the size will be
-            # slightly increased
-            extra = ((_image_border_size * 2) +
-                     (_image_shadow_size * 2) +
-                     _image_shadow_offset)
-            w += extra
-            h += extra
-
-        pixbuf = image2pixbuf(image)
-
-    width = pixbuf.get_width()
-    height = pixbuf.get_height()
+    filename = _get_cache_filename(image_bytes,
+                                   'border' if draw_border else 'plain')
+    data = _read_cache(filename)
+    if data is None:
+        with io.BytesIO(image_bytes) as f:
+            image = Image.open(f)
+            if draw_border:
+                image = add_border(image, border_size=_image_border_size)
+                image = add_drop_shadow(
+                    image, border_size=_image_shadow_size,
+                    offset=(_image_shadow_offset, _image_shadow_offset))
+            data = _get_png_bytes(image)
+        _write_cache(filename, data)
+
+    pixbuf = _png2pixbuf(data)
+
+    # After the border and the dropshadow, the size of the rendered
+    # image will be slightly bigger than the original one
+    width = w = pixbuf.get_width()
+    height = h = pixbuf.get_height()
 
     if fill_image is None:
         return pixbuf
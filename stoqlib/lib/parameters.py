@@ -27,12 +27,19 @@ import collections
 from decimal import Decimal
 from uuid import uuid4
 import logging
+import select
+import threading
+import weakref
 
 from kiwi.datatypes import ValidationError
 from kiwi.python import namedAny
+from storm.store import Store
 from stoqdrivers.enum import TaxType
+import psycopg2
+import psycopg2.extensions
 
 from stoqlib.database.runtime import get_default_store
+from stoqlib.database.settings import db_settings
 from stoqlib.domain.parameter import ParameterData
 from stoqlib.enums import (LatePaymentPolicy, ReturnPolicy,
                            ChangeSalespersonPolicy)
@@ -1093,9 +1100,104 @@ _details = [
 ]
 
 
+class _ParameterListener(threading.Thread):
+    """Keeps a :class:`ParameterAccess` coherent with the database
+
+    The ``parameter_data`` table notifies the name of every parameter that
+    is inserted, updated or removed on the ``parameter_data`` channel.
+    This thread LISTENs on it using a dedicated connection and reloads
+    the raw value of the changed parameters, so the changes made by other
+    stations are seen without restarting.
+    """
+
+    CHANNEL = 'parameter_data'
+
+    #: how long (in seconds) we wait for a notification before checking
+    #: if we were stopped
+    POLL_TIMEOUT = 1
+
+    #: how long (in seconds) we wait before reconnecting after an error
+    RECONNECT_TIMEOUT = 10
+
+    def __init__(self, access):
+        super(_ParameterListener, self).__init__(name='ParameterListener')
+        self.daemon = True
+        self._access = access
+        self._stopped = threading.Event()
+
+    def _connect(self):
+        conn = psycopg2.connect(db_settings.get_store_dsn())
+        conn.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+        cursor.execute('LISTEN %s' % (self.CHANNEL, ))
+        return conn, cursor
+
+    def _listen(self, conn, cursor):
+        while not self._stopped.is_set():
+            readable, _w, _x = select.select([conn], [], [], self.POLL_TIMEOUT)
+            if not readable:
+                continue
+
+            conn.poll()
+            names = set()
+            while conn.notifies:
+                names.add(conn.notifies.pop(0).payload)
+            if not names:
+                continue
+
+            cursor.execute(
+                "SELECT field_name, field_value FROM parameter_data "
+                "WHERE field_name IN %s", (tuple(names), ))
+            values = dict(cursor.fetchall())
+            for name in names:
+                self._access.reload_value(name, values.get(name))
+
+    #
+    #  Public API
+    #
+
+    def stop(self):
+        self._stopped.set()
+
+    #
+    #  threading.Thread
+    #
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                conn, cursor = self._connect()
+            except psycopg2.Error as e:
+                log.warning("Could not listen for parameter changes: %s", e)
+                self._stopped.wait(self.RECONNECT_TIMEOUT)
+                continue
+
+            # Anything could have changed while we were not listening
+            self._access.clear_cache()
+            try:
+                self._listen(conn, cursor)
+            except psycopg2.Error as e:
+                log.warning("Lost connection while listening for "
+                            "parameter changes: %s", e)
+                self._stopped.wait(self.RECONNECT_TIMEOUT)
+            finally:
+                conn.close()
+
+
 class ParameterAccess(object):
     """
     API for accessing and updating system parameters
+
+    Values are cached already decoded (bool, Decimal, int, etc) and objects
+    are cached per store after the first time they are fetched. Use
+    :meth:`.start_listening` to keep the cache coherent with changes done
+    by other stations.
+
+    Since the listener updates the caches from its own thread, they are
+    only touched while holding a lock. Every invalidation also bumps a
+    generation counter, so a value that was being decoded or fetched
+    while it changed is returned but not cached.
     """
 
     def __init__(self):
@@ -1105,15 +1207,63 @@ class ParameterAccess(object):
             self.register_param(detail)
 
         self._values_cache = None
+        # Mapping of decoded values, (name, expected_type) -> value
+        self._decoded_cache = {}
+        # Mapping of objects fetched on each store, store -> {name: object}
+        self._objects_cache = weakref.WeakKeyDictionary()
+        self._listener = None
+        self._lock = threading.RLock()
+        self._generation = 0
 
     # Lazy Mapping of database raw database values, name -> database value
     @property
     def _values(self):
-        if self._values_cache is None:
-            self._values_cache = dict(
-                (p.field_name, p.field_value)
-                for p in get_default_store().find(ParameterData))
-        return self._values_cache
+        with self._lock:
+            values = self._values_cache
+            generation = self._generation
+        if values is not None:
+            return values
+
+        values = dict((p.field_name, p.field_value)
+                      for p in get_default_store().find(ParameterData))
+        with self._lock:
+            # Something changed while we were loading, the values
+            # may be stale and will be loaded again on next access
+            if generation == self._generation:
+                self._values_cache = values
+        return values
+
+    def _update_value(self, param_name, value):
+        with self._lock:
+            self._values[param_name] = value
+            self._invalidate(param_name)
+
+    def _invalidate(self, param_name):
+        with self._lock:
+            self._generation += 1
+            for key in list(self._decoded_cache):
+                if key[0] == param_name:
+                    self._decoded_cache.pop(key, None)
+            for objects in list(self._objects_cache.values()):
+                objects.pop(param_name, None)
+
+    def _get_object(self, store, param_name, field_type):
+        with self._lock:
+            objects = self._objects_cache.setdefault(store, {})
+            obj = objects.get(param_name)
+            generation = self._generation
+        # The object may have been removed or its creation rolled back
+        if obj is not None and Store.of(obj) is store:
+            return obj
+
+        value = self._values.get(param_name)
+        if value is None:
+            return None
+        obj = store.get(field_type, str(value))
+        with self._lock:
+            if generation == self._generation:
+                objects[param_name] = obj
+        return obj
 
     def _create_default_values(self, store):
         """Create default values for parameters that take objects"""
@@ -1243,7 +1393,7 @@ class ParameterAccess(object):
                              field_name=param_name,
                              field_value=value,
                              is_editable=detail.is_editable)
-        self._values[param_name] = data.field_value
+        self._update_value(param_name, data.field_value)
         return data.field_value
 
     def _remove_unused_parameters(self, store):
@@ -1266,7 +1416,50 @@ class ParameterAccess(object):
 
     def clear_cache(self):
         """Clears the internal cache so it can be rebuilt on next access"""
-        self._values_cache = None
+        with self._lock:
+            self._generation += 1
+            self._values_cache = None
+            self._decoded_cache.clear()
+            self._objects_cache.clear()
+
+    def reload_value(self, param_name, value):
+        """Reloads the raw value of a parameter after it changed elsewhere
+
+        :param param_name: the parameter name
+        :param value: the new database value or ``None`` if the
+          parameter was removed
+        :type value: unicode
+        """
+        with self._lock:
+            values = self._values_cache
+            if values is None:
+                # Nothing was loaded yet, it will be fresh on next access.
+                # Still invalidate so a load in progress is not cached
+                self._generation += 1
+                return
+            if value is None:
+                values.pop(param_name, None)
+            else:
+                values[param_name] = value
+            self._invalidate(param_name)
+
+    def start_listening(self):
+        """Start listening for parameter changes done by other stations
+
+        The parameters cache will be updated on the background,
+        usually within a second after the change was committed.
+        """
+        if self._listener is not None:
+            return
+        self._listener = _ParameterListener(self)
+        self._listener.start()
+
+    def stop_listening(self):
+        """Stop listening for parameter changes"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
 
     def ensure_system_parameters(self, store, update=False):
         """
@@ -1284,7 +1477,28 @@ class ParameterAccess(object):
         self._create_default_values(store)
 
     def get(self, param_name, expected_type=None, store=None):
+        key = (param_name, expected_type)
+        with self._lock:
+            if key in self._decoded_cache:
+                return self._decoded_cache[key]
+            generation = self._generation
+
         detail = self._verify_detail(param_name, expected_type)
+        if isinstance(expected_type, str):
+            field_type = detail.get_parameter_type()
+            return self._get_object(store, param_name, field_type)
+
+        value = self._decode(detail, expected_type)
+        # USER_HASH is created on the first read, do not cache its absence
+        if value is not None or param_name != 'USER_HASH':
+            with self._lock:
+                # Do not cache a value that changed while being decoded
+                if generation == self._generation:
+                    self._decoded_cache[key] = value
+        return value
+
+    def _decode(self, detail, expected_type):
+        param_name = detail.key
         value = self._values.get(param_name)
         if value is None:
             # This parameter should be created on read and not on edit.
@@ -1304,9 +1518,6 @@ class ParameterAccess(object):
                 return expected_type(value)
             except ValueError:
                 return expected_type(detail.initial)
-        elif isinstance(expected_type, str):
-            field_type = detail.get_parameter_type()
-            return store.get(field_type, str(value))
 
         return value
 
@@ -1419,7 +1630,7 @@ class ParameterAccess(object):
             value = str(value.id)
         param.field_value = value
         param.is_editable = detail.is_editable
-        self._values[param_name] = value
+        self._update_value(param_name, value)
 
     def get_object(self, store, param_name):
         """
@@ -1489,7 +1700,7 @@ class ParameterAccess(object):
             p = ServerProxy(timeout=5)
             threadit(lambda: p.check_running() and p.call('restart'))
 
-        self._values[param_name] = value
+        self._update_value(param_name, value)
 
     def get_details(self):
         return list(self._details.values())
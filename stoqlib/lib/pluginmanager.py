@@ -102,6 +102,11 @@ class PluginDescription(object):
     def dirname(self):
         return os.path.dirname(self.filename)
 
+    def add_to_sys_path(self):
+        """Makes the modules of the plugin importable"""
+        if self.plugin_path not in sys.path:
+            sys.path.append(self.plugin_path)
+
 
 @implementer(IPluginManager)
 class PluginManager(object):
@@ -220,9 +225,7 @@ class PluginManager(object):
 
     def _import_plugin(self, plugin_desc):
         log.info("Loading plugin %s" % (plugin_desc.name, ))
-        plugin_path = plugin_desc.plugin_path
-        if plugin_path not in sys.path:
-            sys.path.append(plugin_path)
+        plugin_desc.add_to_sys_path()
 
         # FIXME: Use setuptools entry points when we can
         __import__(os.path.basename(plugin_desc.dirname), globals(), locals(),
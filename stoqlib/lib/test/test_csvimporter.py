@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+
+import contextlib
+import os
+import tempfile
+from io import StringIO
+
+import mock
+
+from stoqlib.domain.sellable import SellableCategory
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.importers.csvimporter import CSVImporter
+from stoqlib.importers.importer import _copy_escape
+
+__tests__ = 'stoqlib.importers.csvimporter'
+
+CSV_DATA = u"""first,1
+% a comment
+second,2
+third,3
+"""
+
+
+class _Importer(CSVImporter):
+    fields = ['description', 'value']
+
+    def __init__(self, *args, **kwargs):
+        CSVImporter.__init__(self, *args, **kwargs)
+        self.processed = []
+
+    def process_one(self, data, fields, store):
+        self.processed.append((data.description, data.value))
+
+
+class TestCSVImporter(DomainTest):
+    def _get_importer(self):
+        importer = _Importer(dry=True)
+        importer.feed(StringIO(CSV_DATA), filename='test.csv')
+        return importer
+
+    def test_process(self):
+        importer = self._get_importer()
+        self.assertEqual(importer.get_n_items(), 4)
+        importer.process(self.store)
+        self.assertEqual(importer.processed,
+                         [(u'first', u'1'), (u'second', u'2'),
+                          (u'third', u'3')])
+
+    def test_process_checkpoint(self):
+        fd, checkpoint = tempfile.mkstemp()
+        self.addCleanup(os.remove, checkpoint)
+        with os.fdopen(fd, 'w') as fp:
+            fp.write('2\n')
+
+        importer = self._get_importer()
+        importer.set_checkpoint(checkpoint)
+        importer.process(self.store)
+        self.assertEqual(importer.processed,
+                         [(u'second', u'2'), (u'third', u'3')])
+        self.assertEqual(importer.lineno, 5)
+
+    def test_process_checkpoint_not_resumable(self):
+        fd, checkpoint = tempfile.mkstemp()
+        self.addCleanup(os.remove, checkpoint)
+        with os.fdopen(fd, 'w') as fp:
+            fp.write('2\n')
+
+        importer = self._get_importer()
+        importer.resumable = False
+        importer.set_checkpoint(checkpoint)
+        with self.assertRaises(ValueError):
+            importer.process(self.store)
+        self.assertEqual(importer.processed, [])
+
+    def test_process_batched(self):
+        importer = _Importer(lines=2)
+        importer.feed(StringIO(CSV_DATA), filename='test.csv')
+        with contextlib.ExitStack() as stack:
+            new_store = stack.enter_context(
+                mock.patch('stoqlib.importers.importer.new_store'))
+            new_store.return_value = self.store
+            commit = stack.enter_context(
+                mock.patch.object(self.store, 'commit'))
+            importer.process()
+        # Every 2 lines, at the end of the import and after when_done
+        self.assertEqual(commit.call_count, 4)
+
+    def test_get_or_create(self):
+        importer = self._get_importer()
+        category = importer.get_or_create(self.store, SellableCategory,
+                                          description=u'Cached')
+        self.assertEqual(self.store.find(SellableCategory,
+                                         description=u'Cached').count(), 1)
+        cached = importer.get_or_create(self.store, SellableCategory,
+                                        description=u'Cached')
+        self.assertIs(cached, category)
+
+        other = importer.get_or_create(self.store, SellableCategory,
+                                       description=u'Other')
+        self.assertIsNot(other, category)
+
+    def test_copy_escape(self):
+        self.assertEqual(_copy_escape(None), '\\N')
+        self.assertEqual(_copy_escape(True), 't')
+        self.assertEqual(_copy_escape(10), '10')
+        self.assertEqual(_copy_escape(u'a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
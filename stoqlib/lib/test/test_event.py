@@ -71,6 +71,16 @@ class EventTest(unittest.TestCase):
         MyEvent.disconnect(obj1.callback)
         MyEvent.connect(obj1.callback)
 
+    def test_has_callbacks(self):
+        class MyEvent(Event):
+            pass
+
+        self.assertFalse(MyEvent.has_callbacks())
+        MyEvent.connect(self._stub_return_corret_value)
+        self.assertTrue(MyEvent.has_callbacks())
+        MyEvent.disconnect(self._stub_return_corret_value)
+        self.assertFalse(MyEvent.has_callbacks())
+
     def test_disconnect(self):
         class MyEvent(Event):
             returnclass = ReturnStatus
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+import contextlib
+import io
+
+import mock
+
+from stoqlib.domain.account import Account, AccountTransaction
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.importers.gnucashimporter import GnuCashXMLImporter
+
+__tests__ = 'stoqlib.importers.gnucashimporter'
+
+GNUCASH_DATA = b"""<?xml version="1.0" encoding="utf-8" ?>
+<gnc-v2
+     xmlns:gnc="http://www.gnucash.org/XML/gnc"
+     xmlns:act="http://www.gnucash.org/XML/act"
+     xmlns:trn="http://www.gnucash.org/XML/trn"
+     xmlns:ts="http://www.gnucash.org/XML/ts"
+     xmlns:split="http://www.gnucash.org/XML/split">
+<gnc:book version="2.0.0">
+<gnc:account version="2.0.0">
+  <act:name>Root Account</act:name>
+  <act:id type="guid">root</act:id>
+  <act:type>ROOT</act:type>
+</gnc:account>
+<gnc:account version="2.0.0">
+  <act:name>GnuCash Bank</act:name>
+  <act:id type="guid">bank</act:id>
+  <act:type>BANK</act:type>
+  <act:parent type="guid">root</act:parent>
+</gnc:account>
+<gnc:account version="2.0.0">
+  <act:name>GnuCash Expenses</act:name>
+  <act:id type="guid">expenses</act:id>
+  <act:type>EXPENSE</act:type>
+  <act:parent type="guid">root</act:parent>
+</gnc:account>
+<gnc:transaction version="2.0.0">
+  <trn:num>1</trn:num>
+  <trn:date-posted>
+    <ts:date>2012-01-02 00:00:00 -0200</ts:date>
+  </trn:date-posted>
+  <trn:description>Office supplies</trn:description>
+  <trn:splits>
+    <trn:split>
+      <split:value>1050/100</split:value>
+      <split:account type="guid">expenses</split:account>
+    </trn:split>
+    <trn:split>
+      <split:value>-1050/100</split:value>
+      <split:account type="guid">bank</split:account>
+    </trn:split>
+  </trn:splits>
+</gnc:transaction>
+</gnc:book>
+</gnc-v2>
+"""
+
+
+class TestGnuCashXMLImporter(DomainTest):
+    def test_process(self):
+        importer = GnuCashXMLImporter()
+        # The accounts are used by the transactions, so this must not
+        # commit in the middle of the import
+        importer.set_items_per_commit(1)
+        importer.feed(io.BytesIO(GNUCASH_DATA))
+        self.assertEqual(importer.get_n_items(), 4)
+
+        with contextlib.ExitStack() as stack:
+            new_store = stack.enter_context(
+                mock.patch('stoqlib.importers.importer.new_store'))
+            new_store.return_value = self.store
+            commit = stack.enter_context(
+                mock.patch.object(self.store, 'commit'))
+            importer.process()
+
+        # At the end of the import and after when_done
+        self.assertEqual(commit.call_count, 2)
+        bank = self.store.find(Account, description=u'GnuCash Bank').one()
+        self.assertEqual(bank.account_type, Account.TYPE_BANK)
+        expenses = self.store.find(Account,
+                                   description=u'GnuCash Expenses').one()
+        self.assertEqual(expenses.account_type, Account.TYPE_EXPENSE)
+
+        transaction = self.store.find(AccountTransaction,
+                                      description=u'Office supplies').one()
+        self.assertEqual(transaction.account, expenses)
+        self.assertEqual(transaction.source_account, bank)
+        self.assertEqual(transaction.value, 10.5)
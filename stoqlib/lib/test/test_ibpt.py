@@ -22,12 +22,19 @@
 ##  Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import os
+import tempfile
 from decimal import Decimal
 
+import mock
+
 from stoqlib.database.runtime import get_current_branch
 from stoqlib.domain.taxes import ProductTaxTemplate, ProductIcmsTemplate
 from stoqlib.domain.test.domaintest import DomainTest
-from stoqlib.lib.ibpt import IBPTGenerator, generate_ibpt_message
+from stoqlib.lib.ibpt import (IBPTGenerator, TaxesIndex,
+                              _get_csv_filename, _get_csv_signature,
+                              compile_branch_taxes_in_background,
+                              generate_ibpt_message)
 
 
 class TestCalculateTaxForItem(DomainTest):
@@ -162,3 +169,66 @@ class TestCalculateTaxForItem(DomainTest):
         expected_federal_tax = total_item * (Decimal("21.45") / 100)
         federal = generator._calculate_federal_tax(sale_item, tax_values)
         self.assertEqual(federal, expected_federal_tax)
+
+
+class TestTaxesIndex(DomainTest):
+    def test_get_options(self):
+        fd, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+
+        index = TaxesIndex(filename)
+        self.addCleanup(index.close)
+        options = index.get_options(u'SP', u'01012100')
+        self.assertEqual(list(options), [u''])
+        self.assertEqual(options[u''].nacionalfederal, Decimal('4.20'))
+        self.assertEqual(options[u''].estadual, Decimal('18.00'))
+        self.assertEqual(options[u''].chave, u'0C3829')
+        self.assertEqual(index.get_options(u'SP', u'inexistent'), {})
+
+        # A new index using the same file does not need to compile it again
+        other = TaxesIndex(filename)
+        self.addCleanup(other.close)
+        with mock.patch('stoqlib.lib.ibpt.iter_taxes_csv') as iter_taxes:
+            options = other.get_options(u'SP', u'39269090')
+        self.assertFalse(iter_taxes.called)
+        self.assertEqual(options[u'01'].importadosfederal, Decimal('21.45'))
+
+    def test_compile_waits_other_process(self):
+        fd, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+
+        index = TaxesIndex(filename)
+        self.addCleanup(index.close)
+        signature = _get_csv_signature(_get_csv_filename(u'SP'))
+        # Another process compiled the table while this one was waiting
+        # for the lock, so it should not be compiled again
+        with mock.patch.object(index, '_get_meta',
+                               side_effect=[None, signature]):
+            with mock.patch.object(index, '_compile_table') as compile_:
+                index.compile(u'SP')
+        self.assertFalse(compile_.called)
+
+        # The lock was released, so another index can compile the table
+        other = TaxesIndex(filename)
+        self.addCleanup(other.close)
+        other.compile(u'SP')
+        self.assertEqual(other._get_meta(u'source:SP'), signature)
+
+    def test_compile_branch_taxes_in_background(self):
+        branch = self.create_branch()
+        address = branch.person.get_main_address()
+        address.city_location = self.create_city_location(state=u'SP')
+        index = mock.Mock()
+        with mock.patch('stoqlib.lib.ibpt.get_taxes_index',
+                        return_value=index):
+            thread = compile_branch_taxes_in_background(branch)
+            thread.join()
+        index.compile.assert_called_once_with(u'SP')
+
+        # There is no table for this state
+        address.city_location = self.create_city_location(state=u'XX')
+        with mock.patch('stoqlib.lib.ibpt.get_taxes_index') as get_index:
+            self.assertIsNone(compile_branch_taxes_in_background(branch))
+        self.assertFalse(get_index.called)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from PIL import Image
+
+from stoqlib.lib.imageutils import (clear_thumbnail_cache, get_pixbuf,
+                                    get_thumbnail)
+
+
+class TestImageUtils(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = mock.patch('stoqlib.lib.imageutils._thumbnail_cache_dir',
+                             self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        with io.BytesIO() as f:
+            Image.new('RGB', (256, 128)).save(f, 'png')
+            self.image_bytes = f.getvalue()
+
+    def test_get_thumbnail(self):
+        thumbnail = get_thumbnail(self.image_bytes, (64, 64))
+        with io.BytesIO(thumbnail) as f:
+            self.assertEqual(Image.open(f).size, (64, 32))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # The cached thumbnail should be used from now on
+        filename = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(filename, 'wb') as f:
+            f.write(b'cached')
+        self.assertEqual(get_thumbnail(self.image_bytes, (64, 64)), b'cached')
+
+        # But not for other sizes
+        get_thumbnail(self.image_bytes, (32, 32))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        clear_thumbnail_cache()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_get_pixbuf(self):
+        pixbuf = get_pixbuf(self.image_bytes)
+        # The border and the drop shadow make the image bigger
+        self.assertEqual((pixbuf.get_width(), pixbuf.get_height()),
+                         (282, 154))
+        pixbuf = get_pixbuf(self.image_bytes, draw_border=False)
+        self.assertEqual((pixbuf.get_width(), pixbuf.get_height()),
+                         (256, 128))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        # The cached image should be used again
+        pixbuf = get_pixbuf(self.image_bytes)
+        self.assertEqual((pixbuf.get_width(), pixbuf.get_height()),
+                         (282, 154))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_cache_size_limit(self):
+        get_thumbnail(self.image_bytes, (64, 64))
+        get_thumbnail(self.image_bytes, (32, 32))
+        filenames = dict((filename.rsplit('-', 1)[1],
+                          os.path.join(self.cache_dir, filename))
+                         for filename in os.listdir(self.cache_dir))
+        big, small = filenames['64x64.png'], filenames['32x32.png']
+        # The thumbnail of the bigger size was the first one to be used,
+        # but using it again makes the other one the least recently used
+        os.utime(big, (1, 1))
+        os.utime(small, (2, 2))
+        get_thumbnail(self.image_bytes, (64, 64))
+
+        max_size = os.path.getsize(big) + os.path.getsize(small) + 1
+        with mock.patch('stoqlib.lib.imageutils._thumbnail_cache_max_size',
+                        max_size):
+            get_thumbnail(self.image_bytes, (16, 16))
+        self.assertTrue(os.path.exists(big))
+        self.assertFalse(os.path.exists(small))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
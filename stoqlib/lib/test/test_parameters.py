@@ -25,7 +25,10 @@
 
 from decimal import Decimal
 
-from stoqlib.lib.parameters import sysparam
+import mock
+import psycopg2
+
+from stoqlib.lib.parameters import sysparam, ParameterAccess, _ParameterListener
 from stoqlib.domain.address import CityLocation
 from stoqlib.domain.person import (Branch, Client, Company, Employee,
                                    EmployeeRole, Individual, LoginUser,
@@ -222,3 +225,106 @@ class TestParameter(DomainTest):
     def test_default_label_columns(self):
         param = self.sparam.get_string('LABEL_COLUMNS')
         self.assertEqual(param, 'code,barcode,description,price')
+
+    def test_decoded_values_cache(self):
+        self.sparam.set_int(self.store, 'MAX_SEARCH_RESULTS', 100)
+        self.assertEqual(self.sparam.get_int('MAX_SEARCH_RESULTS'), 100)
+
+        # Changes done by other stations are received as raw values
+        self.sparam.reload_value('MAX_SEARCH_RESULTS', u'200')
+        self.assertEqual(self.sparam.get_int('MAX_SEARCH_RESULTS'), 200)
+
+        self.sparam.set_int(self.store, 'MAX_SEARCH_RESULTS', 300)
+        self.assertEqual(self.sparam.get_int('MAX_SEARCH_RESULTS'), 300)
+
+    def test_objects_cache(self):
+        company = self.sparam.get_object(self.store, 'MAIN_COMPANY')
+        self.assertIs(self.sparam.get_object(self.store, 'MAIN_COMPANY'),
+                      company)
+
+        branch = self.create_branch()
+        self.sparam.set_object(self.store, 'MAIN_COMPANY', branch)
+        self.assertIs(self.sparam.get_object(self.store, 'MAIN_COMPANY'),
+                      branch)
+        self.sparam.set_object(self.store, 'MAIN_COMPANY', company)
+
+    def test_decoded_values_changed_while_decoding(self):
+        access = ParameterAccess()
+        decode = access._decode
+
+        def _decode(detail, expected_type):
+            value = decode(detail, expected_type)
+            # Simulate the listener receiving a change meanwhile
+            access.reload_value('MAX_SEARCH_RESULTS', u'500')
+            return value
+
+        with mock.patch.object(access, '_decode', new=_decode):
+            access.get_int('MAX_SEARCH_RESULTS')
+        # The value decoded before the change should not be cached
+        self.assertEqual(access.get_int('MAX_SEARCH_RESULTS'), 500)
+
+
+class _Notify(object):
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class TestParameterListener(DomainTest):
+
+    def _create_conn(self, payloads):
+        conn = mock.Mock()
+        conn.notifies = []
+
+        def poll():
+            conn.notifies.extend(_Notify(p) for p in payloads)
+        conn.poll.side_effect = poll
+        return conn
+
+    @mock.patch('stoqlib.lib.parameters.select.select')
+    def test_listen(self, select):
+        access = mock.Mock()
+        listener = _ParameterListener(access)
+        conn = self._create_conn([u'MAX_SEARCH_RESULTS', u'USER_HASH',
+                                  u'MAX_SEARCH_RESULTS'])
+        select.side_effect = [([], [], []), ([conn], [], [])]
+        cursor = mock.Mock()
+        cursor.fetchall.return_value = [(u'MAX_SEARCH_RESULTS', u'10')]
+        # Stop listening after the first batch of notifications
+        access.reload_value.side_effect = lambda *args: listener.stop()
+
+        listener._listen(conn, cursor)
+
+        self.assertEqual(select.call_count, 2)
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertEqual(
+            cursor.execute.call_args[0][1],
+            (tuple(set([u'MAX_SEARCH_RESULTS', u'USER_HASH'])), ))
+        self.assertEqual(
+            sorted(access.reload_value.call_args_list),
+            [mock.call(u'MAX_SEARCH_RESULTS', u'10'),
+             # Removed parameters are reloaded as None
+             mock.call(u'USER_HASH', None)])
+
+    def test_run(self):
+        access = mock.Mock()
+        listener = _ParameterListener(access)
+        conn = mock.Mock()
+        cursor = mock.Mock()
+
+        def listen(conn, cursor):
+            listener.stop()
+
+        with mock.patch.object(listener, '_connect') as connect, \
+                mock.patch.object(listener, '_listen') as listen_, \
+                mock.patch.object(listener._stopped, 'wait') as wait:
+            connect.side_effect = [psycopg2.OperationalError(),
+                                   (conn, cursor)]
+            listen_.side_effect = listen
+            listener.run()
+
+        # It waited before reconnecting after the error
+        wait.assert_called_once_with(listener.RECONNECT_TIMEOUT)
+        # Anything could have changed while it was not connected
+        access.clear_cache.assert_called_once_with()
+        listen_.assert_called_once_with(conn, cursor)
+        conn.close.assert_called_once_with()
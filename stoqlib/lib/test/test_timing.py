@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source
+##
+## This program is free software; you can redistribute it and/or
+## modify it under the terms of the GNU Lesser General Public License
+## as published by the Free Software Foundation; either version 2
+## of the License, or (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+__tests__ = 'stoqlib.lib.timing'
+
+import unittest
+
+import mock
+
+from stoqlib.lib.timing import PhaseTimer
+
+
+class TestPhaseTimer(unittest.TestCase):
+    def test_phases(self):
+        timer = PhaseTimer('operation')
+        with mock.patch('stoqlib.lib.timing.time.perf_counter') as perf_counter:
+            perf_counter.side_effect = [0, 1, 1, 3, 3, 4]
+            with timer.phase('first'):
+                pass
+            with timer.phase('second'):
+                pass
+            # Measuring the same phase again accumulates the time
+            with timer.phase('first'):
+                pass
+
+        self.assertEqual(list(timer.phases.items()),
+                         [('first', 2), ('second', 2)])
+        self.assertEqual(timer.total, 4)
+        self.assertEqual(timer.format(),
+                         'operation: 4.000s (first: 2.000s, second: 2.000s)')
+
+    def test_phase_exception(self):
+        timer = PhaseTimer('operation')
+        with self.assertRaises(ValueError):
+            with timer.phase('failed'):
+                raise ValueError
+        self.assertIn('failed', timer.phases)
+
+    def test_add(self):
+        timer = PhaseTimer('operation')
+        timer.add('first', 1)
+        timer.add('first', 2)
+        self.assertEqual(timer.phases['first'], 3)
+        self.assertEqual(timer.total, 3)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+"""Utilities to measure how long operations take"""
+
+import collections
+import contextlib
+import logging
+import time
+
+
+class PhaseTimer(object):
+    """Measures the wall time spent on each phase of an operation
+
+    Phases are measured by wrapping them with :meth:`.phase`. Measuring
+    the same phase more than once will accumulate its time::
+
+        >>> timer = PhaseTimer('my operation')
+        >>> with timer.phase('first'):
+        ...     pass
+        >>> with timer.phase('second'):
+        ...     pass
+        >>> list(timer.phases)
+        ['first', 'second']
+    """
+
+    def __init__(self, name):
+        self.name = name
+        #: a mapping of phase name -> seconds spent on it, in the order
+        #: they were first measured
+        self.phases = collections.OrderedDict()
+
+    @property
+    def total(self):
+        """The total time, in seconds, spent on all phases"""
+        return sum(self.phases.values())
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measure the time spent on the wrapped block
+
+        :param name: the name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, elapsed):
+        """Add time to a phase measured elsewhere
+
+        :param name: the name of the phase
+        :param elapsed: the time spent on it, in seconds
+        """
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    def format(self):
+        """Format the time spent on each phase in a single line
+
+        :returns: a string like ``operation: 0.123s (phase1: 0.100s, ...)``
+        """
+        phases = ', '.join('%s: %.3fs' % (name, elapsed)
+                           for name, elapsed in self.phases.items())
+        return '%s: %.3fs (%s)' % (self.name, self.total, phases)
+
+    def log(self, logger, level=logging.DEBUG):
+        """Log the time spent on each phase
+
+        :param logger: the logger to use
+        :param level: the level of the log message
+        """
+        if logger.isEnabledFor(level):
+            logger.log(level, self.format())
@@ -22,10 +22,15 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import collections
+import concurrent.futures
 import datetime
 import json
+import threading
+import time
 
 from stoqlib.api import api
+from stoqlib.database.runtime import StorePool, get_commit_count
 from stoqlib.domain.payment.views import InPaymentView, OutPaymentView
 from stoqlib.domain.person import ClientCallsView
 from stoqlib.domain.purchase import PurchaseOrderView
@@ -49,33 +54,101 @@ def _color_to_rgb(c, alpha):
 
 
 class CalendarEvents(object):
+    """The events shown by the calendar application
+
+    The events of each kind are collected at the same time, each one on
+    a store from a pool of read-only stores. The responses are cached by
+    their arguments until something gets committed by this process or
+    :attr:`.cache_timeout` seconds pass, which is when the changes made
+    on other stations will be seen.
+    """
+
+    #: the number of event kinds collected at the same time
+    max_workers = 3
+
+    #: the maximum number of responses kept in the cache
+    cache_size = 32
+
+    #: the number of seconds a response is kept in the cache
+    cache_timeout = 30
+
+    def __init__(self):
+        self._pool = StorePool(size=self.max_workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='calendar-events')
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def render_GET(self, resource):
         start = datetime.date.fromtimestamp(float(resource.args['start'][0]))
         end = datetime.date.fromtimestamp(float(resource.args['end'][0]))
-
-        store = api.new_store()
-        day_events = {}
-        if resource.args.get('in_payments', [''])[0] == 'true':
-            self._collect_inpayments(start, end, day_events, store)
-        if resource.args.get('out_payments', [''])[0] == 'true':
-            self._collect_outpayments(start, end, day_events, store)
-        if resource.args.get('purchase_orders', [''])[0] == 'true':
-            self._collect_purchase_orders(start, end, day_events, store)
-        if resource.args.get('client_calls', [''])[0] == 'true':
-            self._collect_client_calls(start, end, day_events, store)
-        if resource.args.get('client_birthdays', [''])[0] == 'true':
-            self._collect_client_birthdays(start, end, day_events, store)
-        if resource.args.get('work_orders', [''])[0] == 'true':
-            self._collect_work_orders(start, end, day_events, store)
-
         # When grouping, events of the same type will be shown as only one, to
         # save space.
         group = resource.args.get('group', [''])[0] == 'true'
+        collectors = [
+            collector for name, collector in [
+                ('in_payments', self._collect_inpayments),
+                ('out_payments', self._collect_outpayments),
+                ('purchase_orders', self._collect_purchase_orders),
+                ('client_calls', self._collect_client_calls),
+                ('client_birthdays', self._collect_client_birthdays),
+                ('work_orders', self._collect_work_orders)]
+            if resource.args.get(name, [''])[0] == 'true']
+
+        key = (start, end, group, tuple(c.__name__ for c in collectors))
+        response = self._get_cached(key)
+        if response is None:
+            commit_count = get_commit_count()
+            response = self._render(start, end, group, collectors)
+            self._cache_response(key, response, commit_count)
+        return response
+
+    def clear_cache(self):
+        """Removes all the responses from the cache"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _render(self, start, end, group, collectors):
+        futures = [
+            self._executor.submit(self._run_collector, collector, start, end)
+            for collector in collectors]
+
+        # Append the events in the order of the collectors, so they are
+        # always returned in the same order
+        day_events = {}
+        for future in futures:
+            for date, section, event in future.result():
+                self._append_event(day_events, date, section, event)
+
         events = self._summarize_events(day_events, group)
-        store.close()
         return json.dumps(events)
 
+    def _run_collector(self, collector, start, end):
+        with self._pool.store() as store:
+            return list(collector(start, end, store))
+
+    def _get_cached(self, key):
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+
+            response, commit_count, cached_at = cached
+            if (commit_count != get_commit_count() or
+                    time.monotonic() - cached_at > self.cache_timeout):
+                del self._cache[key]
+                return None
+
+            self._cache.move_to_end(key)
+            return response
+
+    def _cache_response(self, key, response, commit_count):
+        with self._cache_lock:
+            self._cache[key] = (response, commit_count, time.monotonic())
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
     @classmethod
     def _append_event(cls, events, date, section, event):
         d = events.setdefault(
@@ -88,38 +161,41 @@ class CalendarEvents(object):
     #   Database Quering
     #
 
-    def _collect_client_birthdays(self, start, end, day_events, store):
+    # Those are executed on separate threads, so instead of appending
+    # the events they yield (date, section, event) tuples
+
+    def _collect_client_birthdays(self, start, end, store):
         branch = api.get_current_branch(store)
         for v in ClientWithSalesView.find_by_birth_date(
                 store, (start, end), branch=branch):
             for year in range(start.year, end.year + 1):
                 date, ev = self._create_client_birthday(v, year)
-                self._append_event(day_events, date, 'client_birthdays', ev)
+                yield date, 'client_birthdays', ev
 
-    def _collect_client_calls(self, start, end, day_events, store):
+    def _collect_client_calls(self, start, end, store):
         for v in ClientCallsView.find_by_date(store, (start, end)):
             date, ev = self._create_client_call(v)
-            self._append_event(day_events, date, 'client_calls', ev)
+            yield date, 'client_calls', ev
 
-    def _collect_inpayments(self, start, end, day_events, store):
+    def _collect_inpayments(self, start, end, store):
         for pv in InPaymentView.find_pending(store, (start, end)):
             date, ev = self._create_in_payment(pv)
-            self._append_event(day_events, date, 'receivable', ev)
+            yield date, 'receivable', ev
 
-    def _collect_outpayments(self, start, end, day_events, store):
+    def _collect_outpayments(self, start, end, store):
         for pv in OutPaymentView.find_pending(store, (start, end)):
             date, ev = self._create_out_payment(pv)
-            self._append_event(day_events, date, 'payable', ev)
+            yield date, 'payable', ev
 
-    def _collect_purchase_orders(self, start, end, day_events, store):
+    def _collect_purchase_orders(self, start, end, store):
         for ov in PurchaseOrderView.find_confirmed(store, (start, end)):
             date, ev = self._create_order(ov)
-            self._append_event(day_events, date, 'purchases', ev)
+            yield date, 'purchases', ev
 
-    def _collect_work_orders(self, start, end, day_events, store):
+    def _collect_work_orders(self, start, end, store):
         for v in WorkOrderView.find_pending(store, start, end):
             date, ev = self._create_work_order(v)
-            self._append_event(day_events, date, 'work_orders', ev)
+            yield date, 'work_orders', ev
 
     #
     #   Events creation
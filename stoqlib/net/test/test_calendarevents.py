@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+__tests__ = 'stoqlib/net/calendarevents.py'
+
+import mock
+
+from stoqlib.domain.test.domaintest import DomainTest
+from stoqlib.net.calendarevents import CalendarEvents
+
+
+class TestCalendarEvents(DomainTest):
+    def setUp(self):
+        super(TestCalendarEvents, self).setUp()
+        self.events = CalendarEvents()
+        self.render = mock.patch.object(self.events, '_render',
+                                        side_effect=lambda *args: '[]').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _render_GET(self, **args):
+        args.setdefault('start', ['0'])
+        args.setdefault('end', ['86400'])
+        args.setdefault('in_payments', ['true'])
+        return self.events.render_GET(mock.Mock(args=args))
+
+    def test_cache(self):
+        self.assertEqual(self._render_GET(), '[]')
+        self.assertEqual(self._render_GET(), '[]')
+        self.assertEqual(self.render.call_count, 1)
+
+        # The responses are cached by their arguments
+        self._render_GET(group=['true'])
+        self.assertEqual(self.render.call_count, 2)
+        self._render_GET(out_payments=['true'])
+        self.assertEqual(self.render.call_count, 3)
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 3)
+
+        self.events.clear_cache()
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 4)
+
+    def test_cache_size(self):
+        for i in range(self.events.cache_size + 1):
+            self._render_GET(start=[str(i * 86400)])
+        self.assertEqual(len(self.events._cache), self.events.cache_size)
+
+        # The least recently used response was the one removed
+        self._render_GET(start=['86400'])
+        self.assertEqual(self.render.call_count, self.events.cache_size + 1)
+        self._render_GET(start=['0'])
+        self.assertEqual(self.render.call_count, self.events.cache_size + 2)
+
+    @mock.patch('stoqlib.net.calendarevents.get_commit_count')
+    def test_cache_commit(self, get_commit_count):
+        get_commit_count.return_value = 1
+        self._render_GET()
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 1)
+
+        # Something was committed after the response was cached
+        get_commit_count.return_value = 2
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 2)
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 2)
+
+    @mock.patch('stoqlib.net.calendarevents.time.monotonic')
+    def test_cache_timeout(self, monotonic):
+        monotonic.return_value = 100
+        self._render_GET()
+        monotonic.return_value = 100 + self.events.cache_timeout
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 1)
+
+        monotonic.return_value = 101 + self.events.cache_timeout
+        self._render_GET()
+        self.assertEqual(self.render.call_count, 2)
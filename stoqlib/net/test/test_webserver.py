@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# vi:si:et:sw=4:sts=4:ts=4
+
+##
+## Copyright (C) 2026 Async Open Source <http://www.async.com.br>
+## All rights reserved
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU Lesser General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Lesser General Public License for more details.
+##
+## You should have received a copy of the GNU Lesser General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., or visit: http://www.gnu.org/.
+##
+## Author(s): Stoq Team <stoq-devel@async.com.br>
+##
+
+
+__tests__ = 'stoqlib/net/webserver.py'
+
+import email
+import hashlib
+import io
+import unittest
+
+import mock
+
+from stoqlib.net.webserver import _RequestHandler
+
+
+class TestRequestHandler(unittest.TestCase):
+    def setUp(self):
+        self.resource = mock.Mock()
+        self.resource.render_GET.return_value = '{"events": []}'
+        patcher = mock.patch.dict('stoqlib.net.webserver.resources',
+                                  {'/calendar-events': self.resource},
+                                  clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, path, headers=None):
+        # Avoid BaseRequestHandler.__init__, which would handle a request
+        # from a socket right away
+        handler = _RequestHandler.__new__(_RequestHandler)
+        handler.path = path
+        handler.command = 'GET'
+        handler.request_version = 'HTTP/1.1'
+        handler.requestline = 'GET %s HTTP/1.1' % (path, )
+        handler.client_address = ('127.0.0.1', 0)
+        handler.headers = email.message_from_string(''.join(
+            '%s: %s\n' % item for item in (headers or {}).items()))
+        handler.wfile = io.BytesIO()
+        handler.do_GET()
+
+        head, body = handler.wfile.getvalue().split(b'\r\n\r\n', 1)
+        lines = head.decode().split('\r\n')
+        status = int(lines[0].split()[1])
+        response_headers = dict(line.split(': ', 1) for line in lines[1:])
+        return status, response_headers, body
+
+    def test_get(self):
+        status, headers, body = self._get('/calendar-events?start=0')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'{"events": []}')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(headers['Cache-Control'], 'no-cache')
+        self.assertEqual(headers['ETag'], '"%s"' % (
+            hashlib.sha1(body).hexdigest(), ))
+        self.assertEqual(self.resource.render_GET.call_count, 1)
+
+    def test_get_not_found(self):
+        status, headers, body = self._get('/inexistent')
+        self.assertEqual(status, 404)
+        self.assertFalse(self.resource.render_GET.called)
+
+    def test_get_if_none_match(self):
+        status, headers, body = self._get('/calendar-events?start=0')
+        etag = headers['ETag']
+
+        # The response did not change, so there is no need to send it again
+        status, headers, body = self._get(
+            '/calendar-events?start=0', {'If-None-Match': etag})
+        self.assertEqual(status, 304)
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(body, b'')
+
+        # Any of the tags sent by the browser may match
+        status, headers, body = self._get(
+            '/calendar-events?start=0',
+            {'If-None-Match': '"other", %s' % (etag, )})
+        self.assertEqual(status, 304)
+
+        # But it is sent again once it changes
+        self.resource.render_GET.return_value = '{"events": [1]}'
+        status, headers, body = self._get(
+            '/calendar-events?start=0', {'If-None-Match': etag})
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'{"events": [1]}')
+        self.assertNotEqual(headers['ETag'], etag)
@@ -22,6 +22,7 @@
 ## Author(s): Stoq Team <stoq-devel@async.com.br>
 ##
 
+import hashlib
 import http.server
 import os
 import urllib.parse
@@ -58,14 +59,28 @@ class _RequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error(404, "Resource not found")
             return
 
+        data = response.encode()
+        # The browser will send the etag back on If-None-Match, so we can
+        # avoid sending and rendering the same response all over again
+        etag = '"%s"' % (hashlib.sha1(data).hexdigest(), )
+        if_none_match = self.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
         self.send_response(200)
         # TODO: Right now we only have one resource, and it is returning
         # a json as the content. In the future we may want to support
         # other kinds of content types
         self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', str(len(response)))
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        # Always revalidate, since the events may change at any time
+        self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
-        self.wfile.write(response.encode())
+        self.wfile.write(data)
 
     #
     #  SimpleHTTPServer.SimpleHTTPRequestHandler
@@ -86,5 +101,8 @@ class _RequestHandler(http.server.SimpleHTTPRequestHandler):
 
 
 def run_server(port):
-    server = http.server.HTTPServer(('localhost', port), _RequestHandler)
+    # Each request is handled on its own thread, so a slow one will not
+    # block the others
+    server = http.server.ThreadingHTTPServer(('localhost', port),
+                                             _RequestHandler)
     server.serve_forever()
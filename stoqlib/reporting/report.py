@@ -27,7 +27,7 @@ from gi.repository import GdkPixbuf
 from kiwi.accessor import kgetattr
 from kiwi.environ import environ
 
-from stoqlib.database.runtime import get_default_store
+from stoqlib.database.runtime import get_default_store, StoqlibResultSet
 from stoqlib.lib.template import render_template
 from stoqlib.lib.translation import stoqlib_gettext, stoqlib_ngettext
 from stoqlib.lib.formatters import (get_formatted_price, get_formatted_cost,
@@ -159,7 +159,10 @@ class TableReport(HTMLReport):
         """ This method build the report title based on the arguments sent
         by SearchBar to its class constructor.
         """
-        rows = len(self.data)
+        if isinstance(self.data, StoqlibResultSet):
+            rows = self.data.count()
+        else:
+            rows = len(self.data)
         total_rows = rows + self.blocked_records
         item = stoqlib_ngettext(self.main_object_name[0],
                                 self.main_object_name[1], total_rows)
@@ -180,7 +183,10 @@ class TableReport(HTMLReport):
 
     def get_data(self):
         self.reset()
-        for obj in self.data:
+        data = self.data
+        if isinstance(data, StoqlibResultSet):
+            data = data.stream()
+        for obj in data:
             self.accumulate(obj)
             yield self.get_row(obj)
 
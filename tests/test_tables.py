@@ -23,15 +23,23 @@
 ##
 
 import itertools
+import json
+import os
+import tempfile
 import unittest
 
 import mock
 
 from stoqlib.database.orm import ORMObject
-from stoqlib.database.tables import get_table_types, _tables_cache
+from stoqlib.database.tables import (clear_tables_cache,
+                                     get_table_type_by_name,
+                                     get_table_types,
+                                     write_plugin_tables_manifest,
+                                     PLUGIN_TABLES_MANIFEST)
 from stoqlib.domain.plugin import InstalledPlugin
 from stoqlib.domain.test.domaintest import DomainTest
 from stoqlib.lib.introspection import get_all_classes
+from stoqlib.lib.kiwilibrary import library
 
 
 def _introspect_tables():
@@ -66,7 +74,7 @@ class TableTypeTest(DomainTest):
 
         # Depending on the order this test is runned, the cache will be
         # already filled. Clear it so it imports again and get plugins too
-        _tables_cache.clear()
+        clear_tables_cache()
         expected = set(t.__name__ for t in get_table_types())
         introspected = set(t.__name__ for t in _introspect_tables())
 
@@ -77,6 +85,33 @@ class TableTypeTest(DomainTest):
                       "Please add them to stoqlib.database.tables or to the "
                       "plugin's get_tables" % (', '.join(sorted(difference), )))
 
+        clear_tables_cache()
+
+    def test_get_table_type_by_name(self):
+        clear_tables_cache()
+        with mock.patch('stoqlib.database.tables.namedAny') as namedAny:
+            namedAny.return_value = object
+            self.assertIs(get_table_type_by_name('Sellable'), object)
+            self.assertIs(get_table_type_by_name('Sellable'), object)
+        # Only the requested table is imported, and only once
+        namedAny.assert_called_once_with('stoqlib.domain.sellable.Sellable')
+        clear_tables_cache()
+
+    def test_plugin_tables_manifest(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as f:
+            write_plugin_tables_manifest(f.name)
+            with open(f.name) as fp:
+                expected = json.load(fp)
+
+        filename = library.get_resource_filename('stoq', 'misc',
+                                                 PLUGIN_TABLES_MANIFEST)
+        with open(filename) as fp:
+            manifest = json.load(fp)
+        self.assertEqual(
+            manifest, expected,
+            "%s is outdated, run 'make plugin-tables' to update it" % (
+                os.path.basename(filename), ))
+
 
 if __name__ == '__main__':
     unittest.main()